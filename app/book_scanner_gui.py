@@ -1,7 +1,7 @@
 import tkinter as tk
 from tkinter import messagebox
 import threading
-import pyautogui
+import logging
 import os
 import sys
 
@@ -14,6 +14,8 @@ from gui_components import GUIComponents
 from selection_handlers import SelectionHandlers
 from capture_processor import CaptureProcessor
 from settings_manager import SettingsManager
+from ui_channel import UIChannel
+from log_sink import LogSink
 
 class BookScannerApp:
     def __init__(self, root):
@@ -41,7 +43,14 @@ class BookScannerApp:
         self.base_location_var = None
         self.base_filename_var = None
         
+        # Logging: the output widget shows INFO and above, the rotating log file
+        # gets BOOK_SCANNER_LOG_LEVEL and above (set DEBUG for per-page details)
+        self.widget_log_level = logging.INFO
+        file_log_level = logging.getLevelName(os.environ.get("BOOK_SCANNER_LOG_LEVEL", "INFO").upper())
+        self.log_sink = LogSink(level=file_log_level if isinstance(file_log_level, int) else logging.INFO)
+        
         # Initialize modular components
+        self.ui_channel = UIChannel(self)
         self.gui_components = GUIComponents(self)
         self.selection_handlers = SelectionHandlers(self)
         self.capture_processor = CaptureProcessor(self)
@@ -50,6 +59,9 @@ class BookScannerApp:
         # Create the GUI
         self.gui_components.create_widgets()
         
+        # Worker threads post UI updates to the channel; the Tk thread applies them
+        self.ui_channel.start()
+        
         # Load previous settings after GUI is created
         self.settings_manager.load_settings()
         
@@ -60,24 +72,64 @@ class BookScannerApp:
         self.log_message("Use the Settings section to manage saved preferences.")
         self.log_message("")
         
-        # Disable failsafe to prevent interruption during automation
-        pyautogui.FAILSAFE = False
+        # pyautogui and the OCR libraries are imported on first use to keep startup fast.
+        # Once the window is up, the OCR libraries are loaded in the background
+        # (set BOOK_SCANNER_WARM_UP=0 to skip this)
+        if os.environ.get("BOOK_SCANNER_WARM_UP", "1") != "0":
+            self.root.after(1000, self._start_ocr_warm_up)
         
-    def log_message(self, message):
-        """Add message to output text widget"""
+    def _start_ocr_warm_up(self):
+        """Import the OCR and cloud libraries in a background thread"""
+        try:
+            from google_vision_ocr import start_warm_up
+        except ImportError as e:
+            self.log_message("OCR warm-up skipped: %s", e, level=logging.DEBUG)
+            return
+        start_warm_up()
+        
+    def log_message(self, message, *args, level=logging.INFO):
+        """
+        Add message to output text widget and log file (safe to call from any thread).
+        With args, message is a %-format string that is only formatted when the level
+        is enabled, so disabled debug lines cost almost nothing.
+        """
+        to_widget = level >= self.widget_log_level
+        to_file = self.log_sink.enabled_for(level)
+        if not (to_widget or to_file):
+            return
+        if args:
+            message = message % args
+        if to_file:
+            self.log_sink.write(level, message)
+        if not to_widget:
+            return
         # Check if output_text widget exists (GUI has been created)
         if hasattr(self, 'output_text') and self.output_text:
-            self.output_text.insert(tk.END, f"{message}\n")
-            self.output_text.see(tk.END)
-            self.root.update_idletasks()
+            self.ui_channel.log(message)
         else:
             # If GUI not ready, just print to console
             print(f"[Book Scanner] {message}")
+            
+    def set_status(self, text):
+        """Update the status label (safe to call from any thread)"""
+        self.ui_channel.set_status(text)
+        
+    def set_progress(self, value):
+        """Update the progress bar (safe to call from any thread)"""
+        self.ui_channel.set_progress(value)
+        
+    def call_on_ui(self, func, *args, **kwargs):
+        """Run a Tk call on the Tk thread (safe to call from any thread)"""
+        self.ui_channel.call(func, *args, **kwargs)
         
     # Delegate methods to modular components
     def select_capture_area(self):
         """Delegate to selection handlers - overlay method"""
         self.selection_handlers.select_capture_area()
+
+    def detect_capture_area(self):
+        """Delegate to selection handlers - automatic page detection"""
+        self.selection_handlers.detect_capture_area()
         
     def select_next_button(self):
         """Delegate to selection handlers"""
@@ -87,6 +139,10 @@ class BookScannerApp:
         """Delegate to capture processor"""
         self.capture_processor.start_capture_process()
         
+    def resume_capture_process(self):
+        """Delegate to capture processor"""
+        self.capture_processor.resume_capture_process()
+        
     def stop_capture(self):
         """Delegate to capture processor"""
         self.capture_processor.stop_capture()
@@ -219,7 +275,7 @@ class BookScannerApp:
             sys.path.insert(0, src_dir)
         
         try:
-            from google_vision_ocr import process_pdf, upload_to_gcs_and_process
+            from google_vision_ocr import ocr_pdf
         except ImportError as e:
             self.log_message(f"Error importing OCR module: {e}")
             messagebox.showerror("Import Error", "Could not import OCR module. Please check installation.")
@@ -234,8 +290,8 @@ class BookScannerApp:
                 "or edit src/google_vision_ocr.py to add the credentials path directly.")
             return
         
-        # Default to async OCR method (faster, requires Google Cloud Storage)
-        use_async = True
+        # GCS bucket for the async method; the router may pick a faster method without it
+        bucket_name = "book-scanner-ocr-bucket"
         
         # Open file dialog to select PDF
         pdf_file = filedialog.askopenfilename(
@@ -247,7 +303,6 @@ class BookScannerApp:
             return  # User cancelled
         
         self.log_message(f"Selected PDF: {os.path.basename(pdf_file)}")
-        self.log_message("Using Async Document Detection (default method)")
         
         # Determine output folder and filename
         base_location = self.base_location_var.get().strip() if hasattr(self, 'base_location_var') and self.base_location_var else ""
@@ -279,65 +334,48 @@ class BookScannerApp:
         
         # Start OCR processing in a separate thread
         def run_pdf_ocr():
+            method_names = {
+                "inline": "Inline Document Detection",
+                "image": "Traditional",
+                "gcs": "Async Document Detection",
+            }
             try:
-                if use_async:
-                    # Use async document detection with GCS
-                    bucket_name = "book-scanner-ocr-bucket"
-                    
-                    self.status_label.config(text="Processing PDF with Async Document Detection...")
-                    self.log_message("Starting Async Document Detection OCR...")
-                    self.log_message(f"Using GCS bucket: {bucket_name}")
-                    
-                    # Process with async method
-                    extracted_text = upload_to_gcs_and_process(pdf_file, bucket_name, output_folder=output_folder)
-                    
-                    # Save the result with custom filename
-                    output_file = output_base + "_async.txt"
-                    with open(output_file, 'w', encoding='utf-8') as f:
-                        f.write(extracted_text)
-                    
-                    self.status_label.config(text="Async OCR processing completed!")
-                    self.log_message("✅ Async OCR processing completed!")
-                    self.log_message(f"Text extracted to: {output_file}")
-                    self.log_message(f"Extracted {len(extracted_text)} characters")
-                    
-                else:
-                    # Use traditional method
-                    self.status_label.config(text="Processing PDF with Traditional OCR...")
-                    self.log_message("Starting Traditional OCR processing...")
-                    
-                    # Process the PDF with traditional method
-                    process_pdf(pdf_file, output_folder)
-                    
-                    # Create output file path for display - use custom base filename if available
-                    output_file = output_base + ".txt"
-                    
-                    self.status_label.config(text="Traditional OCR processing completed!")
-                    self.log_message("✅ Traditional OCR processing completed!")
-                    self.log_message(f"Text extracted to: {output_file}")
+                self.set_status("Processing PDF with OCR...")
+                self.log_message("Starting OCR processing (method picked by page count and size)...")
+                
+                # The router picks inline 5-page requests, per-page images or async GCS
+                extracted_text, method = ocr_pdf(pdf_file, bucket_name)
+                method_name = method_names[method]
+                if method == "gcs":
+                    self.log_message(f"Used GCS bucket: {bucket_name}")
+                
+                # Save the result with custom filename
+                output_file = output_base + ".txt"
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    f.write(extracted_text)
                 
-                # Log completion message without showing dialog
-                method_name = "Async Document Detection" if use_async else "Traditional"
+                self.set_status(f"{method_name} OCR processing completed!")
                 self.log_message(f"✅ {method_name} OCR processing completed!")
+                self.log_message(f"Text extracted to: {output_file}")
+                self.log_message(f"Extracted {len(extracted_text)} characters")
                 self.log_message(f"Text file saved as: {os.path.basename(output_file)}")
                 self.log_message(f"Location: {output_folder}")
                 
             except Exception as e:
-                error_msg = f"❌ {('Async' if use_async else 'Traditional')} OCR Error: {str(e)}"
-                self.status_label.config(text="OCR processing failed")
+                error_msg = f"❌ OCR Error: {str(e)}"
+                self.set_status("OCR processing failed")
                 self.log_message(error_msg)
                 
-                if use_async and ("bucket" in str(e).lower() or "storage" in str(e).lower()):
-                    messagebox.showerror("Async OCR Error", 
+                if "bucket" in str(e).lower() or "storage" in str(e).lower():
+                    self.call_on_ui(messagebox.showerror, "Async OCR Error", 
                         f"Failed to process PDF with Async method:\n{str(e)}\n\n"
                         "Troubleshooting:\n"
                         "1. Check if GCS bucket 'book-scanner-ocr-bucket' exists\n"
                         "2. Verify Cloud Storage API is enabled\n"
                         "3. Ensure google-cloud-storage package is installed\n"
-                        "4. Check service account permissions\n\n"
-                        "Try the Traditional method if Async continues to fail.")
+                        "4. Check service account permissions")
                 else:
-                    messagebox.showerror("OCR Error", f"Failed to process PDF:\n{str(e)}")
+                    self.call_on_ui(messagebox.showerror, "OCR Error", f"Failed to process PDF:\n{str(e)}")
         
         # Run in separate thread to avoid blocking UI
         thread = threading.Thread(target=run_pdf_ocr)
@@ -413,7 +451,10 @@ class BookScannerApp:
 def main():
     root = tk.Tk()
     app = BookScannerApp(root)
-    root.mainloop()
+    try:
+        root.mainloop()
+    finally:
+        app.log_sink.stop()
 
 
 if __name__ == "__main__":
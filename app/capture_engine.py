@@ -0,0 +1,912 @@
+"""
+Capture Engine Module for Book Scanner
+Screenshot capture loop, duplicate detection and PDF/OCR output with no GUI dependency.
+Used by the Tk GUI (through CaptureProcessor) and by the command line (cli.py).
+"""
+import datetime
+import functools
+import hashlib
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+from capture_session import CaptureSession, SessionFullError, SessionMismatchError
+from capture_options import BLANK_POLICIES, OutputOptions, PageOptions
+from compare_mask import learn_compare_mask
+from page_region import StableCrop, is_blank_page, padded_words, split_spread
+from scroll_stitch import StripStitcher
+from stall_watchdog import StallWatchdog
+
+# Add src directory to path to import our modules
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+# Default folder for PDFs and text files
+DEFAULT_OUTPUT_FOLDER = os.path.join(os.path.expanduser("~"), "Documents", "book-scanner")
+
+# Pixels between the watchdog's refocus click and the page content (or the capture area)
+FOCUS_OFFSET = 10
+
+
+def calculate_image_hash(image):
+    """Calculate a hash for the image to detect duplicates"""
+    # Convert image to RGB if it's not already
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    # Resize to a standard size for consistent hashing
+    image = image.resize((64, 64), Image.LANCZOS)
+
+    # Calculate MD5 hash of the image data
+    return hashlib.md5(image.tobytes()).hexdigest()
+
+
+def resolve_output_base(base_location="", base_filename=""):
+    """
+    Work out where the PDF goes, using the same defaults as the GUI.
+
+    Returns:
+        tuple: (output_folder, filename_base) with no file extension
+    """
+    output_folder = base_location or DEFAULT_OUTPUT_FOLDER
+    if base_filename:
+        filename_base = base_filename
+    else:
+        # Generate unique filename with timestamp
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename_base = f"captured_book_{timestamp}"
+    return output_folder, filename_base
+
+
+def load_profile(path):
+    """
+    Read capture settings from a settings file saved by the GUI.
+
+    Returns:
+        dict: top_left, bottom_right, next_button_pos (tuples or None), total_pages (int),
+              base_location, base_filename, trim_margins, spread, watchdog and learn_mask (bools),
+              compare_roi (box or None), compare_ignore (list of boxes) and blank_pages
+              (a BLANK_POLICIES name or None)
+    """
+    with open(path, 'r') as f:
+        settings = json.load(f)
+
+    def point(key):
+        return tuple(settings[key]) if settings.get(key) else None
+
+    return {
+        'top_left': point('top_left'),
+        'bottom_right': point('bottom_right'),
+        'next_button_pos': point('next_button_pos'),
+        'total_pages': int(settings.get('total_pages') or 0),
+        'base_location': settings.get('base_location', ""),
+        'base_filename': settings.get('base_filename', ""),
+        'trim_margins': bool(settings.get('trim_margins')),
+        'spread': bool(settings.get('spread')),
+        'watchdog': bool(settings.get('watchdog')),
+        'learn_mask': bool(settings.get('learn_mask')),
+        'compare_roi': tuple(settings['compare_roi']) if settings.get('compare_roi') else None,
+        'compare_ignore': [tuple(box) for box in settings.get('compare_ignore') or ()],
+        'blank_pages': settings.get('blank_pages') if settings.get('blank_pages') in BLANK_POLICIES else None,
+    }
+
+
+class DesktopScreen:
+    """Screenshots and clicks on the real desktop; pyautogui is imported on first use"""
+
+    def __init__(self, log=None):
+        self.log = log or (lambda message, *args, **kwargs: None)
+        self._pyautogui = None
+
+    @property
+    def pyautogui(self):
+        if self._pyautogui is None:
+            import pyautogui
+            # Disable failsafe to prevent interruption during automation
+            pyautogui.FAILSAFE = False
+            self._pyautogui = pyautogui
+        return self._pyautogui
+
+    def screenshot(self, region):
+        """Take a high-quality screenshot, using native methods on macOS for better resolution"""
+        try:
+            if platform.system() == 'Darwin':  # macOS
+                # Try using macOS screencapture for higher quality
+                x, y, width, height = region
+                temp_file = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
+                temp_file.close()
+
+                # Use screencapture with region
+                cmd = [
+                    'screencapture',
+                    '-x',  # No sound
+                    '-R', f'{x},{y},{width},{height}',
+                    temp_file.name
+                ]
+
+                result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+
+                if result.returncode == 0:
+                    # Load the screenshot
+                    screenshot = Image.open(temp_file.name)
+                    screenshot.load()
+                    self.log("High-quality capture: %s", screenshot.size, level=logging.DEBUG)
+
+                    # Clean up temp file
+                    os.unlink(temp_file.name)
+                    return screenshot
+                else:
+                    self.log(f"screencapture failed: {result.stderr}, falling back to pyautogui")
+
+            # Fallback to pyautogui for non-macOS or if screencapture fails
+            return self.pyautogui.screenshot(region=region)
+
+        except Exception as e:
+            self.log(f"High-quality capture failed: {e}, using pyautogui")
+            return self.pyautogui.screenshot(region=region)
+
+    def click(self, position):
+        self.pyautogui.click(position)
+
+    def scroll(self, position, amount):
+        """Scroll the window under position down by amount wheel steps"""
+        x, y = position
+        self.pyautogui.scroll(-amount, x=x, y=y)
+
+    def press(self, key):
+        """Press a key in the focused window"""
+        self.pyautogui.press(key)
+
+
+class CaptureEngine:
+    """
+    Captures a book page by page: screenshot, duplicate check, click next.
+
+    Progress is reported through optional callbacks (log, on_status, on_progress),
+    and run_iter() yields one event dict per page, so callers can drive the loop
+    from a GUI thread, a script or a benchmark.
+    """
+
+    def __init__(self, top_left, bottom_right, next_button_pos, total_pages,
+                 base_location="", base_filename="", screen=None,
+                 log=None, on_status=None, on_progress=None,
+                 start_delay=3.0, click_delay=0.3, page_delay=1.0,
+                 max_duplicates=4, click_sound=True, session=None, verify_resume=True,
+                 page_options=None, output_options=None):
+        """
+        Args:
+            top_left (tuple): (x, y) of the capture area's top-left corner
+            bottom_right (tuple): (x, y) of the capture area's bottom-right corner
+            next_button_pos (tuple): (x, y) of the reader's next-page button (not needed when scrolling)
+            total_pages (int): Maximum number of pages to capture
+            base_location (str): Output folder, or "" for ~/Documents/book-scanner
+            base_filename (str): Output name without extension, or "" for a timestamped name
+            screen: Object with screenshot(region), click(position), scroll(position, amount)
+                and press(key); defaults to DesktopScreen
+            log (callable): log(message, *args, level=logging.INFO)
+            on_status (callable): Receives short status strings
+            on_progress (callable): Receives a percentage (capture covers 0-50)
+            start_delay (float): Seconds to wait before the first capture
+            click_delay (float): Seconds to wait before clicking next
+            page_delay (float): Seconds to wait after clicking next for the page to load
+            max_duplicates (int): Consecutive duplicates that mean the end of the book
+            click_sound (bool): Play a click sound on macOS/Windows when turning the page
+            session (CaptureSession, optional): Session to resume; begin() starts a new one otherwise
+            verify_resume (bool): Check that the reader shows the session's last page before resuming
+            page_options (PageOptions, optional): How frames become pages (trim, spread, scroll
+                mode, watchdog, compare mask, blank pages); default: one plain page per frame
+            output_options (OutputOptions, optional): Session storage, OCR and PDF options
+        """
+        page_options = page_options or PageOptions()
+        output_options = output_options or OutputOptions()
+        if not top_left or not bottom_right:
+            raise ValueError("Capture area is not set")
+        if not next_button_pos and not page_options.scroll_amount:
+            raise ValueError("Next button position is not set")
+        if total_pages <= 0:
+            raise ValueError("Number of pages must be positive")
+
+        self.top_left = tuple(top_left)
+        self.bottom_right = tuple(bottom_right)
+        self.next_button_pos = tuple(next_button_pos) if next_button_pos else None
+        self.total_pages = total_pages
+        self.base_location = base_location
+        self.base_filename = base_filename
+        self.log = log or (lambda message, *args, **kwargs: None)
+        self.on_status = on_status or (lambda text: None)
+        self.on_progress = on_progress or (lambda value: None)
+        self.screen = screen or DesktopScreen(self.log)
+        self.start_delay = start_delay
+        self.click_delay = click_delay
+        self.page_delay = page_delay
+        self.max_duplicates = max_duplicates
+        self.click_sound = click_sound
+        self.page_options = page_options
+        self.output_options = output_options
+
+        self.stop_requested = False
+        self.stop_reason = None
+        # Set when the output cannot be verified, so the pages are not lost
+        self.keep_session = output_options.keep_session
+        self.stitcher = None
+        # Newest scrolled frame; its id is saved as 'last_frame' when pages are cut and on stop
+        self.last_frame = None
+        # Replaced by the learned mask when page_options.learn_mask is set
+        self.compare_mask = page_options.compare_mask
+        self.watchdog = None
+        if page_options.watchdog:
+            # A recovery counts only if the masked page fingerprints change, not the reader UI
+            self.watchdog = StallWatchdog({
+                'refocus': self._refocus,
+                'reclick': self.turn_page,
+                'page_down': lambda: self.screen.press('pagedown'),
+            }, lambda: self._page_id(self.screen.screenshot(self.region)), settle=2 * page_delay, log=self.log)
+        # Trim boxes by session setting name: 'trim_box', or 'trim_box_left'/'trim_box_right' for spreads
+        self.trims = {}
+        self.pixels_captured = 0
+        self.pixels_saved = 0
+        self.streamer = None
+        self.ocr_calls_saved = 0
+        self.duplicate_count = 0
+        # Fingerprints of the previous frame's pages (two for a spread)
+        self.previous_hashes = set()
+        self.session = session
+        self.verify_resume = verify_resume
+        self.start_index = 0
+
+    @classmethod
+    def from_session(cls, session, **kwargs):
+        """
+        Engine that continues a saved session, using the settings it was started with.
+
+        Raises:
+            SessionLockedError: Another capture is still writing to the session
+        """
+        session.lock()
+        settings = session.settings
+        # Fingerprints in the manifest were taken with the saved compare mask
+        kwargs.setdefault('page_options', PageOptions.from_settings(settings))
+        return cls(settings['top_left'], settings['bottom_right'], settings['next_button_pos'],
+                   settings['total_pages'], base_location=settings['output_folder'],
+                   base_filename=settings['filename_base'], session=session, **kwargs)
+
+    @property
+    def images(self):
+        """Manifest records (index, file, offset, length, fingerprint) of the saved pages"""
+        return self.session.pages if self.session is not None else []
+
+    @property
+    def region(self):
+        """Capture region in pyautogui format (left, top, width, height)"""
+        x1, y1 = self.top_left
+        x2, y2 = self.bottom_right
+        return (x1, y1, x2 - x1, y2 - y1)
+
+    def stop(self):
+        """Ask the capture loop to stop before the next page (safe to call from any thread)"""
+        self.stop_requested = True
+
+    def begin(self):
+        """
+        Wait for the reader to be ready and focus it.
+
+        When resuming a session, the screen must still show the last captured page;
+        SessionMismatchError is raised otherwise, before anything is clicked.
+        """
+        resuming = self.session is not None and bool(self.session.pages)
+        self.on_status("Capturing screenshots...")
+        self.log(f"Starting capture of {self.total_pages} pages...")
+        self.log(f"Waiting {self.start_delay:g} seconds before starting capture...")
+        if resuming:
+            self.log(f"Resuming session {self.session.path} after {len(self.session.pages)} saved pages")
+            self.log("Make sure the reader still shows the LAST captured page!")
+        else:
+            self.log("Make sure you're on the FIRST page you want to capture!")
+        self.log("Make sure your book reader application is focused and ready!")
+        time.sleep(self.start_delay)  # Give user time to prepare and ensure we capture current page
+
+        if self.session is None:
+            output_folder, filename_base = resolve_output_base(self.base_location, self.base_filename)
+            # Fix the name now, so a resumed capture writes the same PDF
+            self.base_location, self.base_filename = output_folder, filename_base
+            self.session = CaptureSession.create(output_folder, filename_base, self.top_left,
+                                                 self.bottom_right, self.next_button_pos, self.total_pages,
+                                                 disk_budget=self.output_options.disk_budget)
+            if self.page_options.learn_mask:
+                self.compare_mask, learned = learn_compare_mask(lambda: self.screen.screenshot(self.region),
+                                                                self.compare_mask.roi, self.compare_mask.ignore)
+                self.log(f"Comparison mask learned: {learned}")
+            # Resuming must capture the same way
+            options = self.page_options.settings()
+            if self.compare_mask:
+                options.update(self.compare_mask.settings())
+            if options:
+                self.session.mark('capturing', **options)
+            self.log(f"Session folder: {self.session.path}")
+
+        self.duplicate_count = 0
+        self.previous_hashes = set(self.session.last_fingerprints())
+        self.start_index = self.session.next_index
+        self.trims = {}
+        self.stitcher = StripStitcher(self.page_options.page_height) if self.page_options.scroll_amount else None
+        self.last_frame = None
+
+        if resuming and self.stitcher is not None:
+            # The strip restarts from the frame on screen, whose rows are already saved
+            screenshot = self.screen.screenshot(self.region)
+            if self.verify_resume and self._frame_id(screenshot) != self.session.settings.get('last_frame'):
+                raise SessionMismatchError("The reader has scrolled since the capture stopped. "
+                                           "Scroll back to where it stopped and resume again.")
+            self.stitcher.reset(screenshot)
+            self.log(f"Continuing with scroll step {self.start_index + 1}")
+            if self.start_index < self.total_pages:
+                self.advance()
+            return
+
+        if resuming:
+            if self.verify_resume:
+                screenshot = self.screen.screenshot(self.region)
+                first_page = self._fingerprints(screenshot, self._split(screenshot))[0]
+                if not self.session.matches_last_page(first_page):
+                    raise SessionMismatchError(
+                        f"The reader is not showing the last captured page (page {self.start_index}). "
+                        "Go back to that page and resume again.")
+                self.log("Reader is on the last captured page")
+            if self.session.pages[-1].get('half') == 'left':
+                # Stopped between the two pages of a spread: capture the same spread again;
+                # its left page is skipped as a duplicate
+                self.start_index -= 1
+                self.log("The right page of the last spread was not saved; capturing that spread again")
+                return
+            self.log(f"Continuing with page {self.start_index + 1}")
+            # The next-page click also focuses the reader
+            if self.start_index < self.total_pages:
+                self.advance()
+            return
+
+        if self.stitcher is not None:
+            # Scrolling moves the mouse over the reader; no click needed
+            return
+
+        # Ensure the target application has focus by clicking on the next button area first
+        self.screen.click(self.next_button_pos)
+        time.sleep(0.5)  # Brief pause after focus click
+
+    def step(self, index):
+        """
+        Capture page index (0-based) and check it against the previous page.
+
+        Returns:
+            dict: Event with 'type' of 'page_saved' (with 'offset' and 'length'), 'duplicate'
+                  (with 'count'), 'recovered' (with the watchdog's 'action') or 'end_of_book',
+                  plus 'page' (1-based)
+        """
+        self.on_progress((index / self.total_pages) * 50)  # First 50% for capture
+        page = index + 1
+        self.log("Capturing page %d/%d - Region: %s", page, self.total_pages, self.region, level=logging.DEBUG)
+
+        screenshot = self.screen.screenshot(self.region)
+        if self.stitcher is not None:
+            return self._scroll_step(index, screenshot)
+        parts = self._split(screenshot)
+        halves = ['left', 'right'] if len(parts) == 2 else [None]
+        # Only the previous frame's hashes are kept, so each page is hashed once
+        hashes = self._fingerprints(screenshot, parts)
+        new = [position for position, image_hash in enumerate(hashes) if image_hash not in self.previous_hashes]
+
+        if not new:
+            return self._duplicate(page, screenshot)
+
+        # Reset duplicate count if images are different
+        self.duplicate_count = 0
+        if self.watchdog is not None:
+            self.watchdog.progress()
+        self.previous_hashes = set(hashes)
+
+        records = [self._save_page(index, parts[position], hashes[position], halves[position]) for position in new]
+        for record in records:
+            self.log("Saved page %d at offset %d (%d bytes)", page, record['offset'], record['length'])
+        return {'type': 'page_saved', 'page': page, 'offset': records[0]['offset'],
+                'length': sum(record['length'] for record in records), 'saved': len(records)}
+
+    def _duplicate(self, page, screenshot):
+        self.duplicate_count += 1
+        self.log("Images are identical (same hash)")
+        self.log(f"⚠️  Duplicate image detected! (Count: {self.duplicate_count})")
+        if self.watchdog is not None:
+            self.watchdog.duplicate()
+            if self.duplicate_count >= self.max_duplicates:
+                # A stalled reader looks like the end of the book; only a reader nothing moves has ended
+                action = self.watchdog.recover(page, self._page_id(screenshot))
+                if action:
+                    self.duplicate_count = 0
+                    return {'type': 'recovered', 'page': page, 'action': action}
+        if self.duplicate_count >= self.max_duplicates:
+            self.log(f"🛑 {self.max_duplicates} consecutive duplicate images found - assuming end of book reached")
+            self.log("Stopping capture process...")
+            return {'type': 'end_of_book', 'page': page}
+        self.log("Skipping duplicate image, continuing...")
+        return {'type': 'duplicate', 'page': page, 'count': self.duplicate_count}
+
+    def _scroll_step(self, index, screenshot):
+        """Add a scrolled frame to the strip and save the pages it completes"""
+        page = index + 1
+        start = time.perf_counter()
+        new_rows = self.stitcher.add(screenshot)
+        self.log("Frame %d: %d new rows, overlap found in %.1f ms", page, new_rows,
+                 (time.perf_counter() - start) * 1000, level=logging.DEBUG)
+        if not new_rows:
+            return self._duplicate(page, screenshot)
+        self.duplicate_count = 0
+        if self.watchdog is not None:
+            self.watchdog.progress()
+        self.last_frame = screenshot
+        event = self._save_strip_pages(index, self.stitcher.pop_pages(), rows=new_rows)
+        if event['saved']:
+            self._mark_last_frame()
+        return event
+
+    def _save_strip_pages(self, index, pages, **extra):
+        records = [self._save_page(index, image, calculate_image_hash(image), None) for image in pages]
+        for record in records:
+            self.log("Saved page %d at offset %d (%d bytes)", len(self.images), record['offset'], record['length'])
+        event = {'type': 'page_saved' if records else 'scrolled', 'page': index + 1, 'saved': len(records)}
+        if records:
+            event.update(offset=records[0]['offset'], length=sum(record['length'] for record in records))
+        event.update(extra)
+        return event
+
+    def _flush_strip(self, index):
+        """Save the rows left in the strip as a last, shorter page"""
+        if self.stitcher is not None and self.stitcher.height():
+            self._save_strip_pages(index, self.stitcher.pop_pages(flush=True))
+        self._mark_last_frame()
+
+    def _mark_last_frame(self):
+        # Where a resume has to continue from; written only when pages are saved, not for every frame
+        if self.last_frame is not None:
+            self.session.mark(self.session.status, last_frame=self._frame_id(self.last_frame))
+            self.last_frame = None
+
+    def _fingerprints(self, screenshot, parts):
+        """Fingerprint of each page of a frame, taken of the masked part of the frame it came from"""
+        if not self.compare_mask:
+            return [calculate_image_hash(part) for part in parts]
+        if len(parts) == 1:
+            return [self._frame_id(screenshot)]
+        gutter = parts[0].width
+        return [calculate_image_hash(self.compare_mask.apply(screenshot, box))
+                for box in ((0, 0, gutter, screenshot.height), (gutter, 0, screenshot.width, screenshot.height))]
+
+    def _page_id(self, screenshot):
+        """Fingerprints of the pages a frame shows, as compared by duplicate detection"""
+        if self.stitcher is not None:
+            return self._frame_id(screenshot)
+        return tuple(self._fingerprints(screenshot, self._split(screenshot)))
+
+    def _frame_id(self, screenshot):
+        """Fingerprint of a whole frame, without the masked-out reader UI"""
+        return calculate_image_hash(self.compare_mask.apply(screenshot))
+
+    def _split(self, screenshot):
+        """The pages shown in a frame: both halves of a spread, or the whole frame"""
+        return split_spread(screenshot) if self.page_options.spread else [screenshot]
+
+    def _save_page(self, index, image, fingerprint, half):
+        # Duplicates and resume are checked on the untrimmed page; only the saved page is trimmed
+        page_image = image
+        extra = {'half': half} if half else {}
+        if self.page_options.trim_margins:
+            key = 'trim_box' if half is None else f'trim_box_{half}'
+            if key not in self.trims:
+                self.trims[key] = StableCrop(self.session.settings.get(key))
+            crop = self.trims[key]
+            if crop.update(image):
+                self.session.mark(self.session.status, **{key: list(crop.box)})
+                self.log("Trim box (%s) is now %s", half or "page", crop.box, level=logging.DEBUG)
+            page_image = crop.apply(image)
+            # The PDF pads pages cut before the box grew again to the final box
+            extra['trim_box'] = list(crop.box)
+        self.pixels_captured += image.width * image.height
+        self.pixels_saved += page_image.width * page_image.height
+
+        captured = page_image
+        if self.page_options.blank_pages and is_blank_page(image):
+            extra['blank'] = self.page_options.blank_pages
+            if self.page_options.blank_pages == 'placeholder':
+                page_image = Image.new('1', page_image.size, 1)
+            elif self.page_options.blank_pages == 'drop':
+                # The record stays in the manifest for duplicate checks and resume
+                page_image = Image.new('1', (1, 1), 1)
+        record = self.session.add_page(index, page_image, fingerprint, **extra)
+        if 'blank' in extra:
+            self._count_blank(captured, record)
+        if self.streamer is not None:
+            self._stream_page(len(self.images) - 1)
+        return record
+
+    def _count_blank(self, captured, record):
+        """Record a blank page and the bytes its policy saved in the session settings"""
+        saved = 0
+        if record['blank'] != 'skip-ocr':
+            buffer = io.BytesIO()
+            captured.save(buffer, format='PNG')
+            saved = max(0, buffer.tell() - record['length'])
+        settings = self.session.settings
+        self.session.mark(self.session.status, blank_count=settings.get('blank_count', 0) + 1,
+                          blank_bytes_saved=settings.get('blank_bytes_saved', 0) + saved)
+        self.log(f"Page {len(self.images)} is blank ({record['blank']})")
+
+    def advance(self):
+        """Click the next-page button (or scroll, in scroll mode) and wait for the page to load"""
+        self.turn_page()
+        # Wait for page to load and stabilize
+        # This helps prevent the "first click doesn't work" issue
+        time.sleep(self.page_delay)
+
+    def _refocus_point(self):
+        """
+        Where to click to give the reader the focus back: the focus point if one was given,
+        else beside the page content, so the click cannot follow a link or toggle the reader's
+        page UI. That is the wider margin between the content region and the capture area
+        edge, or just outside the capture area when the content fills it.
+        """
+        if self.page_options.focus_point:
+            return self.page_options.focus_point
+        (left, top), (right, bottom) = self.top_left, self.bottom_right
+        middle = (top + bottom) // 2
+        roi = self.compare_mask.roi
+        if roi:
+            left_margin, right_margin = roi[0], (right - left) - roi[2]
+            if max(left_margin, right_margin) >= 2 * FOCUS_OFFSET:
+                if left_margin >= right_margin:
+                    return left + left_margin // 2, middle
+                return right - right_margin // 2, middle
+        if left >= FOCUS_OFFSET:
+            return left - FOCUS_OFFSET, middle
+        return right + FOCUS_OFFSET, middle
+
+    def _refocus(self):
+        """Click the reader to give it the focus back, then turn the page again"""
+        point = self._refocus_point()
+        self.log("Refocusing the reader at %s", point, level=logging.DEBUG)
+        self.screen.click(point)
+        time.sleep(0.5)
+        self.turn_page()
+
+    def turn_page(self):
+        """Click the next-page button (or scroll, in scroll mode) without waiting for the page"""
+        if self.page_options.scroll_amount:
+            self.log("Scrolling down %d steps", self.page_options.scroll_amount, level=logging.DEBUG)
+        else:
+            self.log("Clicking next button at %s", self.next_button_pos, level=logging.DEBUG)
+
+        # Make a click sound for testing feedback
+        if self.click_sound:
+            if platform.system() == 'Darwin':  # macOS
+                subprocess.run(['afplay', '/System/Library/Sounds/Pop.aiff'], capture_output=True)
+            elif platform.system() == 'Windows':
+                import winsound
+                winsound.MessageBeep(winsound.MB_OK)
+
+        # Add a small delay before clicking to ensure stability
+        time.sleep(self.click_delay)
+        if self.page_options.scroll_amount:
+            x, y, width, height = self.region
+            self.screen.scroll((x + width // 2, y + height // 2), self.page_options.scroll_amount)
+        else:
+            self.screen.click(self.next_button_pos)
+
+    def _start_streaming(self):
+        """Start streaming OCR and queue the pages a resumed session already has"""
+        from streaming_ocr import StreamingOCR
+
+        text_path = os.path.join(self.base_location, self.base_filename + ".pdf.txt")
+        output = self.output_options
+        self.streamer = StreamingOCR(text_path, window=output.ocr_window, ocr_image=output.ocr_image,
+                                     layout=output.searchable, log=self.log)
+        for position in range(len(self.images)):
+            self._stream_page(position)
+        self.log(f"Streaming OCR started ({self.output_options.ocr_window} pages in flight)")
+
+    def _stream_page(self, position):
+        if self.images[position].get('blank'):
+            # Keep the page number in the text so the pages after it line up with the book
+            self.streamer.skip(position + 1, f"[Page {position + 1}: blank page]\n\n")
+            return
+        self.streamer.submit(position + 1, functools.partial(self.session.page_bytes, position))
+
+    def cancel_streaming(self):
+        """Stop streaming OCR and drop its partial text (a resume streams every page again)"""
+        if self.streamer is not None:
+            self.streamer.abort()
+            self.streamer = None
+
+    def _stopped(self, page):
+        self.cancel_streaming()
+        # Leave the session free for a resume
+        self.session.close()
+        return {'type': 'stopped', 'page': page, 'reason': self.stop_reason}
+
+    def run_iter(self, interleave=False):
+        """
+        Capture every page, yielding one event dict per page.
+
+        A final 'stopped' event is yielded if stop() was called or the session's
+        disk budget was reached (self.stop_reason says which). Saved pages are
+        listed in self.images. A session that already finished capturing yields
+        nothing and goes straight to the PDF/OCR steps.
+
+        Args:
+            interleave (bool): Do not sleep while the next page loads; yield a 'page_turned'
+                event with 'ready_at' (time.monotonic()) instead, so a scheduler can
+                capture other readers meanwhile (see multi_capture.py)
+        """
+        if self.session is not None and self.session.status != 'capturing':
+            self.log(f"Session already has all {len(self.images)} pages captured")
+            return
+        try:
+            yield from self._capture(interleave)
+        except BaseException:
+            if self.session is not None:
+                self.session.close()
+            raise
+
+    def _capture(self, interleave):
+        self.begin()
+        if self.output_options.stream_ocr:
+            self._start_streaming()
+        index = self.start_index
+        for index in range(self.start_index, self.total_pages):
+            if self.stop_requested:
+                self.stop_reason = self.stop_reason or "user"
+                # A resume restarts the strip from the frame on screen
+                self._flush_strip(index - 1)
+                yield self._stopped(index + 1)
+                return
+            try:
+                event = self.step(index)
+            except SessionFullError as e:
+                self.log(f"🛑 {e}. Free some space and resume the session to continue.")
+                self.stop_reason = "disk_budget"
+                yield self._stopped(index + 1)
+                return
+            yield event
+            if event['type'] == 'end_of_book':
+                break
+            # Stop before turning the page if another page like the last one would not fit,
+            # so the reader stays on the last saved page, ready for resume
+            last_page = self.images[-1] if self.images else None
+            next_length = last_page['length'] * (2 if self.page_options.spread else 1) if last_page else 0
+            if index < self.total_pages - 1 and last_page and not self.session.has_room_for(next_length):
+                self.log("🛑 Disk budget reached. Free some space and resume the session to continue.")
+                self.stop_reason = "disk_budget"
+                yield self._stopped(index + 2)
+                return
+            # Click next button (except for last page); after stop() the reader stays
+            # on the last saved page, ready for resume, and after a recovery it already
+            # shows the next page
+            if index < self.total_pages - 1 and not self.stop_requested and event['type'] != 'recovered':
+                if interleave:
+                    self.turn_page()
+                    yield {'type': 'page_turned', 'page': index + 1, 'ready_at': time.monotonic() + self.page_delay}
+                else:
+                    self.advance()
+        self._flush_strip(index)
+        self.session.mark('captured')
+
+    def save_pdf(self, images=None):
+        """
+        Save the session's pages (or the given image files) as a PDF and return its path.
+        Session pages are read straight from the memory-mapped page container.
+        """
+        # img2pdf pulls in pikepdf, so it is only imported once there is a PDF to write
+        import img2pdf
+
+        self.on_status("Converting to PDF...")
+        self.log(f"Converting {self._pdf_pages() if images is None else len(images)} images to PDF...")
+
+        output_folder, filename_base = resolve_output_base(self.base_location, self.base_filename)
+        os.makedirs(output_folder, exist_ok=True)
+        pdf_path = os.path.join(output_folder, filename_base + ".pdf")
+
+        if self.output_options.compression != "lossless":
+            return self._save_compressed_pdf(pdf_path, images)
+
+        with open(pdf_path, "wb") as f:
+            if images is None:
+                with self.session.page_buffers(dropped=False) as buffers:
+                    img2pdf.convert(*buffers, outputstream=f)
+            else:
+                f.write(img2pdf.convert(images))
+
+        self.log(f"PDF saved to: {pdf_path}")
+        return pdf_path
+
+    def _save_compressed_pdf(self, pdf_path, images=None):
+        from pdf_compression import write_pdf
+
+        compression = self.output_options.compression
+        if images is None:
+            with self.session.page_buffers(dropped=False) as buffers:
+                stats = write_pdf((buffer.read_bytes() for buffer in buffers), pdf_path, compression)
+        else:
+            def read(path):
+                with open(path, 'rb') as f:
+                    return f.read()
+            stats = write_pdf((read(path) for path in images), pdf_path, compression)
+
+        kinds = ", ".join(f"{count} {kind}" for kind, count in sorted(stats['kinds'].items()))
+        self.log(f"PDF saved to: {pdf_path} ({compression}: {kinds} pages, "
+                 f"{stats['input_bytes'] / 1024 / 1024:.1f} MB -> {stats['bytes'] / 1024 / 1024:.1f} MB "
+                 f"in {stats['seconds']:.1f}s)")
+        return pdf_path
+
+    def perform_ocr(self, pdf_path):
+        """
+        Run OCR on the PDF, writing '<name>.pdf.txt' next to it. When streaming,
+        this only waits for the pages still in flight. With searchable=True the
+        PDF is rewritten in place with an invisible text layer.
+
+        Returns:
+            str: Path of the text file
+        """
+        if self.streamer is None and any(record.get('blank') for record in self.images):
+            # OCR the session's pages rather than the PDF, so blank pages are skipped
+            # and still numbered in the text
+            self._start_streaming()
+        if self.streamer is not None:
+            self.on_status("Finishing OCR...")
+            self.log(f"Waiting for {self.streamer.pending()} pages still being OCRed...")
+            text_path = self.streamer.close()
+            self.ocr_calls_saved = self.streamer.skipped
+            if self.ocr_calls_saved:
+                self.log(f"Skipped OCR of {self.ocr_calls_saved} blank pages")
+            if self.streamer.failed:
+                self.log(f"⚠️  OCR failed for pages {self.streamer.failed}; keeping the session")
+                self.keep_session = True
+            if self.output_options.searchable:
+                from searchable_pdf import add_text_layer
+                # Word boxes are keyed by book page; dropped pages are not in the PDF
+                kept = [number for number, record in enumerate(self.images, start=1) if record.get('blank') != 'drop']
+                words = {pdf_page: self._pdf_words(number)
+                         for pdf_page, number in enumerate(kept, start=1) if number in self.streamer.words}
+                add_text_layer(pdf_path, words)
+                self.log(f"Added a searchable text layer to {pdf_path}")
+            self.streamer = None
+            self.log("OCR processing completed!")
+            self.on_progress(100)
+            return text_path
+
+        self.on_status("Performing OCR...")
+        self.log("Starting OCR processing...")
+        output_folder = os.path.dirname(pdf_path)
+        if self.output_options.searchable:
+            from searchable_pdf import make_searchable
+            make_searchable(pdf_path, text_path=os.path.join(output_folder, f"{os.path.basename(pdf_path)}.txt"))
+            self.log(f"Added a searchable text layer to {pdf_path}")
+        else:
+            from google_vision_ocr import process_pdf
+            process_pdf(pdf_path, output_folder)
+        self.log("OCR processing completed!")
+        self.on_progress(100)
+        return os.path.join(output_folder, f"{os.path.basename(pdf_path)}.txt")
+
+    def _pdf_words(self, number):
+        """Word boxes OCRed for book page number, placed on the page as padded in the PDF"""
+        words = self.streamer.words[number]
+        boxes = self.session.trim_boxes(self.images[number - 1])
+        return words if boxes is None else padded_words(words, *boxes)
+
+    def _pdf_pages(self):
+        """Session pages that go into the PDF (all but the dropped blank pages)"""
+        return sum(1 for record in self.images if record.get('blank') != 'drop')
+
+    def outputs_verified(self, pdf_path, text_path=None):
+        """True if the PDF holds every session page and the text file (when expected) is written"""
+        from google_vision_ocr import count_pdf_pages
+
+        try:
+            if count_pdf_pages(pdf_path) != self._pdf_pages():
+                return False
+        except Exception as e:
+            self.log(f"Could not read {pdf_path}: {e}")
+            return False
+        return text_path is None or (os.path.exists(text_path) and os.path.getsize(text_path) > 0)
+
+    def finish(self, pdf_path, text_path=None):
+        """
+        Mark the session done once its outputs are written, so it is no longer offered
+        for resume, and delete its pages if the outputs check out.
+        """
+        if self.session is None:
+            return
+        self.session.mark('done', pdf_path=pdf_path, text_path=text_path)
+        if self.keep_session:
+            self.session.close()
+        elif self.outputs_verified(pdf_path, text_path):
+            self.log(f"Outputs verified, removing session {self.session.path}")
+            self.session.delete()
+        else:
+            self.session.close()
+            self.log(f"⚠️  Could not verify the outputs; pages are kept in {self.session.path}")
+
+    def run(self, ocr=True):
+        """
+        Capture the book, save the PDF and optionally run OCR.
+
+        Returns:
+            dict: 'pages' captured, 'pdf_path' and 'text_path' (None when not
+                  produced), 'stopped' and 'stop_reason' ('user' or 'disk_budget'),
+                  'seconds' spent capturing, the 'session' folder, 'pixels_kept'
+                  (share of the captured pixels saved after trimming), the watchdog's
+                  'recoveries' (page, action, seconds) and 'seconds_lost' to stalls, and
+                  'blank_pages' found, 'ocr_calls_saved' on them and page 'bytes_saved'
+                  by the blank page policy
+        """
+        start = time.perf_counter()
+        stopped = False
+        for event in self.run_iter():
+            if event['type'] == 'stopped':
+                stopped = True
+        return self.complete(stopped, time.perf_counter() - start, ocr)
+
+    def complete(self, stopped, seconds, ocr=True):
+        """
+        The steps of run() after capturing: save the PDF, run OCR and finish the session.
+
+        Args:
+            stopped (bool): run_iter() ended with a 'stopped' event
+            seconds (float): Time spent capturing
+
+        Returns:
+            dict: As run()
+        """
+        result = {
+            'pages': len(self.images),
+            'pdf_path': None,
+            'text_path': None,
+            'stopped': stopped,
+            'stop_reason': self.stop_reason,
+            'seconds': seconds,  # Capture only, before PDF and OCR
+            'session': self.session.path,
+            'pixels_kept': self.pixels_saved / self.pixels_captured if self.pixels_captured else 1.0,
+            'recoveries': list(self.watchdog.recoveries) if self.watchdog is not None else [],
+            'seconds_lost': self.watchdog.seconds_lost if self.watchdog is not None else 0.0,
+            'blank_pages': self.session.settings.get('blank_count', 0),
+            'ocr_calls_saved': 0,
+            'bytes_saved': self.session.settings.get('blank_bytes_saved', 0),
+        }
+        if result['recoveries']:
+            self.log(f"Watchdog recovered the reader {len(result['recoveries'])} times, "
+                     f"{result['seconds_lost']:.0f}s lost to stalls")
+        if result['blank_pages']:
+            self.log(f"{result['blank_pages']} blank pages ({self.page_options.blank_pages}), "
+                     f"{result['bytes_saved'] / 1024:.0f} KB of page images saved")
+        if self.page_options.trim_margins and self.pixels_captured:
+            self.log(f"Margin trimming kept {result['pixels_kept']:.0%} of the captured pixels")
+        if stopped:
+            self.log("Capture stopped by user." if self.stop_reason == "user" else "Capture stopped: disk budget reached.")
+            return result
+
+        self.log(f"✅ Capture completed! {len(self.images)} pages captured successfully.")
+        if not self.images:
+            self.log("No pages were captured. Process cancelled.")
+            self.cancel_streaming()
+            return result
+
+        result['pdf_path'] = self.save_pdf()
+        if ocr:
+            result['text_path'] = self.perform_ocr(result['pdf_path'])
+            result['ocr_calls_saved'] = self.ocr_calls_saved
+        else:
+            self.cancel_streaming()
+        self.finish(result['pdf_path'], result['text_path'])
+        return result
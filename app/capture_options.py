@@ -0,0 +1,93 @@
+"""
+Capture Options Module for Book Scanner
+Option objects the GUI and the command line build for a CaptureEngine: how captured
+frames become pages (saved with the session, so a resume captures the same way) and
+what is done with the pages (session storage, OCR, PDF).
+"""
+from compare_mask import CompareMask
+
+# What happens to a blank page: a white placeholder page is stored, the page is left out
+# of the PDF, or the page is kept as captured; none of them is sent to OCR
+BLANK_POLICIES = ('placeholder', 'drop', 'skip-ocr')
+
+# Page options kept in the session settings (the compare mask is stored by CompareMask.settings)
+SESSION_SETTINGS = ('trim_margins', 'spread', 'scroll_amount', 'page_height', 'watchdog', 'blank_pages')
+
+
+class PageOptions:
+    """How each captured frame is turned into pages and compared with the previous one"""
+
+    def __init__(self, trim_margins=False, spread=False, scroll_amount=None, page_height=None,
+                 watchdog=False, focus_point=None, compare_roi=None, compare_ignore=None,
+                 learn_mask=False, blank_pages=None):
+        """
+        Args:
+            trim_margins (bool): Cut every page to one content box learned across the book
+            spread (bool): The reader shows two-page spreads; each frame is split at its gutter
+                and saved as two pages (total_pages then counts page turns)
+            scroll_amount (int, optional): Scroll mode for continuous-scroll readers: scroll down by
+                this many wheel steps instead of clicking, stitch the frames into a strip and cut it
+                into pages (total_pages then counts scroll steps)
+            page_height (int, optional): Height in pixels of the pages cut in scroll mode
+                (default: the frame height)
+            watchdog (bool): When the page stops changing, try to recover the reader (refocus,
+                click again, page-down) before deciding the book has ended
+            focus_point (tuple, optional): (x, y) clicked to refocus the reader (default: beside
+                the page content, in the margin left by compare_roi or just outside the capture area)
+            compare_roi (tuple, optional): (left, top, right, bottom) in frame pixels; only this part
+                of a frame is fingerprinted for duplicate and page-change detection
+            compare_ignore (list, optional): Boxes in frame pixels left out of the fingerprints
+                (page counters, progress bars, ads)
+            learn_mask (bool): Before the first page, learn the content region and the pixels that
+                change on their own from a few frames of it (added to the boxes given)
+            blank_pages (str, optional): Policy for blank pages, one of BLANK_POLICIES (default:
+                treat them like any other page); the text file marks each blank page by number
+
+        Raises:
+            ValueError: blank_pages is not one of BLANK_POLICIES
+        """
+        if blank_pages is not None and blank_pages not in BLANK_POLICIES:
+            raise ValueError(f"Unknown blank page policy: {blank_pages}")
+        self.trim_margins = trim_margins
+        self.spread = spread
+        self.scroll_amount = scroll_amount
+        self.page_height = page_height
+        self.watchdog = watchdog
+        self.focus_point = tuple(focus_point) if focus_point else None
+        self.compare_mask = CompareMask(compare_roi, compare_ignore)
+        self.learn_mask = learn_mask
+        self.blank_pages = blank_pages
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Options a session was started with, from its settings"""
+        return cls(**{key: settings.get(key) for key in SESSION_SETTINGS + ('compare_roi', 'compare_ignore')})
+
+    def settings(self):
+        """The options that are set, as session settings (without the compare mask)"""
+        return {key: getattr(self, key) for key in SESSION_SETTINGS if getattr(self, key)}
+
+
+class OutputOptions:
+    """What is done with the captured pages: session storage, OCR and the PDF"""
+
+    def __init__(self, disk_budget=None, keep_session=False, stream_ocr=False, ocr_window=8,
+                 ocr_image=None, searchable=False, compression="lossless"):
+        """
+        Args:
+            disk_budget (int, optional): Bytes of page images a new session may hold; capture
+                stops (resumably) when it is reached
+            keep_session (bool): Keep the session folder after its PDF (and text) are verified
+            stream_ocr (bool): OCR each page as soon as it is saved instead of after the PDF
+            ocr_window (int): Pages at the OCR service at the same time when streaming
+            ocr_image (callable, optional): Page OCR used when streaming (see StreamingOCR)
+            searchable (bool): Give the PDF an invisible text layer from the OCR word boxes
+            compression (str): PDF compression profile, a key of pdf_compression.PROFILES
+        """
+        self.disk_budget = disk_budget
+        self.keep_session = keep_session
+        self.stream_ocr = stream_ocr
+        self.ocr_window = ocr_window
+        self.ocr_image = ocr_image
+        self.searchable = searchable
+        self.compression = compression
@@ -1,24 +1,18 @@
 """
 Capture Processor Module for Book Scanner
-Contains screenshot capture and OCR processing functionality
+Connects the GUI to the capture engine: window handling, dialogs and progress
 """
 import threading
 import os
-import tempfile
 import time
-import datetime
-from tkinter import messagebox
-import pyautogui
-import img2pdf
 import platform
 import subprocess
-import hashlib
+from tkinter import messagebox
 from PIL import Image, ImageChops
 
-# Add src directory to path to import our modules
-import sys
-sys.path.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src'))
-from google_vision_ocr import process_pdf
+from capture_engine import CaptureEngine, DesktopScreen, calculate_image_hash, resolve_output_base
+from capture_options import BLANK_POLICIES, OutputOptions, PageOptions
+from capture_session import SessionLockedError, find_sessions
 
 
 class CaptureProcessor:
@@ -28,19 +22,12 @@ class CaptureProcessor:
         self.app = app_instance
         self.previous_image = None
         self.duplicate_count = 0
+        self.engine = None
+        self.screen = DesktopScreen(app_instance.log_message)
         
     def _calculate_image_hash(self, image):
         """Calculate a hash for the image to detect duplicates"""
-        # Convert image to RGB if it's not already
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Resize to a standard size for consistent hashing
-        image = image.resize((64, 64), Image.LANCZOS)
-        
-        # Calculate MD5 hash of the image data
-        image_bytes = image.tobytes()
-        return hashlib.md5(image_bytes).hexdigest()
+        return calculate_image_hash(image)
     
     def _images_are_similar(self, img1, img2, threshold=0.90):
         """Check if two images are similar using multiple comparison methods"""
@@ -106,41 +93,7 @@ class CaptureProcessor:
         
     def _take_high_quality_screenshot(self, region):
         """Take a high-quality screenshot, using native methods on macOS for better resolution"""
-        try:
-            if platform.system() == 'Darwin':  # macOS
-                # Try using macOS screencapture for higher quality
-                x, y, width, height = region
-                temp_file = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-                temp_file.close()
-                
-                # Use screencapture with region
-                cmd = [
-                    'screencapture', 
-                    '-x',  # No sound
-                    '-R', f'{x},{y},{width},{height}',
-                    temp_file.name
-                ]
-                
-                result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
-                
-                if result.returncode == 0:
-                    # Load the screenshot
-                    from PIL import Image
-                    screenshot = Image.open(temp_file.name)
-                    self.app.log_message(f"High-quality capture: {screenshot.size}")
-                    
-                    # Clean up temp file
-                    os.unlink(temp_file.name)
-                    return screenshot
-                else:
-                    self.app.log_message(f"screencapture failed: {result.stderr}, falling back to pyautogui")
-                    
-            # Fallback to pyautogui for non-macOS or if screencapture fails
-            return pyautogui.screenshot(region=region)
-            
-        except Exception as e:
-            self.app.log_message(f"High-quality capture failed: {e}, using pyautogui")
-            return pyautogui.screenshot(region=region)
+        return self.screen.screenshot(region)
         
     def start_capture_process(self):
         """Start the capture and OCR process"""
@@ -167,13 +120,73 @@ class CaptureProcessor:
             messagebox.showerror("Error", "Please enter a valid number of pages!")
             return
         
-        # Reset duplicate detection state
-        self.previous_image = None
-        self.duplicate_count = 0
+        base_location = self.app.base_location_var.get().strip() if hasattr(self.app, 'base_location_var') and self.app.base_location_var else ""
+        base_filename = self.app.base_filename_var.get().strip() if hasattr(self.app, 'base_filename_var') and self.app.base_filename_var else ""
+        
+        # The engine does the capture work; this class only connects it to the window
+        self.engine = CaptureEngine(
+            self.app.top_left, self.app.bottom_right, self.app.next_button_pos, self.app.total_pages,
+            base_location=base_location, base_filename=base_filename, screen=self.screen,
+            log=self.app.log_message, on_status=self.app.set_status, on_progress=self.app.set_progress,
+            page_options=self._page_options(), output_options=OutputOptions(stream_ocr=self._can_stream_ocr()))
         self.app.log_message("🔄 Duplicate detection enabled - will skip duplicate images and stop at end of book")
             
+        self._start_capture_thread()
+
+    def resume_capture_process(self):
+        """Continue the newest unfinished capture session in the output folder"""
+        base_location = self.app.base_location_var.get().strip() if hasattr(self.app, 'base_location_var') and self.app.base_location_var else ""
+        output_folder, _ = resolve_output_base(base_location)
+        sessions = find_sessions(output_folder)
+        if not sessions:
+            messagebox.showinfo("Resume Capture", f"No unfinished capture session found in:\n{output_folder}")
+            return
+
+        session = sessions[0]
+        name = os.path.basename(session.path)
+        if session.status == 'capturing':
+            question = (f"Resume '{name}' after {len(session.pages)} saved pages?\n\n"
+                        "Make sure the reader still shows the last captured page.")
+        else:
+            question = f"'{name}' is fully captured. Create the PDF and run OCR now?"
+        if not messagebox.askyesno("Resume Capture", question):
+            return
+
+        try:
+            self.engine = CaptureEngine.from_session(
+                session, screen=self.screen,
+                log=self.app.log_message, on_status=self.app.set_status, on_progress=self.app.set_progress,
+                output_options=OutputOptions(stream_ocr=self._can_stream_ocr()))
+        except SessionLockedError as e:
+            messagebox.showerror("Resume Capture", str(e))
+            return
+        self.app.log_message(f"🔁 Resuming capture session {session.path}")
+        self._start_capture_thread()
+
+    def _can_stream_ocr(self):
+        """OCR pages while capturing when the Vision API is configured"""
+        return bool(os.environ.get('GOOGLE_APPLICATION_CREDENTIALS'))
+
+    def _page_options(self):
+        """PageOptions from the checkboxes and compare mask set in the window"""
+        def checked(name):
+            return bool(getattr(self.app, name).get()) if hasattr(self.app, name) else False
+
+        return PageOptions(trim_margins=checked('trim_margins_var'), spread=checked('spread_var'),
+                           watchdog=checked('watchdog_var'), learn_mask=checked('learn_mask_var'),
+                           compare_roi=getattr(self.app, 'compare_roi', None),
+                           compare_ignore=getattr(self.app, 'compare_ignore', None),
+                           blank_pages=self._blank_pages())
+
+    def _blank_pages(self):
+        """Blank page policy chosen in the window, or None to keep blank pages like any other"""
+        policy = self.app.blank_pages_var.get() if hasattr(self.app, 'blank_pages_var') else "keep"
+        return policy if policy in BLANK_POLICIES else None
+
+    def _start_capture_thread(self):
         # Disable capture button and enable stop button
         self.app.capture_btn.config(state="disabled")
+        self.app.resume_btn.config(state="disabled")
         self.app.stop_btn.config(state="normal")
         self.app.stop_capture_flag = False
         
@@ -184,137 +197,47 @@ class CaptureProcessor:
     def stop_capture(self):
         """Stop the capture process"""
         self.app.stop_capture_flag = True
+        if self.engine is not None:
+            self.engine.stop()
         self.app.log_message("Stopping capture process...")
         
     def capture_and_process(self):
         """Main capture and processing function (runs in separate thread)"""
         try:
-            # Step 1: Capture screenshots
-            self.app.status_label.config(text="Capturing screenshots...")
-            self.app.log_message(f"Starting capture of {self.app.total_pages} pages...")
-            
             # Hide the GUI window during capture
-            self.app.root.withdraw()
+            self.app.call_on_ui(self.app.root.withdraw)
             time.sleep(1)  # Give time for window to hide
             
-            # Add initial wait to ensure we're ready to capture the current page
-            self.app.log_message("Waiting 3 seconds before starting capture...")
-            self.app.log_message("Make sure you're on the FIRST page you want to capture!")
-            self.app.log_message("Make sure your book reader application is focused and ready!")
-            time.sleep(3)  # Give user time to prepare and ensure we capture current page
-            
-            # Ensure the target application has focus by clicking on the next button area first
-            # This ensures the button area is ready and focused for subsequent clicks
-            pyautogui.click(self.app.next_button_pos)
-            time.sleep(0.5)  # Brief pause after focus click
-            
-            images = []
-            temp_dir = tempfile.mkdtemp()
-            
-            # Reset duplicate detection variables
-            self.previous_image = None
-            self.duplicate_count = 0
-            
-            for i in range(self.app.total_pages):
-                if self.app.stop_capture_flag:
+            # Step 1: Capture screenshots
+            for event in self.engine.run_iter():
+                if event['type'] == 'stopped':
                     break
                     
-                # Update progress
-                progress = (i / self.app.total_pages) * 50  # First 50% for capture
-                self.app.progress_var.set(progress)
-                
-                page_num = str(i).zfill(len(str(self.app.total_pages)))
-                file_name = os.path.join(temp_dir, f'book-page-{page_num}.png')
-                
-                # Take screenshot with debug logging
-                pic_size = (self.app.bottom_right[0] - self.app.top_left[0], 
-                          self.app.bottom_right[1] - self.app.top_left[1])
-                region = (self.app.top_left[0], self.app.top_left[1], pic_size[0], pic_size[1])
-                
-                self.app.log_message(f"Capturing page {i+1}/{self.app.total_pages} - Region: {region}")
-                
-                screenshot = self._take_high_quality_screenshot(region)
-                
-                # Check if current image is similar to previous one
-                if self.previous_image is not None:
-                    if self._images_are_similar(screenshot, self.previous_image):
-                        self.duplicate_count += 1
-                        self.app.log_message(f"⚠️  Duplicate image detected! (Count: {self.duplicate_count})")
-                        
-                        if self.duplicate_count >= 4:
-                            self.app.log_message("🛑 4 consecutive duplicate images found - assuming end of book reached")
-                            self.app.log_message("Stopping capture process...")
-                            break
-                        else:
-                            self.app.log_message("Skipping duplicate image, continuing...")
-                            # Don't save this duplicate image, just continue to next page
-                            if i < self.app.total_pages - 1:
-                                self.app.log_message(f"Clicking next button at {self.app.next_button_pos}")
-                                
-                                # Make a click sound for testing feedback
-                                if platform.system() == 'Darwin':  # macOS
-                                    subprocess.run(['afplay', '/System/Library/Sounds/Pop.aiff'], 
-                                                 capture_output=True)
-                                elif platform.system() == 'Windows':
-                                    import winsound
-                                    winsound.MessageBeep(winsound.MB_OK)
-                                
-                                # Add a small delay before clicking to ensure stability
-                                time.sleep(0.3)
-                                pyautogui.click(self.app.next_button_pos)
-                                
-                                # Increased wait time for page to load and become ready
-                                time.sleep(1.0)
-                            continue
-                    else:
-                        # Reset duplicate count if images are different
-                        self.duplicate_count = 0
-                
-                # Save the current image as it's not a duplicate
-                screenshot.save(file_name)
-                images.append(file_name)
-                self.previous_image = screenshot.copy()  # Store for next comparison
-                
-                self.app.log_message(f"Saved page {i+1} to {file_name}")
-                
-                # Click next button (except for last page)
-                if i < self.app.total_pages - 1:
-                    self.app.log_message(f"Clicking next button at {self.app.next_button_pos}")
-                    
-                    # Make a click sound for testing feedback
-                    if platform.system() == 'Darwin':  # macOS
-                        subprocess.run(['afplay', '/System/Library/Sounds/Pop.aiff'], 
-                                     capture_output=True)
-                    elif platform.system() == 'Windows':
-                        import winsound
-                        winsound.MessageBeep(winsound.MB_OK)
-                    
-                    # Add a small delay before clicking to ensure stability
-                    time.sleep(0.3)
-                    pyautogui.click(self.app.next_button_pos)
-                    
-                    # Increased wait time for page to load and become ready
-                    # This helps prevent the "first click doesn't work" issue
-                    time.sleep(1.0)  # Wait for page to load and stabilize
-                    
             # Show GUI window again
-            self.app.root.deiconify()
+            self.app.call_on_ui(self.app.root.deiconify)
             
+            if self.engine.stop_reason == "disk_budget":
+                self.app.log_message("Capture stopped: disk budget reached. Free some space, then use 'Resume Capture'.")
+                self.app.call_on_ui(messagebox.showwarning, "Disk Budget Reached",
+                                    "Capture stopped because the page store reached its disk budget.\n"
+                                    "Free some space, then use 'Resume Capture' to continue.")
+                return
             if self.app.stop_capture_flag:
                 self.app.log_message("Capture stopped by user.")
+                self.app.log_message(f"Pages are kept in {self.engine.session.path} - use 'Resume Capture' to continue")
                 return
                 
             # Log final capture summary
-            actual_pages_captured = len(images)
+            actual_pages_captured = len(self.engine.images)
             self.app.log_message(f"✅ Capture completed! {actual_pages_captured} pages captured successfully.")
             
             if actual_pages_captured == 0:
                 self.app.log_message("No pages were captured. Process cancelled.")
-                messagebox.showwarning("No Pages Captured", "No pages were captured. The process has been cancelled.")
+                self.app.call_on_ui(messagebox.showwarning, "No Pages Captured", "No pages were captured. The process has been cancelled.")
                 return
                 
             # Step 2: Convert to PDF
-            pdf_path = self._save_pdf(images)
+            pdf_path = self._save_pdf()
             
             # Step 3: Automatically proceed with OCR (no dialog)
             self.app.log_message(f"PDF created successfully with {actual_pages_captured} pages!")
@@ -323,90 +246,64 @@ class CaptureProcessor:
             
             # Perform OCR automatically
             ocr_output_folder = self._perform_ocr(pdf_path)
+            self.engine.finish(pdf_path, f"{pdf_path}.txt" if ocr_output_folder else None)
             
             # Step 4: Show completion message
             self._show_completion_message(pdf_path, actual_pages_captured, ocr_performed=(ocr_output_folder is not None))
             
         except Exception as e:
             self.app.log_message(f"Error: {str(e)}")
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+            self.app.call_on_ui(messagebox.showerror, "Error", f"An error occurred: {str(e)}")
             
         finally:
+            # Pages still streaming after an error or an early return are not needed
+            self.engine.cancel_streaming()
+            
+            # Report what the batched UI updates cost during this run
+            if hasattr(self.app, 'ui_channel'):
+                stats = self.app.ui_channel.stats()
+                self.app.log_message(f"UI updates: {stats['events']} events in {stats['redraws']} redraws, "
+                                     f"{stats['pump_ms_total']:.0f} ms total "
+                                     f"(max {stats['pump_ms_max']:.1f} ms per frame)")
+            
             # Re-enable controls
-            self.app.capture_btn.config(state="normal")
-            self.app.stop_btn.config(state="disabled")
-            self.app.root.deiconify()  # Make sure window is visible
-            self.app.root.lift()  # Bring window to front
-            self.app.root.focus_force()  # Give window focus
+            self.app.call_on_ui(self._restore_window)
             
-    def _save_pdf(self, images):
-        """Save captured images as PDF"""
-        self.app.status_label.config(text="Converting to PDF...")
-        self.app.log_message(f"Converting {len(images)} images to PDF...")
-        
-        # Get base location and filename from user input or use defaults
-        base_location = self.app.base_location_var.get().strip() if hasattr(self.app, 'base_location_var') and self.app.base_location_var else ""
-        base_filename = self.app.base_filename_var.get().strip() if hasattr(self.app, 'base_filename_var') and self.app.base_filename_var else ""
-        
-        # Determine output location
-        if base_location:
-            output_folder = base_location
-        else:
-            # Use default location: Documents/book-scanner folder
-            output_folder = os.path.join(os.path.expanduser("~"), "Documents", "book-scanner")
-        
-        # Create the folder if it doesn't exist
-        os.makedirs(output_folder, exist_ok=True)
-        
-        # Determine filename
-        if base_filename:
-            # User specified a custom filename
-            filename_base = base_filename
-        else:
-            # Generate unique filename with timestamp
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename_base = f"captured_book_{timestamp}"
-        
-        # Construct full PDF path
-        pdf_path = os.path.join(output_folder, filename_base + ".pdf")
-
-        with open(pdf_path, "wb") as f:
-            f.write(img2pdf.convert(images))
+    def _restore_window(self):
+        """Re-enable controls and bring the window back (runs on the Tk thread)"""
+        self.app.capture_btn.config(state="normal")
+        self.app.resume_btn.config(state="normal")
+        self.app.stop_btn.config(state="disabled")
+        self.app.root.deiconify()  # Make sure window is visible
+        self.app.root.lift()  # Bring window to front
+        self.app.root.focus_force()  # Give window focus
             
-        self.app.log_message(f"PDF saved to: {pdf_path}")
+    def _save_pdf(self):
+        """Save captured images as PDF"""
+        pdf_path = self.engine.save_pdf()
         self.app.log_message(f"You can find your book at: {pdf_path}")
-        
         return pdf_path
         
     def _perform_ocr(self, pdf_path):
         """Perform OCR processing on the PDF"""
-        self.app.status_label.config(text="Performing OCR...")
-        self.app.log_message("Starting OCR processing...")
-        
         # Check if Google Vision API credentials are set
         if not os.environ.get('GOOGLE_APPLICATION_CREDENTIALS'):
             self.app.log_message("Warning: Google Vision API credentials not set. Please set GOOGLE_APPLICATION_CREDENTIALS environment variable.")
-            messagebox.showwarning("Warning", "Google Vision API credentials not set. OCR will be skipped.")
+            self.app.call_on_ui(messagebox.showwarning, "Warning", "Google Vision API credentials not set. OCR will be skipped.")
             return None
         
         try:
-            output_folder = os.path.dirname(pdf_path)
-            process_pdf(pdf_path, output_folder)
-            self.app.log_message("OCR processing completed!")
-            
-            # Update progress to 100%
-            self.app.progress_var.set(100)
-            
-            return output_folder
+            self.engine.perform_ocr(pdf_path)
+            return os.path.dirname(pdf_path)
             
         except Exception as e:
             self.app.log_message(f"OCR Error: {str(e)}")
-            messagebox.showerror("OCR Error", f"Failed to perform OCR: {str(e)}")
+            self.app.call_on_ui(messagebox.showerror, "OCR Error", f"Failed to perform OCR: {str(e)}")
             return None
             
     def _show_completion_message(self, pdf_path, pages_captured, ocr_performed=True):
         """Show completion message and summary"""
-        self.app.status_label.config(text="Process completed!")
+        self.app.set_status("Process completed!")
         self.app.log_message("All processing completed successfully!")
         self.app.log_message("=" * 50)
         self.app.log_message(f"📁 PDF saved to: {pdf_path}")
@@ -456,7 +353,7 @@ class CaptureProcessor:
         
         # Show completion message
         ocr_status = "with OCR text extraction" if ocr_performed else "without OCR"
-        messagebox.showinfo("Process Complete", 
+        self.app.call_on_ui(messagebox.showinfo, "Process Complete", 
                           f"Book capture completed {ocr_status}!\n\n"
                           f"Pages captured: {pages_captured}\n"
                           f"PDF saved to:\n{pdf_path}\n\n"
@@ -0,0 +1,433 @@
+"""
+Capture Session Module for Book Scanner
+Keeps captured pages in a session folder with an append-only manifest, so a capture
+that was stopped or crashed can be resumed instead of starting again from page 1.
+
+Session folder layout (under '<output folder>/sessions/<name>'):
+    session.json    Capture settings and status, rewritten atomically
+    pages.bin       Every page image (PNG), appended one after another
+    manifest.jsonl  One line per saved page: index, file, offset, length, fingerprint;
+                    this is the offset index into pages.bin
+    session.lock    Locked by the process capturing into the session, so a second
+                    capture cannot resume (and repair) it at the same time
+
+Readers memory-map pages.bin and hand out slices of the mapping, so the PDF and
+OCR stages read page images without copying them into separate buffers.
+"""
+import contextlib
+import datetime
+import io
+import json
+import mmap
+import os
+import shutil
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+SESSIONS_FOLDER_NAME = "sessions"
+SESSION_FILE = "session.json"
+MANIFEST_FILE = "manifest.jsonl"
+CONTAINER_FILE = "pages.bin"
+LOCK_FILE = "session.lock"
+
+# Free space always left on the disk, whatever the session's own budget
+MIN_FREE_BYTES = 200 * 1024 * 1024
+
+
+class SessionMismatchError(ValueError):
+    """The reader is not showing the last captured page, so resuming would skip or repeat pages"""
+
+
+class SessionFullError(OSError):
+    """Saving another page would exceed the session's disk budget or fill the disk"""
+
+
+class SessionLockedError(OSError):
+    """Another capture is still writing to the session"""
+
+
+def sessions_folder(output_folder):
+    return os.path.join(output_folder, SESSIONS_FOLDER_NAME)
+
+
+def _write_json_atomic(path, data):
+    fd, temp_path = tempfile.mkstemp(prefix=".session-", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def _lock_file(path):
+    """
+    Open and lock a file for as long as it stays open. The operating system drops the
+    lock when the process ends, so a crashed capture never leaves its session locked.
+
+    Raises:
+        SessionLockedError: Another open file (in any process) holds the lock
+    """
+    f = open(path, 'a+b')
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        raise SessionLockedError(f"{os.path.dirname(path)} is in use by another capture")
+    return f
+
+
+def _read_manifest(path):
+    """
+    Manifest records whose page bytes are all on disk, up to the first torn line.
+
+    Returns:
+        tuple: (records, bytes of the manifest they take up)
+    """
+    sizes = {}
+    pages = []
+    good_bytes = 0
+    with open(os.path.join(path, MANIFEST_FILE), 'rb') as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            file_path = os.path.join(path, record['file'])
+            if record['file'] not in sizes:
+                sizes[record['file']] = os.path.getsize(file_path) if os.path.exists(file_path) else -1
+            if record['offset'] + record['length'] > sizes[record['file']]:
+                break
+            pages.append(record)
+            good_bytes += len(line)
+    return pages, good_bytes
+
+
+def _padded_page(data, box, final_box):
+    """PNG of a page cut to an earlier trim box, padded to the final one"""
+    from PIL import Image
+    from page_region import pad_to_box
+
+    buffer = io.BytesIO()
+    pad_to_box(Image.open(io.BytesIO(data)), box, final_box).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class _PageBuffer:
+    """A page image inside the mapped container, in the form img2pdf reads (read_bytes)"""
+
+    def __init__(self, view):
+        self.view = view
+
+    def read_bytes(self):
+        return self.view
+
+
+class CaptureSession:
+    """
+    A capture in progress, on disk.
+
+    Each page is appended to pages.bin and fsynced before its manifest line is
+    written, so after a crash the manifest lists exactly the pages that are safely
+    on disk. A torn manifest line, or page bytes with no manifest line, are
+    ignored when the session is opened and cut off when it is locked to resume.
+    """
+
+    def __init__(self, path, settings, pages):
+        self.path = path
+        self.settings = settings
+        self.pages = pages
+        self._size = sum(record['length'] for record in pages)
+        self._container = None
+        self._lock = None
+
+    @classmethod
+    def create(cls, output_folder, filename_base, top_left, bottom_right, next_button_pos, total_pages,
+               disk_budget=None):
+        """
+        Start a new session folder for a capture that will be saved as '<filename_base>.pdf'.
+
+        Args:
+            disk_budget (int, optional): Largest size in bytes the page container may reach
+        """
+        root = sessions_folder(output_folder)
+        os.makedirs(root, exist_ok=True)
+        path = os.path.join(root, filename_base)
+        suffix = 2
+        while os.path.exists(path):
+            path = os.path.join(root, f"{filename_base}-{suffix}")
+            suffix += 1
+        os.makedirs(path)
+
+        settings = {
+            'version': 2,
+            'status': 'capturing',
+            'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'output_folder': output_folder,
+            'filename_base': filename_base,
+            'top_left': list(top_left),
+            'bottom_right': list(bottom_right),
+            'next_button_pos': list(next_button_pos) if next_button_pos else None,
+            'total_pages': total_pages,
+            'disk_budget': disk_budget,
+        }
+        _write_json_atomic(os.path.join(path, SESSION_FILE), settings)
+        open(os.path.join(path, MANIFEST_FILE), 'a').close()
+        open(os.path.join(path, CONTAINER_FILE), 'a').close()
+        session = cls(path, settings, [])
+        session._lock = _lock_file(os.path.join(path, LOCK_FILE))
+        return session
+
+    @classmethod
+    def open(cls, path):
+        """
+        Read a session folder without changing it, e.g. to list it or read its pages.
+        Anything a crash left half-written is ignored; call lock() before capturing into it.
+        """
+        with open(os.path.join(path, SESSION_FILE), 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+        pages, _ = _read_manifest(path)
+        return cls(path, settings, pages)
+
+    def lock(self):
+        """
+        Take the session for this capture and cut off anything a crash left half-written.
+        The session is read again once locked, since its capture may have saved pages since
+        it was opened. The lock is held until close().
+
+        Raises:
+            SessionLockedError: Another capture is still writing to the session
+        """
+        if self._lock is not None:
+            return
+        self._lock = _lock_file(os.path.join(self.path, LOCK_FILE))
+        try:
+            with open(os.path.join(self.path, SESSION_FILE), 'r', encoding='utf-8') as f:
+                self.settings = json.load(f)
+            pages, good_bytes = _read_manifest(self.path)
+            manifest_path = os.path.join(self.path, MANIFEST_FILE)
+            if good_bytes != os.path.getsize(manifest_path):
+                with open(manifest_path, 'r+b') as f:
+                    f.truncate(good_bytes)
+
+            # Page bytes written after the last manifest line belong to no page
+            if os.path.exists(self.container_path):
+                end = max((r['offset'] + r['length'] for r in pages if r['file'] == CONTAINER_FILE), default=0)
+                if os.path.getsize(self.container_path) > end:
+                    with open(self.container_path, 'r+b') as f:
+                        f.truncate(end)
+        except BaseException:
+            self.close()
+            raise
+        self.pages = pages
+        self._size = sum(record['length'] for record in pages)
+
+    @property
+    def status(self):
+        return self.settings['status']
+
+    @property
+    def next_index(self):
+        """Capture index (0-based page turn count) to continue from"""
+        return self.pages[-1]['index'] + 1 if self.pages else 0
+
+    @property
+    def last_fingerprint(self):
+        return self.pages[-1]['fingerprint'] if self.pages else None
+
+    def last_fingerprints(self):
+        """Fingerprints of the pages saved from the last captured frame (two for a spread)"""
+        if not self.pages:
+            return []
+        last_index = self.pages[-1]['index']
+        return [record['fingerprint'] for record in self.pages if record['index'] == last_index]
+
+    @property
+    def container_path(self):
+        return os.path.join(self.path, CONTAINER_FILE)
+
+    def size(self):
+        """Bytes of page data stored so far"""
+        return self._size
+
+    def _check_space(self, length):
+        budget = self.settings.get('disk_budget')
+        if budget and self.size() + length > budget:
+            raise SessionFullError(f"Session disk budget of {budget / 1024 / 1024:.0f} MB reached "
+                                   f"after {len(self.pages)} pages")
+        free = shutil.disk_usage(self.path).free
+        if free - length < MIN_FREE_BYTES:
+            raise SessionFullError(f"Only {free / 1024 / 1024:.0f} MB free on the disk holding {self.path}")
+
+    def has_room_for(self, length):
+        """True if a page of this many bytes would still fit the budget and the disk"""
+        try:
+            self._check_space(length)
+        except SessionFullError:
+            return False
+        return True
+
+    def add_page(self, index, image, fingerprint, **extra):
+        """
+        Append a page image to the container and record it in the manifest.
+
+        Args:
+            extra: More fields for the manifest record, e.g. half='left' for a spread page
+
+        Raises:
+            SessionFullError: The page would exceed the disk budget; nothing is written
+
+        Returns:
+            dict: The manifest record
+        """
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        length = buffer.tell()
+        self._check_space(length)
+
+        if self._container is None:
+            self._container = open(self.container_path, 'ab')
+        offset = self._container.seek(0, os.SEEK_END)
+        self._container.write(buffer.getbuffer())
+        self._container.flush()
+        os.fsync(self._container.fileno())
+
+        record = {
+            'index': index,
+            'file': CONTAINER_FILE,
+            'offset': offset,
+            'length': length,
+            'fingerprint': fingerprint,
+        }
+        record.update(extra)
+        with open(os.path.join(self.path, MANIFEST_FILE), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.pages.append(record)
+        self._size += length
+        return record
+
+    @contextlib.contextmanager
+    def page_buffers(self, dropped=True):
+        """
+        Map the page data and yield one buffer per page, in capture order.
+
+        Buffers are slices of the mapping; they are only valid inside the with block.
+        Trimmed pages saved before the trim box last grew are padded to the final box
+        (see trim_boxes()), so they come as a padded copy instead.
+
+        Args:
+            dropped (bool): Include blank pages dropped by the capture (stored as a stub)
+        """
+        maps = {}
+        views = []
+        files = []
+        try:
+            buffers = []
+            for record in self.pages:
+                if not dropped and record.get('blank') == 'drop':
+                    continue
+                name = record['file']
+                if name not in maps:
+                    f = open(os.path.join(self.path, name), 'rb')
+                    files.append(f)
+                    maps[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                views.append(memoryview(maps[name])[record['offset']:record['offset'] + record['length']])
+                boxes = self.trim_boxes(record)
+                buffers.append(_PageBuffer(views[-1] if boxes is None else _padded_page(views[-1], *boxes)))
+            yield buffers
+        finally:
+            for view in views:
+                view.release()
+            for mapping in maps.values():
+                try:
+                    mapping.close()
+                except BufferError:
+                    pass  # A caller kept a slice; the mapping is freed with it
+            for f in files:
+                f.close()
+
+    def trim_boxes(self, record):
+        """
+        The trim box a page was cut to and the box the book ended with, for a page cut
+        before the box last grew; None for every other page.
+
+        Returns:
+            tuple: (box, final_box) or None
+        """
+        box = record.get('trim_box')
+        final_box = self.settings.get(f"trim_box_{record['half']}" if record.get('half') else 'trim_box')
+        if not box or not final_box or list(box) == list(final_box):
+            return None
+        return tuple(box), tuple(final_box)
+
+    def page_bytes(self, position):
+        """Copy of one page image (position in self.pages), e.g. to send it to OCR"""
+        record = self.pages[position]
+        with open(os.path.join(self.path, record['file']), 'rb') as f:
+            f.seek(record['offset'])
+            return f.read(record['length'])
+
+    def matches_last_page(self, fingerprint):
+        """
+        True if a screen with this fingerprint shows the last saved page (or either page
+        of the last saved spread). Uses the same exact hash as duplicate detection: pages
+        that differ only by a page number must not be mistaken for each other.
+        """
+        return not self.pages or fingerprint in self.last_fingerprints()
+
+    def mark(self, status, **extra):
+        """Record progress: 'capturing', 'captured' (all pages saved) or 'done' (PDF/OCR written)"""
+        self.settings['status'] = status
+        self.settings.update(extra)
+        _write_json_atomic(os.path.join(self.path, SESSION_FILE), self.settings)
+
+    def close(self):
+        if self._container is not None:
+            self._container.close()
+            self._container = None
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    def delete(self):
+        """Remove the session folder and its pages"""
+        self.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def find_sessions(output_folder, unfinished_only=True):
+    """Session folders under output_folder, newest first; read only, so a capture still running is left alone"""
+    root = sessions_folder(output_folder)
+    if not os.path.isdir(root):
+        return []
+    sessions = []
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if not os.path.exists(os.path.join(path, SESSION_FILE)):
+            continue
+        try:
+            session = CaptureSession.open(path)
+        except (OSError, ValueError) as e:
+            print(f"Skipping unreadable session {path}: {e}")
+            continue
+        if unfinished_only and session.status == 'done':
+            continue
+        sessions.append(session)
+    sessions.sort(key=lambda session: os.path.getmtime(os.path.join(session.path, MANIFEST_FILE)), reverse=True)
+    return sessions
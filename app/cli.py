@@ -0,0 +1,570 @@
+"""
+Command Line Interface for Book Scanner
+Runs captures without the GUI, e.g. on a capture machine under Xvfb:
+
+    python run_book_scanner.py capture --profile app/book_scanner_settings.json
+    python run_book_scanner.py capture --top-left 100,100 --bottom-right 900,1200 \\
+        --next-button 950,650 --pages 300 --output-dir ~/books --name my_book
+    python run_book_scanner.py capture --resume            # continue the last stopped capture
+    python run_book_scanner.py multi left_reader.json right_reader.json
+    python run_book_scanner.py ocr ~/books/*.pdf --workers 16
+    python run_book_scanner.py watch /srv/scans --output-dir /srv/text
+    python run_book_scanner.py queue add ~/books --db /srv/ocr/queue.sqlite
+    python run_book_scanner.py queue worker --db /srv/ocr/queue.sqlite --threads 8
+    python run_book_scanner.py serve --port 8765 --workers 16
+    python run_book_scanner.py compress ~/books/my_book.pdf --compare
+    python run_book_scanner.py importtime --budget-ms 400
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+
+# Add current directory to Python path to find our modules
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from capture_engine import DEFAULT_OUTPUT_FOLDER, CaptureEngine, load_profile
+from capture_options import BLANK_POLICIES, OutputOptions, PageOptions
+from capture_session import CaptureSession, SessionMismatchError, find_sessions, sessions_folder
+
+# Settings file written by the GUI, used when no coordinates are given
+DEFAULT_PROFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book_scanner_settings.json')
+
+
+def _point(text):
+    """Parse 'X,Y' into an (x, y) tuple"""
+    try:
+        x, y = (int(value) for value in text.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected X,Y but got '{text}'")
+    return (x, y)
+
+
+def _box(text):
+    """Parse 'LEFT,TOP,RIGHT,BOTTOM' into a tuple of ints"""
+    try:
+        left, top, right, bottom = (int(value) for value in text.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected LEFT,TOP,RIGHT,BOTTOM, got {text!r}")
+    return (left, top, right, bottom)
+
+
+def build_parser():
+    from pdf_compression import PROFILES
+
+    parser = argparse.ArgumentParser(prog="book-scanner", description="Book Scanner command line")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    capture = subparsers.add_parser("capture", help="Capture a book without the GUI")
+    capture.add_argument("--profile", help="Settings JSON saved by the GUI (default: the GUI's settings file "
+                                           "when no coordinates are given)")
+    capture.add_argument("--top-left", type=_point, metavar="X,Y", help="Top-left corner of the capture area")
+    capture.add_argument("--bottom-right", type=_point, metavar="X,Y", help="Bottom-right corner of the capture area")
+    capture.add_argument("--next-button", type=_point, metavar="X,Y", help="Position of the next-page button")
+    capture.add_argument("--pages", type=int, help="Maximum number of pages to capture")
+    capture.add_argument("--output-dir", help="Folder for the PDF and text (default: ~/Documents/book-scanner)")
+    capture.add_argument("--name", help="Output file name without extension (default: timestamped)")
+    capture.add_argument("--start-delay", type=float, default=3.0, help="Seconds to wait before the first capture")
+    capture.add_argument("--click-delay", type=float, default=0.3, help="Seconds to wait before clicking next")
+    capture.add_argument("--page-delay", type=float, default=1.0, help="Seconds to wait for the next page to load")
+    capture.add_argument("--max-duplicates", type=int, default=4,
+                         help="Consecutive duplicate pages that mean the end of the book")
+    capture.add_argument("--resume", nargs="?", const="latest", metavar="SESSION",
+                         help="Continue a stopped capture from a session folder (default: the newest "
+                              "unfinished session in the output folder)")
+    capture.add_argument("--no-verify", action="store_true",
+                         help="Resume without checking that the reader shows the last captured page")
+    capture.add_argument("--disk-budget", type=float, metavar="MB",
+                         help="Largest size of the captured page images; capture stops (resumably) there")
+    capture.add_argument("--keep-session", action="store_true",
+                         help="Keep the session's page images after the PDF and text are verified")
+    capture.add_argument("--stream-ocr", action="store_true",
+                         help="OCR each page as soon as it is captured, so the text is ready right after the last page")
+    capture.add_argument("--ocr-window", type=int, default=8, help="Pages OCRed at the same time with --stream-ocr")
+    capture.add_argument("--auto-area", action="store_true",
+                         help="Find the book page on the screen instead of using --top-left/--bottom-right")
+    capture.add_argument("--trim-margins", action="store_true",
+                         help="Cut every page to one content box learned across the book")
+    capture.add_argument("--spread", action="store_true",
+                         help="The reader shows two-page spreads: split each frame at the gutter into two pages "
+                              "(--pages then counts page turns)")
+    capture.add_argument("--scroll", type=int, metavar="STEPS",
+                         help="The reader scrolls continuously: scroll down this many wheel steps instead of "
+                              "clicking next, stitch the frames and cut them into pages (--pages then counts scrolls)")
+    capture.add_argument("--page-height", type=int, metavar="PX",
+                         help="Height of the pages cut with --scroll (default: the capture area's height)")
+    capture.add_argument("--watchdog", action="store_true",
+                         help="When pages stop changing, try to recover the reader (refocus, click again, "
+                              "page-down) before deciding the book has ended; for unattended runs")
+    capture.add_argument("--focus-point", type=_point, metavar="X,Y",
+                         help="Where --watchdog clicks to refocus the reader (default: beside the page, "
+                              "outside the content region or the capture area)")
+    capture.add_argument("--compare-roi", type=_box, metavar="L,T,R,B",
+                         help="Only this part of the frame (in captured pixels) is compared to detect duplicates")
+    capture.add_argument("--ignore", type=_box, action="append", metavar="L,T,R,B",
+                         help="Leave this box (in captured pixels) out of duplicate detection, e.g. a page "
+                              "counter or ad; repeat for more boxes")
+    capture.add_argument("--learn-mask", action="store_true",
+                         help="Learn the content region and the reader UI that changes by itself from a few "
+                              "frames of the first page")
+    capture.add_argument("--blank-pages", choices=list(BLANK_POLICIES),
+                         help="Blank pages are not sent to OCR (the text still marks them by page number); "
+                              "'placeholder' stores a white page, 'drop' leaves them out of the PDF, "
+                              "'skip-ocr' keeps them as captured")
+    capture.add_argument("--searchable", action="store_true",
+                         help="Add an invisible OCR text layer to the PDF so it can be searched and copied from")
+    capture.add_argument("--compression", choices=list(PROFILES), default="lossless",
+                         help="PDF compression profile: 'balanced'/'smallest' store text pages as 1-bit G4 and "
+                              "pages with pictures as a text mask over a JPEG background (default: lossless)")
+    capture.add_argument("--no-ocr", action="store_true", help="Only save the PDF")
+    capture.add_argument("--no-sound", action="store_true", help="Do not play a click sound when turning pages")
+    capture.add_argument("--json", action="store_true", help="Print the result as JSON")
+    capture.add_argument("-v", "--verbose", action="store_true", help="Show per-page details")
+    capture.set_defaults(func=run_capture)
+
+    multi = subparsers.add_parser("multi", help="Capture several reader windows at once, one settings profile each")
+    multi.add_argument("profiles", nargs="+", help="Settings JSON per reader window (capture area, next button, "
+                                                   "output); the windows must not overlap")
+    multi.add_argument("--pages", type=int, help="Maximum number of pages per book (default: each profile's)")
+    multi.add_argument("--start-delay", type=float, default=3.0, help="Seconds to wait before the first capture")
+    multi.add_argument("--click-delay", type=float, default=0.3, help="Seconds to wait before clicking next")
+    multi.add_argument("--page-delay", type=float, default=1.0,
+                       help="Seconds a reader needs to load the next page; the other readers are captured meanwhile")
+    multi.add_argument("--max-duplicates", type=int, default=4,
+                       help="Consecutive identical pages that mean the end of a book")
+    multi.add_argument("--stream-ocr", action="store_true", help="OCR pages while capturing")
+    multi.add_argument("--compression", choices=list(PROFILES), default="lossless", help="PDF compression profile")
+    multi.add_argument("--no-ocr", action="store_true", help="Only save the PDFs")
+    multi.add_argument("--no-sound", action="store_true", help="Do not play a click sound when turning pages")
+    multi.add_argument("--json", action="store_true", help="Print the results as JSON")
+    multi.add_argument("-v", "--verbose", action="store_true", help="Show per-page details")
+    multi.set_defaults(func=run_multi)
+
+    ocr = subparsers.add_parser("ocr", help="OCR PDF files (or folders of PDFs) with a shared worker pool")
+    ocr.add_argument("paths", nargs="+", help="PDF files or folders containing PDFs")
+    ocr.add_argument("--output-dir", help="Folder for the text files (default: the first PDF's folder)")
+    ocr.add_argument("--workers", type=int, default=8, help="Pages OCRed at the same time across all files")
+    ocr.add_argument("--searchable", action="store_true",
+                     help="Also add an invisible text layer to each PDF (rewrites the PDFs in place)")
+    ocr.set_defaults(func=run_ocr)
+
+    watch = subparsers.add_parser("watch", help="Watch a folder and OCR new or changed PDFs")
+    watch.add_argument("folder", help="Folder to watch")
+    watch.add_argument("--output-dir", help="Folder for text files and the manifest (default: the watched folder)")
+    watch.add_argument("--workers", type=int, default=8, help="Pages OCRed at the same time")
+    watch.add_argument("--poll-interval", type=float, default=5.0, help="Seconds between folder scans")
+    watch.add_argument("--settle", type=float, default=2.0,
+                       help="Seconds a file must stay unchanged before it is processed")
+    watch.add_argument("--no-inotify", action="store_true", help="Always poll, e.g. for network shares")
+    watch.set_defaults(func=run_watch)
+
+    queue = subparsers.add_parser("queue", help="Page-level OCR queue shared by many worker processes")
+    queue_commands = queue.add_subparsers(dest="queue_command", required=True)
+    queue_add = queue_commands.add_parser("add", help="Queue the pages of PDF files or folders")
+    queue_add.add_argument("paths", nargs="+", help="PDF files or folders containing PDFs")
+    queue_add.add_argument("--output-dir", help="Folder for the text files (default: next to each PDF)")
+    queue_worker = queue_commands.add_parser("worker", help="Claim and OCR pages until stopped")
+    queue_worker.add_argument("--threads", type=int, default=4, help="Pages OCRed at the same time")
+    queue_worker.add_argument("--exit-when-idle", action="store_true", help="Stop once the queue is empty")
+    queue_commands.add_parser("status", help="Show queue progress")
+    for command in queue_commands.choices.values():
+        command.add_argument("--db", default=os.environ.get("BOOK_SCANNER_QUEUE_DB"),
+                             help="Queue database (default: $BOOK_SCANNER_QUEUE_DB or "
+                                  "~/Documents/book-scanner/ocr_queue.sqlite)")
+        command.add_argument("--lease", type=float, default=300, help="Seconds a claimed page is reserved")
+        command.add_argument("--network-fs", action="store_true",
+                             help="Database is on a network filesystem shared by several machines "
+                                  "(uses a rollback journal instead of WAL)")
+    queue.set_defaults(func=run_queue)
+
+    serve = subparsers.add_parser("serve", help="Run a local HTTP OCR service shared by several stations")
+    serve.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    serve.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    serve.add_argument("--workers", type=int, default=8, help="Pages OCRed at the same time across all jobs")
+    serve.add_argument("--spool-dir", help="Folder for uploaded PDFs (default: a temporary folder)")
+    serve.add_argument("--path-root", help="Folder whose PDFs may be submitted by path instead of uploaded "
+                                           "(default: submitting by path is off)")
+    serve.add_argument("-v", "--verbose", action="store_true", help="Log every request")
+    serve.set_defaults(func=run_serve)
+
+    compress = subparsers.add_parser("compress", help="Rewrite a PDF or capture session with a compression profile")
+    compress.add_argument("input", help="Image PDF or capture session folder")
+    compress.add_argument("--output", help="PDF to write (default: '<name>.<profile>.pdf' next to the input)")
+    compress.add_argument("--profile", choices=list(PROFILES), default="balanced", help="Compression profile")
+    compress.add_argument("--compare", action="store_true",
+                          help="Encode with every profile and report size and time (nothing is kept)")
+    compress.add_argument("--workers", type=int, help="Encoding processes (default: CPU count)")
+    compress.set_defaults(func=run_compress)
+
+    importtime = subparsers.add_parser("importtime", help="Show where startup import time goes")
+    importtime.add_argument("--module", default="book_scanner_gui", help="Module to import (default: the GUI)")
+    importtime.add_argument("--budget-ms", type=float, help="Exit with status 1 if the import takes longer")
+    importtime.add_argument("--top", type=int, default=15, help="Number of packages to list")
+    importtime.set_defaults(func=run_importtime)
+    return parser
+
+
+def _capture_settings(args):
+    """Merge the profile (if any) with coordinates given on the command line"""
+    settings = {'top_left': None, 'bottom_right': None, 'next_button_pos': None,
+                'total_pages': 0, 'base_location': "", 'base_filename': "", 'trim_margins': False,
+                'spread': False, 'watchdog': False, 'learn_mask': False, 'compare_roi': None,
+                'compare_ignore': [], 'blank_pages': None}
+    profile = args.profile
+    if profile is None and not (args.top_left and args.bottom_right and (args.next_button or args.scroll)):
+        profile = DEFAULT_PROFILE
+    if profile:
+        settings.update(load_profile(os.path.expanduser(profile)))
+
+    overrides = {
+        'top_left': args.top_left,
+        'bottom_right': args.bottom_right,
+        'next_button_pos': args.next_button,
+        'total_pages': args.pages,
+        'base_location': os.path.expanduser(args.output_dir) if args.output_dir else None,
+        'base_filename': args.name,
+    }
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    if args.trim_margins:
+        settings['trim_margins'] = True
+    if args.spread:
+        settings['spread'] = True
+    if args.watchdog:
+        settings['watchdog'] = True
+    if args.learn_mask:
+        settings['learn_mask'] = True
+    if args.blank_pages:
+        settings['blank_pages'] = args.blank_pages
+    if args.compare_roi:
+        settings['compare_roi'] = args.compare_roi
+    if args.ignore:
+        settings['compare_ignore'] = list(settings['compare_ignore']) + args.ignore
+    if args.auto_area:
+        settings['top_left'], settings['bottom_right'] = _detect_area()
+    return settings
+
+
+def _page_options(settings, **extra):
+    """PageOptions from the profile settings, plus the options only given on the command line"""
+    return PageOptions(trim_margins=settings['trim_margins'], spread=settings['spread'],
+                       watchdog=settings['watchdog'], learn_mask=settings['learn_mask'],
+                       compare_roi=settings['compare_roi'], compare_ignore=settings['compare_ignore'],
+                       blank_pages=settings['blank_pages'], **extra)
+
+
+def _detect_area():
+    """Capture area of the book page found on the screen"""
+    import pyautogui
+    from page_region import detect_screen_page
+
+    found = detect_screen_page(pyautogui.screenshot(), pyautogui.size())
+    if found is None:
+        raise ValueError("No book page found on the screen; give --top-left and --bottom-right instead")
+    return found
+
+
+def _find_session(args):
+    """Session folder named by --resume, or the newest unfinished one in the output folder"""
+    if args.resume != "latest":
+        return CaptureSession.open(os.path.expanduser(args.resume))
+    folder = args.output_dir
+    profile = os.path.expanduser(args.profile or DEFAULT_PROFILE)
+    if not folder and os.path.exists(profile):
+        folder = load_profile(profile)['base_location']
+    folder = os.path.expanduser(folder or DEFAULT_OUTPUT_FOLDER)
+    sessions = find_sessions(folder)
+    if not sessions:
+        raise ValueError(f"No unfinished capture session in {sessions_folder(folder)}")
+    return sessions[0]
+
+
+def run_capture(args):
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s %(message)s", datefmt="%H:%M:%S")
+    logger = logging.getLogger("book_scanner.cli")
+
+    def log(message, *args, level=logging.INFO):
+        logger.log(level, message, *args)
+
+    if not args.no_ocr and not os.environ.get('GOOGLE_APPLICATION_CREDENTIALS'):
+        log("Warning: GOOGLE_APPLICATION_CREDENTIALS is not set, OCR will be skipped")
+        args.no_ocr = True
+
+    output_options = OutputOptions(
+        disk_budget=int(args.disk_budget * 1024 * 1024) if args.disk_budget else None,
+        keep_session=args.keep_session, stream_ocr=args.stream_ocr and not args.no_ocr, ocr_window=args.ocr_window,
+        searchable=args.searchable and not args.no_ocr, compression=args.compression)
+    options = dict(log=log, start_delay=args.start_delay, click_delay=args.click_delay,
+                   page_delay=args.page_delay, max_duplicates=args.max_duplicates, click_sound=not args.no_sound,
+                   output_options=output_options)
+    try:
+        if args.resume:
+            engine = CaptureEngine.from_session(_find_session(args), verify_resume=not args.no_verify, **options)
+        else:
+            settings = _capture_settings(args)
+            engine = CaptureEngine(
+                settings['top_left'], settings['bottom_right'], settings['next_button_pos'], settings['total_pages'],
+                base_location=settings['base_location'], base_filename=settings['base_filename'],
+                page_options=_page_options(settings, scroll_amount=args.scroll, page_height=args.page_height,
+                                           focus_point=args.focus_point), **options)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    # Ctrl-C (or SIGTERM from a supervisor) finishes the current page, then stops
+    def request_stop(signum, frame):
+        log("Stopping capture process...")
+        engine.stop()
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    try:
+        result = engine.run(ocr=not args.no_ocr)
+    except SessionMismatchError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        seconds = result['seconds']
+        rate = result['pages'] / seconds if seconds else 0.0
+        log(f"Captured {result['pages']} pages in {seconds:.1f}s ({rate:.2f} pages/s)")
+        if result['pdf_path']:
+            log(f"PDF: {result['pdf_path']}")
+        if result['text_path']:
+            log(f"Text: {result['text_path']}")
+
+    if result['stopped']:
+        log(f"Resume later with: capture --resume {result['session']}")
+        return 130 if result['stop_reason'] == "user" else 1
+    return 0 if result['pdf_path'] else 1
+
+
+def run_multi(args):
+    from multi_capture import MultiCapture
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s %(message)s", datefmt="%H:%M:%S")
+    logger = logging.getLogger("book_scanner.cli")
+
+    def log(message, *args, level=logging.INFO):
+        logger.log(level, message, *args)
+
+    def target_log(name):
+        return lambda message, *args, level=logging.INFO: log(f"[{name}] {message}", *args, level=level)
+
+    if not args.no_ocr and not os.environ.get('GOOGLE_APPLICATION_CREDENTIALS'):
+        log("Warning: GOOGLE_APPLICATION_CREDENTIALS is not set, OCR will be skipped")
+        args.no_ocr = True
+
+    names, engines = [], []
+    try:
+        for profile in args.profiles:
+            name = os.path.splitext(os.path.basename(profile))[0]
+            settings = load_profile(os.path.expanduser(profile))
+            engines.append(CaptureEngine(
+                settings['top_left'], settings['bottom_right'], settings['next_button_pos'],
+                args.pages or settings['total_pages'], base_location=settings['base_location'],
+                base_filename=settings['base_filename'], page_options=_page_options(settings),
+                log=target_log(name), start_delay=0, click_delay=args.click_delay,
+                page_delay=args.page_delay, max_duplicates=args.max_duplicates, click_sound=not args.no_sound,
+                output_options=OutputOptions(stream_ocr=args.stream_ocr and not args.no_ocr,
+                                             compression=args.compression)))
+            names.append(name)
+        multi = MultiCapture(engines, names, start_delay=args.start_delay, log=log)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    def request_stop(signum, frame):
+        log("Stopping capture process...")
+        multi.stop()
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    result = multi.run(ocr=not args.no_ocr)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    for name, target in result['targets'].items():
+        if target is not None and target['stopped']:
+            log(f"[{name}] Resume later with: capture --resume {target['session']}")
+    if multi.errors:
+        return 1
+    if any(target['stopped'] for target in result['targets'].values()):
+        return 130
+    return 0
+
+
+def run_ocr(args):
+    from google_vision_ocr import batch_process_pdfs
+
+    pdf_paths = _pdf_paths(args.paths)
+    if not pdf_paths:
+        print("Error: no PDF files found", file=sys.stderr)
+        return 2
+
+    output_folder = os.path.expanduser(args.output_dir) if args.output_dir else os.path.dirname(os.path.abspath(pdf_paths[0]))
+    if args.searchable:
+        return _run_searchable(pdf_paths, output_folder, args.workers)
+    results = batch_process_pdfs(pdf_paths, output_folder, max_workers=args.workers)
+    failed = [path for path, output in results.items() if output is None]
+    for path in failed:
+        print(f"Failed: {path}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def _run_searchable(pdf_paths, output_folder, workers):
+    from searchable_pdf import make_searchable
+
+    os.makedirs(output_folder, exist_ok=True)
+    failed = 0
+    for pdf_path in pdf_paths:
+        text_path = os.path.join(output_folder, f"{os.path.basename(pdf_path)}.txt")
+        try:
+            make_searchable(pdf_path, text_path=text_path, max_workers=workers)
+            print(f"Searchable: {pdf_path}")
+        except Exception as e:
+            print(f"Failed: {pdf_path}: {e}", file=sys.stderr)
+            failed += 1
+    return 1 if failed else 0
+
+
+def run_watch(args):
+    from watch_folder import FolderWatcher
+
+    folder = os.path.expanduser(args.folder)
+    watcher = FolderWatcher(folder, os.path.expanduser(args.output_dir) if args.output_dir else folder,
+                            poll_interval=args.poll_interval, settle_seconds=args.settle,
+                            max_workers=args.workers, use_inotify=not args.no_inotify)
+
+    # First Ctrl-C/SIGTERM finishes the current batch and exits; a second Ctrl-C exits at once
+    def request_stop(signum, frame):
+        print("Stopping after the current batch (Ctrl-C again to quit now)...")
+        watcher.stop()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    watcher.run()
+    return 0
+
+
+def _pdf_paths(paths):
+    """Expand folders into the PDFs they contain"""
+    pdf_paths = []
+    for path in paths:
+        path = os.path.expanduser(path)
+        if os.path.isdir(path):
+            pdf_paths.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(".pdf"))
+        else:
+            pdf_paths.append(path)
+    return pdf_paths
+
+
+def run_queue(args):
+    from job_queue import DEFAULT_QUEUE_DB, JobQueue, run_worker
+
+    queue = JobQueue(os.path.expanduser(args.db or DEFAULT_QUEUE_DB), lease_seconds=args.lease,
+                     journal_mode="DELETE" if args.network_fs else "WAL")
+    if args.queue_command == "add":
+        for pdf_path in _pdf_paths(args.paths):
+            output = None
+            if args.output_dir:
+                output = os.path.join(os.path.expanduser(args.output_dir), os.path.basename(pdf_path) + ".txt")
+            try:
+                book_id = queue.add_book(pdf_path, output)
+            except Exception as e:
+                print(f"Skipping {pdf_path}: {e}", file=sys.stderr)
+                continue
+            print(f"Queued book {book_id}: {pdf_path}")
+        return 0
+
+    if args.queue_command == "worker":
+        stop_event = threading.Event()
+
+        def request_stop(signum, frame):
+            print("Stopping after the current pages...")
+            stop_event.set()
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGTERM, request_stop)
+        run_worker(queue, threads=args.threads, exit_when_idle=args.exit_when_idle, stop_event=stop_event)
+        return 0
+
+    stats = queue.stats()
+    print(f"Books: {stats['books']}")
+    print(f"Pages: {stats['pages']}")
+    print(f"Expired leases waiting for retry: {stats['expired_leases']}")
+    print(f"Throughput (last minute): {stats['pages_per_sec']:.2f} pages/sec")
+    return 0
+
+
+def run_serve(args):
+    from ocr_service import serve
+
+    spool_dir = os.path.expanduser(args.spool_dir) if args.spool_dir else None
+    path_root = os.path.expanduser(args.path_root) if args.path_root else None
+    serve(args.host, args.port, max_workers=args.workers, spool_dir=spool_dir, verbose=args.verbose,
+          path_root=path_root)
+    return 0
+
+
+def _page_images(path):
+    """Page images (PNG) of a capture session folder or an image PDF, one at a time"""
+    if os.path.isdir(path):
+        session = CaptureSession.open(path)
+        with session.page_buffers(dropped=False) as buffers:
+            for buffer in buffers:
+                yield buffer.read_bytes()
+        return
+
+    import pikepdf
+    from searchable_pdf import page_image_bytes
+
+    with pikepdf.open(path) as pdf:
+        for page_number, page in enumerate(pdf.pages, start=1):
+            yield page_image_bytes(path, page, page_number)
+
+
+def run_compress(args):
+    import tempfile
+    from pdf_compression import PROFILES, write_pdf
+
+    source = os.path.expanduser(args.input).rstrip(os.sep)
+    if not os.path.exists(source):
+        print(f"Error: {source} does not exist", file=sys.stderr)
+        return 2
+
+    if not args.compare:
+        output = os.path.expanduser(args.output) if args.output else \
+            f"{os.path.splitext(source)[0]}.{args.profile}.pdf"
+        stats = write_pdf(_page_images(source), output, args.profile, max_workers=args.workers)
+        print(f"{output}: {stats['pages']} pages, {stats['bytes'] / 1024 / 1024:.1f} MB "
+              f"in {stats['seconds']:.1f}s {stats['kinds']}")
+        return 0
+
+    print(f"{'Profile':<10} {'Size (MB)':>10} {'Ratio':>7} {'Seconds':>8}  Pages")
+    with tempfile.TemporaryDirectory() as folder:
+        for profile in PROFILES:
+            stats = write_pdf(_page_images(source), os.path.join(folder, f"{profile}.pdf"), profile,
+                              max_workers=args.workers)
+            ratio = stats['bytes'] / stats['input_bytes'] if stats['input_bytes'] else 0.0
+            kinds = ", ".join(f"{count} {kind}" for kind, count in sorted(stats['kinds'].items()))
+            print(f"{profile:<10} {stats['bytes'] / 1024 / 1024:>10.2f} {ratio:>7.2f} {stats['seconds']:>8.1f}  {kinds}")
+    return 0
+
+
+def run_importtime(args):
+    from import_report import print_report
+    return print_report(args.module, budget_ms=args.budget_ms, top=args.top)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Compare Mask Module for Book Scanner
+Limits page fingerprints to the book's content. Reader UI inside the capture area
+(page counters, progress bars, a blinking cursor, ad slots) can be left out with
+ignore boxes and a content region (ROI), given in the settings profile or learned
+by watching which pixels change while the page stays the same. Only the
+fingerprints use the mask; saved pages are never changed.
+"""
+import time
+
+# Gray levels a pixel must change by between two frames of the same page to count as volatile
+VOLATILE_THRESHOLD = 24
+
+# Frames taken of the first page to learn the mask, and the seconds between them
+LEARN_FRAMES = 4
+LEARN_INTERVAL = 0.4
+
+# Pixels added around each learned ignore box
+MASK_PADDING = 6
+
+# Learned boxes covering more than this share of the frame mean the page itself changed
+MAX_IGNORED = 0.1
+
+# A content ROI is only learned if the page fills less than this share of the frame
+MAX_ROI_AREA = 0.9
+
+
+def _box(values):
+    return tuple(int(value) for value in values)
+
+
+class CompareMask:
+    """Content region and ignore boxes, in pixels of the captured frame"""
+
+    def __init__(self, roi=None, ignore=()):
+        """
+        Args:
+            roi (tuple, optional): (left, top, right, bottom) of the part compared (default: all of it)
+            ignore (list): (left, top, right, bottom) boxes left out of the comparison
+        """
+        self.roi = _box(roi) if roi else None
+        self.ignore = [_box(box) for box in ignore or ()]
+
+    def __bool__(self):
+        return bool(self.roi or self.ignore)
+
+    def apply(self, image, box=None):
+        """
+        The part of a frame that fingerprints are taken of.
+
+        Args:
+            image (PIL.Image): Captured frame
+            box (tuple, optional): Part of the frame to use, e.g. one page of a spread
+
+        Returns:
+            PIL.Image: The frame cut to box and the ROI, with ignore boxes painted over
+                       (the frame itself when there is nothing to mask)
+        """
+        if not self and box is None:
+            return image
+        from PIL import ImageDraw
+
+        left, top, right, bottom = box or (0, 0, image.width, image.height)
+        if self.roi:
+            left, top = max(left, self.roi[0]), max(top, self.roi[1])
+            right, bottom = min(right, self.roi[2]), min(bottom, self.roi[3])
+        if right <= left or bottom <= top:
+            # The ROI misses this part entirely; compare all of it rather than nothing
+            left, top, right, bottom = box or (0, 0, image.width, image.height)
+        part = image.crop((left, top, right, bottom))
+        draw = None
+        for ignore_left, ignore_top, ignore_right, ignore_bottom in self.ignore:
+            if ignore_right <= left or ignore_left >= right or ignore_bottom <= top or ignore_top >= bottom:
+                continue
+            draw = draw or ImageDraw.Draw(part)
+            draw.rectangle((ignore_left - left, ignore_top - top, ignore_right - left - 1, ignore_bottom - top - 1),
+                           fill=(128, 128, 128) if part.mode == 'RGB' else 128)
+        return part
+
+    def settings(self):
+        """The mask as session/profile settings (JSON-friendly lists)"""
+        return {'compare_roi': list(self.roi) if self.roi else None,
+                'compare_ignore': [list(box) for box in self.ignore]}
+
+
+def volatile_boxes(frames, threshold=VOLATILE_THRESHOLD, padding=MASK_PADDING):
+    """
+    Boxes around the pixels that changed between frames of the same page.
+
+    Args:
+        frames (list): PIL images of one page taken a moment apart
+
+    Returns:
+        list: (left, top, right, bottom) boxes, or None if so much changed that the
+              page itself was still changing
+    """
+    import cv2
+    import numpy as np
+
+    grays = [np.asarray(frame.convert('L'), dtype=np.int16) for frame in frames]
+    changed = np.zeros(grays[0].shape, dtype=np.uint8)
+    for previous, current in zip(grays, grays[1:]):
+        changed |= (np.abs(current - previous) > threshold).astype(np.uint8)
+    if not changed.any():
+        return []
+
+    # Join the pieces of one widget (the digits of a counter) into one box
+    changed = cv2.dilate(changed, np.ones((2 * padding + 1, 2 * padding + 1), np.uint8))
+    count, _, stats, _ = cv2.connectedComponentsWithStats(changed)
+    height, width = changed.shape
+    boxes = [(int(x), int(y), min(width, int(x + w)), min(height, int(y + h))) for x, y, w, h, _ in stats[1:count]]
+    if sum((right - left) * (bottom - top) for left, top, right, bottom in boxes) > MAX_IGNORED * width * height:
+        return None
+    return boxes
+
+
+def learn_compare_mask(grab, roi=None, ignore=(), frames=LEARN_FRAMES, interval=LEARN_INTERVAL):
+    """
+    Learn a mask from a few frames of the page on screen.
+
+    The content ROI is the page found in the frame (when the capture area also
+    holds reader chrome); ignore boxes cover whatever changed between the frames.
+    Boxes given in the profile are kept.
+
+    Args:
+        grab (callable): Returns a screenshot of the capture area
+        roi (tuple, optional): Configured ROI, used instead of a learned one
+        ignore (list): Configured ignore boxes
+
+    Returns:
+        tuple: (CompareMask, learned) where learned is a short description for the log
+    """
+    from page_region import detect_page_region
+
+    images = [grab()]
+    for _ in range(frames - 1):
+        time.sleep(interval)
+        images.append(grab())
+
+    learned = []
+    if roi is None:
+        found = detect_page_region(images[-1])
+        width, height = images[-1].size
+        if found and (found[2] - found[0]) * (found[3] - found[1]) < MAX_ROI_AREA * width * height:
+            roi = found
+            learned.append(f"content region {found}")
+    boxes = volatile_boxes(images)
+    if boxes is None:
+        learned.append("no ignore boxes (the page kept changing)")
+        boxes = []
+    elif boxes:
+        learned.append(f"{len(boxes)} ignore box(es) {boxes}")
+    return CompareMask(roi, list(ignore or ()) + boxes), ", ".join(learned) or "nothing to mask"
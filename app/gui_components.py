@@ -79,6 +79,22 @@ class GUIComponents:
         # Add test capture button to verify coordinates
         self.app.test_capture_btn = ttk.Button(step1_frame, text="Test Capture", command=self.app.test_capture_area)
         self.app.test_capture_btn.grid(row=1, column=1, sticky=tk.W, padx=(10, 0), pady=(10, 0))
+
+        # Find the page on the screen instead of dragging a rectangle
+        self.app.detect_area_btn = ttk.Button(step1_frame, text="Auto-Detect Page", command=self.app.detect_capture_area)
+        self.app.detect_area_btn.grid(row=1, column=2, sticky=tk.W, padx=(10, 0), pady=(10, 0))
+
+        self.app.trim_margins_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(step1_frame, text="Trim page margins", variable=self.app.trim_margins_var).grid(
+            row=3, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
+
+        self.app.spread_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(step1_frame, text="Two-page spreads (split at the gutter)", variable=self.app.spread_var).grid(
+            row=4, column=0, columnspan=2, sticky=tk.W)
+
+        self.app.learn_mask_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(step1_frame, text="Ignore reader UI that changes by itself (clock, cursor, ads)",
+                        variable=self.app.learn_mask_var).grid(row=5, column=0, columnspan=2, sticky=tk.W)
         
         self.app.area_status_label = ttk.Label(step1_frame, text="No area selected", foreground="red")
         self.app.area_status_label.grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=(10, 0))
@@ -95,6 +111,10 @@ class GUIComponents:
         
         self.app.button_status_label = ttk.Label(step2_frame, text="No button selected", foreground="red")
         self.app.button_status_label.grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=(10, 0))
+
+        self.app.watchdog_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(step2_frame, text="Recover stalled reader (refocus, click again, page-down)",
+                        variable=self.app.watchdog_var).grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
         
     def _create_step3_frame(self, parent):
         """Create Step 3 frame for page count and output settings"""
@@ -134,6 +154,14 @@ class GUIComponents:
         # Help text
         help_text = "Leave location empty for ~/Documents/book-scanner/ and filename empty for auto-generated"
         ttk.Label(step3_frame, text=help_text, font=("TkDefaultFont", 8), foreground="gray").grid(row=3, column=0, columnspan=3, sticky=tk.W, pady=(5, 0))
+
+        # Blank pages are never sent to OCR unless kept as ordinary pages
+        ttk.Label(step3_frame, text="Blank pages:").grid(row=4, column=0, sticky=tk.W, pady=(10, 0))
+
+        self.app.blank_pages_var = tk.StringVar(value="keep")
+        ttk.Combobox(step3_frame, textvariable=self.app.blank_pages_var, state="readonly", width=12,
+                     values=("keep", "placeholder", "drop", "skip-ocr")).grid(row=4, column=1, sticky=tk.W,
+                                                                              padx=(10, 0), pady=(10, 0))
         
     def _create_step4_frame(self, parent):
         """Create Step 4 frame for capture and process"""
@@ -146,6 +174,9 @@ class GUIComponents:
         self.app.stop_btn = ttk.Button(step4_frame, text="Stop", command=self.app.stop_capture, state="disabled")
         self.app.stop_btn.grid(row=0, column=1, sticky=tk.W, padx=(10, 0))
         
+        self.app.resume_btn = ttk.Button(step4_frame, text="Resume Capture", command=self.app.resume_capture_process)
+        self.app.resume_btn.grid(row=0, column=2, sticky=tk.W, padx=(10, 0))
+        
         self.app.open_folder_btn = ttk.Button(step4_frame, text="Open Output Folder", command=self.open_output_folder)
         self.app.open_folder_btn.grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=(10, 0))
         
@@ -160,7 +191,7 @@ class GUIComponents:
         self.app.process_pdf_btn.grid(row=1, column=0, sticky=tk.W, pady=(10, 0))
         
         # Add info label about methods
-        info_text = "💡 Async method is faster for large PDFs but requires Google Cloud Storage"
+        info_text = "💡 Short PDFs are sent inline; large PDFs use the async method via Google Cloud Storage"
         ttk.Label(pdf_ocr_frame, text=info_text, font=("TkDefaultFont", 8), foreground="gray").grid(row=2, column=0, columnspan=2, sticky=tk.W, pady=(5, 0))
         
         # Settings section
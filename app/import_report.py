@@ -0,0 +1,97 @@
+"""
+Import Time Report for Book Scanner
+Runs a fresh interpreter with -X importtime and summarizes where startup time goes,
+so startup can be held to a time budget:
+
+    python run_book_scanner.py importtime --budget-ms 400
+"""
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(APP_DIR), 'src')
+
+# Modules that should never be imported just to show the window
+HEAVY_MODULES = ("google.cloud.vision", "google.cloud.storage", "cv2", "pdf2image", "numpy", "pyautogui")
+
+
+def parse_importtime(stderr_text):
+    """
+    Parse -X importtime output.
+
+    Returns:
+        list: (module, self_us, cumulative_us, depth) tuples in output order
+    """
+    entries = []
+    for line in stderr_text.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        module = name.strip()
+        # Nested imports are indented by two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((module, int(self_us), int(cumulative_us), depth))
+    return entries
+
+
+def measure_imports(module="book_scanner_gui", python=None):
+    """
+    Import module in a fresh interpreter and return its parsed importtime entries.
+
+    Raises:
+        RuntimeError: If the import fails
+    """
+    code = f"import sys; sys.path[:0] = [{APP_DIR!r}, {SRC_DIR!r}]; import {module}"
+    result = subprocess.run([python or sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith("import time:")]
+        raise RuntimeError(f"Importing {module} failed:\n" + "\n".join(errors[-5:]))
+    return parse_importtime(result.stderr)
+
+
+def summarize(entries, module):
+    """
+    Returns:
+        dict: 'total_ms' for module, 'packages' as (top-level package, ms) sorted
+              by time spent, and 'heavy' modules that were imported
+    """
+    packages = {}
+    for name, self_us, _, _ in entries:
+        top = name.split(".")[0]
+        packages[top] = packages.get(top, 0) + self_us
+    total_us = next((cumulative for name, _, cumulative, depth in reversed(entries)
+                     if name == module and depth == 0), sum(packages.values()))
+    imported = {name for name, _, _, _ in entries}
+    return {
+        'total_ms': total_us / 1000,
+        'packages': sorted(((name, us / 1000) for name, us in packages.items()), key=lambda item: -item[1]),
+        'heavy': [name for name in HEAVY_MODULES if name in imported],
+    }
+
+
+def print_report(module="book_scanner_gui", budget_ms=None, top=15, python=None):
+    """
+    Print the import breakdown for module.
+
+    Returns:
+        int: 0 if within budget (or no budget), 1 if over budget or the import failed
+    """
+    try:
+        summary = summarize(measure_imports(module, python), module)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    print(f"Import time for {module}: {summary['total_ms']:.1f} ms")
+    print("-" * 40)
+    for name, ms in summary['packages'][:top]:
+        print(f"{name:<28} {ms:8.1f} ms")
+    if summary['heavy']:
+        print(f"Heavy modules imported at startup: {', '.join(summary['heavy'])}")
+
+    if budget_ms is not None and summary['total_ms'] > budget_ms:
+        print(f"Over budget: {summary['total_ms']:.1f} ms > {budget_ms:.1f} ms")
+        return 1
+    return 0
@@ -0,0 +1,64 @@
+"""
+Log Sink Module for Book Scanner
+Writes the full application log to a rotating file from a background thread
+"""
+import logging
+import logging.handlers
+import os
+import queue
+
+
+# Default folder for log files, next to the default output folder
+DEFAULT_LOG_DIR = os.path.join(os.path.expanduser("~"), "Documents", "book-scanner", "logs")
+
+
+class LogSink:
+    """Rotating log file fed through a queue, so callers never wait on disk I/O"""
+
+    def __init__(self, log_dir=DEFAULT_LOG_DIR, level=logging.INFO, max_bytes=5 * 1024 * 1024, backup_count=5):
+        """
+        Args:
+            log_dir (str): Folder for book_scanner.log and its rotated copies
+            level (int): Lowest level written to the file
+            max_bytes (int): Size at which the file is rotated
+            backup_count (int): Number of rotated files kept
+        """
+        self.log_path = os.path.join(log_dir, "book_scanner.log")
+        self.logger = logging.getLogger("book_scanner")
+        self.logger.setLevel(level)
+        self.logger.propagate = False
+        self._listener = None
+
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                self.log_path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        except OSError as e:
+            print(f"[Book Scanner] File logging disabled: {e}")
+            self.logger.disabled = True
+            return
+        file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(message)s"))
+        self._file_handler = file_handler
+
+        # QueueHandler only enqueues the record; the listener thread does the formatting and writing
+        log_queue = queue.SimpleQueue()
+        self.logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+        self._listener = logging.handlers.QueueListener(log_queue, file_handler)
+        self._listener.start()
+
+    def enabled_for(self, level):
+        """True if a message at this level would be written to the file"""
+        return self._listener is not None and self.logger.isEnabledFor(level)
+
+    def write(self, level, message):
+        self.logger.log(level, message)
+
+    def set_level(self, level):
+        self.logger.setLevel(level)
+
+    def stop(self):
+        """Flush queued records and stop the writer thread"""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+            self._file_handler.close()
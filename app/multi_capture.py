@@ -0,0 +1,142 @@
+"""
+Multi-Target Capture Module for Book Scanner
+Captures several reader windows on one desktop in the same run. Most of a page's
+time is spent waiting for the reader to render after the click; while one target
+waits, the scheduler captures and turns the pages of the others, one mouse action
+at a time. Every target keeps its own engine: region, next button, duplicate
+detection, session and output book.
+"""
+import heapq
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from capture_engine import resolve_output_base
+
+
+def _overlap(first, second):
+    """True if two engines' capture areas share any pixels"""
+    (left, top), (right, bottom) = first.top_left, first.bottom_right
+    (other_left, other_top), (other_right, other_bottom) = second.top_left, second.bottom_right
+    return left < other_right and other_left < right and top < other_bottom and other_top < bottom
+
+
+class MultiCapture:
+    """
+    Interleaves the capture loops of several CaptureEngines.
+
+    Each engine runs its run_iter(interleave=True) generator. After turning a page
+    the generator yields the time the page will have loaded, and the scheduler
+    moves on to whichever target is ready first. Everything runs on one thread, so
+    clicks and screenshots never overlap.
+    """
+
+    def __init__(self, engines, names=None, start_delay=3.0, log=None):
+        """
+        Args:
+            engines (list): CaptureEngine objects, one per reader window; their own
+                start_delay should be 0, the scheduler waits once for all of them
+            names (list, optional): Target names for events and results (default: 1, 2, ...)
+            start_delay (float): Seconds to wait before the first capture
+            log (callable): log(message, *args, level=logging.INFO)
+
+        Raises:
+            ValueError: If capture areas overlap or two targets would write the same book
+        """
+        if not engines:
+            raise ValueError("No capture targets")
+        self.engines = list(engines)
+        self.names = list(names) if names else [str(number) for number in range(1, len(self.engines) + 1)]
+        self.start_delay = start_delay
+        self.log = log or (lambda message, *args, level=logging.INFO: None)
+
+        for position, engine in enumerate(self.engines):
+            for other in range(position):
+                if _overlap(engine, self.engines[other]):
+                    raise ValueError(f"Capture areas of targets {self.names[other]} and "
+                                     f"{self.names[position]} overlap")
+        outputs = set()
+        for name, engine in zip(self.names, self.engines):
+            if engine.session is None:
+                # Timestamped names made in the same second would collide, so fix each name now
+                folder, base = resolve_output_base(engine.base_location, engine.base_filename)
+                if not engine.base_filename:
+                    base = f"{base}_{name}"
+                engine.base_location, engine.base_filename = folder, base
+            if (engine.base_location, engine.base_filename) in outputs:
+                raise ValueError(f"Target {name} writes the same book as another target")
+            outputs.add((engine.base_location, engine.base_filename))
+
+        self.stopped = {name: False for name in self.names}
+        self.errors = {}
+        self.idle_seconds = 0.0
+
+    def stop(self):
+        """Stop every target before its next page (safe to call from any thread)"""
+        for engine in self.engines:
+            engine.stop()
+
+    def run_iter(self):
+        """
+        Capture all targets, yielding (name, event) for each engine event.
+
+        'page_turned' events are consumed by the scheduler. A target that raises
+        (e.g. SessionMismatchError) is logged, recorded in self.errors and dropped;
+        the others carry on.
+        """
+        self.log(f"Waiting {self.start_delay:g} seconds before capturing {len(self.engines)} targets...")
+        time.sleep(self.start_delay)
+        iterators = [engine.run_iter(interleave=True) for engine in self.engines]
+        # (time the target's page has loaded, target position)
+        ready = [(0.0, position) for position in range(len(self.engines))]
+        while ready:
+            ready_at, position = heapq.heappop(ready)
+            delay = ready_at - time.monotonic()
+            if delay > 0:
+                self.idle_seconds += delay
+                time.sleep(delay)
+            name = self.names[position]
+            try:
+                for event in iterators[position]:
+                    if event['type'] == 'page_turned':
+                        heapq.heappush(ready, (event['ready_at'], position))
+                        break
+                    if event['type'] == 'stopped':
+                        self.stopped[name] = True
+                    yield name, event
+            except Exception as e:
+                self.log(f"❌ Target {name} failed: {e}")
+                self.errors[name] = e
+                self.engines[position].cancel_streaming()
+
+    def run(self, ocr=True):
+        """
+        Capture all targets, then save their PDFs and run OCR side by side.
+
+        Returns:
+            dict: 'targets' maps each name to its engine's run() result (or None if
+                  it failed, see self.errors); 'seconds' spent capturing, total
+                  'pages' and 'idle_seconds' spent waiting with every target loading
+        """
+        start = time.perf_counter()
+        for _ in self.run_iter():
+            pass
+        seconds = time.perf_counter() - start
+        pages = sum(len(engine.images) for engine in self.engines)
+        self.log(f"Captured {pages} pages from {len(self.engines)} targets in {seconds:.1f}s "
+                 f"({pages / seconds * 60 if seconds else 0:.0f} pages/min, "
+                 f"{self.idle_seconds:.1f}s waiting on every reader)")
+
+        targets = {name: None for name in self.names}
+        finished = [(name, engine) for name, engine in zip(self.names, self.engines) if name not in self.errors]
+        # PDF writing and OCR of the books are independent, and OCR mostly waits on the network
+        with ThreadPoolExecutor(max_workers=max(1, len(finished))) as executor:
+            futures = {name: executor.submit(engine.complete, self.stopped[name], seconds, ocr)
+                       for name, engine in finished}
+            for name, future in futures.items():
+                try:
+                    targets[name] = future.result()
+                except Exception as e:
+                    self.log(f"❌ Target {name} failed: {e}")
+                    self.errors[name] = e
+        return {'targets': targets, 'seconds': seconds, 'pages': pages, 'idle_seconds': self.idle_seconds}
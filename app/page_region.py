@@ -0,0 +1,312 @@
+"""
+Page Region Module for Book Scanner
+Finds the book page on a full-screen frame and trims the empty margins of captured
+pages, so reader chrome and white space are not saved, put in the PDF or sent to OCR.
+"""
+
+# Page candidates smaller than this share of the screen are ignored
+MIN_PAGE_AREA = 0.08
+
+# A candidate must fill this share of its bounding rectangle to count as a page
+MIN_RECTANGULARITY = 0.85
+
+# Gray levels a pixel may differ from the page background and still count as margin
+MARGIN_TOLERANCE = 24
+
+# Pixels kept around the content when trimming
+TRIM_PADDING = 12
+
+
+def detect_page_region(frame, min_area=MIN_PAGE_AREA):
+    """
+    Find the book page in a screenshot of the whole screen.
+
+    Pages are found two ways: as the outline of a large rectangle in the edge map
+    (pages with a border or shadow) and as the largest bright, rectangular region
+    (white pages on darker reader chrome). The largest candidate that is not the
+    whole screen wins.
+
+    Args:
+        frame (PIL.Image): Full-screen screenshot
+        min_area (float): Smallest page as a share of the frame
+
+    Returns:
+        tuple: (left, top, right, bottom) in frame pixels, or None if no page was found
+    """
+    import cv2
+    import numpy as np
+
+    gray = cv2.cvtColor(np.asarray(frame.convert('RGB')), cv2.COLOR_RGB2GRAY)
+    height, width = gray.shape
+    frame_area = float(width * height)
+    kernel = np.ones((5, 5), np.uint8)
+
+    edges = cv2.dilate(cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 50, 150), kernel)
+    _, bright = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # Close the gaps the page's own text leaves in the bright region
+    bright = cv2.morphologyEx(bright, cv2.MORPH_CLOSE, np.ones((25, 25), np.uint8))
+
+    best = None
+    # Dilating the edges grew their outlines by 2 pixels on every side
+    for mask, inset in ((edges, 2), (bright, 0)):
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            x, y, w, h = x + inset, y + inset, w - 2 * inset, h - 2 * inset
+            area = w * h
+            if area < min_area * frame_area or area > 0.98 * frame_area:
+                continue
+            if cv2.contourArea(contour) < MIN_RECTANGULARITY * area:
+                continue
+            if best is None or area > best[2] * best[3]:
+                best = (x, y, w, h)
+    if best is None:
+        return None
+    x, y, w, h = best
+    return (x, y, x + w, y + h)
+
+
+def content_box(image, tolerance=MARGIN_TOLERANCE, padding=TRIM_PADDING):
+    """
+    Box around everything on a page that differs from its background.
+
+    The background is the median gray level of the image border.
+
+    Args:
+        image (PIL.Image): Captured page
+
+    Returns:
+        tuple: (left, top, right, bottom) in image pixels, or None for an empty page
+    """
+    import numpy as np
+
+    gray = np.asarray(image.convert('L'), dtype=np.int16)
+    border = np.concatenate((gray[0], gray[-1], gray[:, 0], gray[:, -1]))
+    content = np.abs(gray - int(np.median(border))) > tolerance
+    rows = np.flatnonzero(content.any(axis=1))
+    columns = np.flatnonzero(content.any(axis=0))
+    if not len(rows):
+        return None
+    height, width = gray.shape
+    return (max(0, int(columns[0]) - padding), max(0, int(rows[0]) - padding),
+            min(width, int(columns[-1]) + 1 + padding), min(height, int(rows[-1]) + 1 + padding))
+
+
+class StableCrop:
+    """
+    One trim box for the whole book, so pages do not jump around in the PDF.
+
+    The box starts as the first page's content box plus padding and only ever grows:
+    when a later page has content outside it, the box is widened to that page's
+    content plus padding. Content only has to fit inside the padded box, so small
+    differences between pages (line lengths, page numbers) fit without growing it
+    and the box settles quickly.
+    Pages saved before a growth keep the smaller box; pad_to_box() brings them to
+    the final box when the PDF is written.
+    """
+
+    def __init__(self, box=None, padding=TRIM_PADDING):
+        """
+        Args:
+            box (tuple, optional): Box learned earlier, e.g. by a resumed session
+            padding (int): Pixels kept around each page's content
+        """
+        self.box = tuple(box) if box else None
+        self.padding = padding
+
+    def update(self, image):
+        """
+        Grow the box to fit this page's content.
+
+        Returns:
+            bool: True if the box changed
+        """
+        found = content_box(image, padding=0)
+        if found is None:
+            return False
+        if self.box is not None:
+            left, top, right, bottom = self.box
+            if found[0] >= left and found[1] >= top and found[2] <= right and found[3] <= bottom:
+                return False
+        width, height = image.size
+        padded = (max(0, found[0] - self.padding), max(0, found[1] - self.padding),
+                  min(width, found[2] + self.padding), min(height, found[3] + self.padding))
+        if self.box is None:
+            self.box = padded
+        else:
+            self.box = (min(left, padded[0]), min(top, padded[1]), max(right, padded[2]), max(bottom, padded[3]))
+        return True
+
+    def apply(self, image):
+        """The page cut to the current box (the whole page until a box is known)"""
+        if self.box is None:
+            return image
+        left, top, right, bottom = self.box
+        return image.crop((left, top, min(right, image.width), min(bottom, image.height)))
+
+
+def pad_to_box(image, box, final_box):
+    """
+    A page cut to an earlier trim box, padded with white to the box the book ended with,
+    so every page has the same size and its content stays where it was on screen.
+
+    Args:
+        image (PIL.Image): Page cut to box
+        box (tuple): (left, top, right, bottom) the page was cut to, inside final_box
+        final_box (tuple): (left, top, right, bottom) of the book's final trim box
+
+    Returns:
+        PIL.Image: The padded page
+    """
+    from PIL import Image
+
+    padded = Image.new(image.mode, (final_box[2] - final_box[0], final_box[3] - final_box[1]), 'white')
+    padded.paste(image, (box[0] - final_box[0], box[1] - final_box[1]))
+    return padded
+
+
+def padded_words(words, box, final_box):
+    """
+    Word boxes (normalized to the page cut to box) moved to the page padded by pad_to_box().
+
+    Args:
+        words (list): (text, x0, y0, x1, y1) as from searchable_pdf.page_words()
+
+    Returns:
+        list: The words with coordinates normalized to final_box
+    """
+    width, height = final_box[2] - final_box[0], final_box[3] - final_box[1]
+    left, top = box[0] - final_box[0], box[1] - final_box[1]
+    scale_x, scale_y = box[2] - box[0], box[3] - box[1]
+    return [(text, (left + x0 * scale_x) / width, (top + y0 * scale_y) / height,
+             (left + x1 * scale_x) / width, (top + y1 * scale_y) / height)
+            for text, x0, y0, x1, y1 in words]
+
+
+def detect_screen_page(frame, screen_size):
+    """
+    detect_page_region() for a screenshot of the whole screen, in screen coordinates.
+
+    Screenshots on HiDPI/Retina displays have more pixels than the screen has points;
+    the box is scaled to the coordinates used for clicks and capture regions.
+
+    Args:
+        frame (PIL.Image): Full-screen screenshot
+        screen_size (tuple): (width, height) of the screen in click coordinates
+
+    Returns:
+        tuple: (top_left, bottom_right) points, or None if no page was found
+    """
+    box = detect_page_region(frame)
+    if box is None:
+        return None
+    scale_x = screen_size[0] / float(frame.width)
+    scale_y = screen_size[1] / float(frame.height)
+    left, top, right, bottom = box
+    return ((int(round(left * scale_x)), int(round(top * scale_y))),
+            (int(round(right * scale_x)), int(round(bottom * scale_y))))
+
+
+# Part of the frame width searched for the gutter of a two-page spread
+GUTTER_BAND = (0.35, 0.65)
+
+# The gutter's texture must be at most this share of a typical column's
+GUTTER_MAX_TEXTURE = 0.25
+
+# Narrowest gutter, as a share of the frame width
+GUTTER_MIN_WIDTH = 0.02
+
+
+def find_gutter(image, band=GUTTER_BAND):
+    """
+    Column of the gutter between the two pages of a spread.
+
+    Each column's standard deviation measures its texture: columns through text
+    or pictures vary a lot, the gutter (blank or an even shadow) hardly at all.
+    The flattest run of columns near the middle is the gutter, if it is clearly
+    flatter than the page's columns.
+
+    Args:
+        image (PIL.Image): Captured frame
+        band (tuple): Range of the width searched, as shares of it
+
+    Returns:
+        int: x of the gutter's middle, or None if the frame is not a spread
+    """
+    import numpy as np
+
+    gray = np.asarray(image.convert('L'), dtype=np.float32)
+    width = gray.shape[1]
+    texture = gray.std(axis=0)
+    window = max(1, width // 100)
+    texture = np.convolve(texture, np.ones(window) / window, mode='same')
+
+    start, end = int(width * band[0]), int(width * band[1])
+    if end - start < 3:
+        return None
+    middle = texture[start:end]
+    lowest = float(middle.min())
+    typical = float(np.median(texture[texture > lowest + 1.0])) if (texture > lowest + 1.0).any() else 0.0
+    if typical == 0.0 or lowest > GUTTER_MAX_TEXTURE * typical:
+        return None
+
+    # The flat run around the flattest column, which may reach outside the band
+    flat = texture <= lowest + 0.1 * (typical - lowest)
+    left = right = start + int(middle.argmin())
+    while left > 0 and flat[left - 1]:
+        left -= 1
+    while right < width - 1 and flat[right + 1]:
+        right += 1
+    # A gutter is wider than the gaps between words and has a page on each side
+    # (a single page's blank right margin would run to the edge of the frame)
+    if right - left + 1 < width * GUTTER_MIN_WIDTH:
+        return None
+    if left < width * 0.1 or right > width * 0.9:
+        return None
+    return (left + right) // 2
+
+
+def split_spread(image):
+    """
+    Split a two-page spread at its gutter.
+
+    Returns:
+        list: [left page, right page], or [image] if the frame is a single page
+    """
+    gutter = find_gutter(image)
+    if gutter is None:
+        return [image]
+    return [image.crop((0, 0, gutter, image.height)), image.crop((gutter, 0, image.width, image.height))]
+
+
+# Longest side of the thumbnail blank pages are judged on
+BLANK_THUMBNAIL = 160
+
+# Gray levels a thumbnail pixel must differ from the paper by to count as ink
+BLANK_TOLERANCE = 40
+
+# Pages with at most this share of ink pixels are blank (a lone page number or speck is allowed)
+BLANK_MAX_INK = 0.002
+
+
+def is_blank_page(image, max_ink=BLANK_MAX_INK):
+    """
+    True if a page is blank or nearly so.
+
+    The page is shrunk to a thumbnail (box filter, so this is cheap) and its pixels
+    are compared with the paper color, the median gray level.
+
+    Args:
+        image (PIL.Image): Captured page
+        max_ink (float): Largest share of ink pixels a blank page may have
+
+    Returns:
+        bool
+    """
+    import numpy as np
+
+    gray = image.convert('L')
+    factor = max(1, max(gray.size) // BLANK_THUMBNAIL)
+    thumbnail = np.asarray(gray.reduce(factor) if factor > 1 else gray, dtype=np.int16)
+    ink = np.abs(thumbnail - int(np.median(thumbnail))) > BLANK_TOLERANCE
+    return float(ink.mean()) <= max_ink
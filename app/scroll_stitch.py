@@ -0,0 +1,187 @@
+"""
+Scroll Stitch Module for Book Scanner
+Captures readers that scroll continuously instead of turning pages: each frame's
+overlap with the previous one is found by phase correlation, the new rows are
+appended to a tall strip, and the strip is cut into page-sized images at blank rows.
+"""
+
+# Frames are shrunk to at most this width for the FFT; the shift is then refined at full size
+CORRELATION_WIDTH = 256
+
+# Correlation peaks checked at full size
+CANDIDATE_PEAKS = 5
+
+# Smallest overlap between frames, as a share of the frame height
+MIN_OVERLAP = 0.1
+
+# Mean gray-level difference over the overlap above which two frames do not line up
+MAX_OVERLAP_DIFF = 6.0
+
+# A row whose pixels span fewer gray levels than this is blank (a place to cut)
+BLANK_ROW_RANGE = 16
+
+# Cuts are searched in the last share of a page's height
+CUT_SEARCH = 0.2
+
+
+def _gray(image):
+    import numpy as np
+    return np.asarray(image.convert('L'), dtype=np.float32)
+
+
+def find_scroll_shift(previous, current, expected=None):
+    """
+    Rows the content moved up between two frames of the same size.
+
+    Phase correlation on shrunken frames gives candidate shifts in one FFT; the
+    strongest few (and the expected shift, usually the last one measured) are
+    then refined and checked by comparing the overlapping rows at full size.
+
+    Args:
+        previous, current (numpy.ndarray): Grayscale frames (float32), as from _gray()
+        expected (int, optional): Shift to try as well
+
+    Returns:
+        int: The shift (0 if the frames are the same), or None if they do not overlap
+    """
+    import numpy as np
+
+    height, width = previous.shape
+    if np.array_equal(previous, current):
+        return 0
+
+    step = max(1, width // CORRELATION_WIDTH)
+    a = previous[::step, ::step]
+    b = current[::step, ::step]
+    # Zero-padding to twice the height makes the correlation linear, so the rows that wrap
+    # around do not hide small overlaps; only the sides are tapered
+    window = np.hanning(a.shape[1]).astype(np.float32)
+    size = (2 * a.shape[0], a.shape[1])
+    spectrum = np.fft.rfft2((a - a.mean()) * window, s=size) * np.conj(np.fft.rfft2((b - b.mean()) * window, s=size))
+    spectrum /= np.abs(spectrum) + 1e-9
+    correlation = np.fft.irfft2(spectrum, s=size)
+    # Scrolling only moves content vertically, so only the peaks in column 0 count. The window
+    # weakens the true peak when the overlap is small, so several peaks are checked.
+    candidates = {int(peak) * step for peak in np.argsort(correlation[:, 0])[-CANDIDATE_PEAKS:]}
+    if expected:
+        candidates.add(expected)
+
+    # Refine on every 4th column of the overlap, which must be a useful part of the frame
+    best, best_diff = None, None
+    shifts = {shift for coarse in candidates for shift in range(coarse - step - 1, coarse + step + 2)}
+    for shift in sorted(shift for shift in shifts if 1 <= shift <= height * (1 - MIN_OVERLAP)):
+        diff = float(np.abs(previous[shift:, ::4] - current[:height - shift, ::4]).mean())
+        if best_diff is None or diff < best_diff:
+            best, best_diff = shift, diff
+    if best is None or best_diff > MAX_OVERLAP_DIFF:
+        return None
+    return best
+
+
+def _cut_row(strip, target):
+    """Row to end a page at: the middle of the blank run nearest above target, or target"""
+    import numpy as np
+
+    start = int(target * (1 - CUT_SEARCH))
+    rows = strip[start:target]
+    blank = (rows.max(axis=1) - rows.min(axis=1)) < BLANK_ROW_RANGE
+    candidates = np.flatnonzero(blank)
+    if not len(candidates):
+        return target
+    end = int(candidates[-1])
+    first = end
+    while first > 0 and blank[first - 1]:
+        first -= 1
+    return start + (first + end) // 2 + 1
+
+
+class StripStitcher:
+    """
+    Joins scrolled frames into a strip and cuts finished pages off its top.
+
+    Only the rows not yet cut into pages are kept, so memory stays at about one
+    page plus one frame however long the document is.
+    """
+
+    def __init__(self, page_height=None):
+        """
+        Args:
+            page_height (int, optional): Page height in pixels (default: the frame height)
+        """
+        self.page_height = page_height
+        self.previous = None
+        self.last_shift = None
+        self._rows = []
+        self._gray_rows = []
+        self.frames = 0
+        self.breaks = 0
+
+    def reset(self, frame):
+        """Continue after a frame whose rows were already saved (e.g. when resuming)"""
+        self.previous = _gray(frame)
+        if self.page_height is None:
+            self.page_height = frame.height
+
+    def add(self, frame):
+        """
+        Add a frame to the strip.
+
+        Returns:
+            int: Rows of new content (0 means the reader did not scroll); a frame
+                 that does not overlap the previous one is added whole
+        """
+        import numpy as np
+
+        gray = _gray(frame)
+        rgb = np.asarray(frame.convert('RGB'))
+        if self.page_height is None:
+            self.page_height = frame.height
+        if self.previous is None or self.previous.shape != gray.shape:
+            new_rows = frame.height
+        else:
+            shift = find_scroll_shift(self.previous, gray, self.last_shift)
+            if shift:
+                self.last_shift = shift
+            if shift is None:
+                # Scrolled further than one frame, or the view changed: keep everything
+                self.breaks += 1
+                new_rows = frame.height
+            else:
+                new_rows = shift
+        self.previous = gray
+        self.frames += 1
+        if new_rows:
+            self._rows.append(rgb[frame.height - new_rows:])
+            self._gray_rows.append(gray[frame.height - new_rows:])
+        return new_rows
+
+    def height(self):
+        """Rows waiting in the strip"""
+        return sum(len(rows) for rows in self._rows)
+
+    def pop_pages(self, flush=False):
+        """
+        Cut finished pages off the strip.
+
+        Args:
+            flush (bool): Also return what is left as a last (shorter) page
+
+        Returns:
+            list: PIL images
+        """
+        import numpy as np
+        from PIL import Image
+
+        pages = []
+        # A page is cut once a frame's worth of rows follows it, so the cut can move up to a blank row
+        while self._rows and (self.height() >= self.page_height * (1 + CUT_SEARCH) or flush):
+            strip = np.concatenate(self._rows)
+            gray = np.concatenate(self._gray_rows)
+            if len(strip) <= self.page_height:
+                cut = len(strip)
+            else:
+                cut = _cut_row(gray, self.page_height)
+            pages.append(Image.fromarray(strip[:cut]))
+            self._rows = [strip[cut:]] if cut < len(strip) else []
+            self._gray_rows = [gray[cut:]] if cut < len(strip) else []
+        return pages
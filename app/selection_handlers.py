@@ -5,7 +5,6 @@ Contains all area and button selection functionality
 import tkinter as tk
 from tkinter import messagebox
 import time
-import pyautogui
 from PIL import Image, ImageTk
 import platform
 import os
@@ -60,6 +59,35 @@ class SelectionHandlers:
         # Use the overlay selection method
         self.create_area_selector()
         
+    def detect_capture_area(self):
+        """Find the book page on the screen and use it as the capture area"""
+        from page_region import detect_screen_page
+
+        self.app.log_message("Detecting the book page on the screen...")
+        self.app.root.withdraw()
+        self.app.root.update()
+        time.sleep(0.5)  # Let the window disappear before the screenshot
+        try:
+            import pyautogui
+            found = detect_screen_page(pyautogui.screenshot(), pyautogui.size())
+        except Exception as e:
+            found = None
+            self.app.log_message(f"Page detection failed: {e}")
+        finally:
+            self.app.root.deiconify()
+
+        if found is None:
+            messagebox.showinfo("Auto-Detect Page", "No book page was found on the screen.\n"
+                                "Use 'Select Page Area' to drag a rectangle instead.")
+            return
+
+        self.app.top_left, self.app.bottom_right = found
+        self.app.area_status_label.config(text=f"Area: {self.app.top_left} to {self.app.bottom_right}", foreground="green")
+        self.app.log_message(f"Detected page area: {self.app.top_left} to {self.app.bottom_right}")
+        self.app.log_message("Use 'Test Capture' to check it.")
+        if hasattr(self.app, 'settings_manager'):
+            self.app.settings_manager.auto_save_on_selection()
+
     def create_area_selector(self):
         """Create a transparent overlay for area selection - macOS optimized"""
         # Give a small delay to ensure main window is hidden
@@ -168,6 +196,7 @@ class SelectionHandlers:
             self.app.log_message(f"Test region for pyautogui: {test_region}")
             try:
                 # Take test screenshot and save to desktop
+                import pyautogui
                 test_shot = pyautogui.screenshot(region=test_region)
                 desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
                 test_file = os.path.join(desktop_path, "test_capture_raw.png")
@@ -23,6 +23,14 @@ class SettingsManager:
             'total_pages': self.app.pages_var.get() if hasattr(self.app, 'pages_var') else "10",
             'base_location': self.app.base_location_var.get() if hasattr(self.app, 'base_location_var') and self.app.base_location_var else "",
             'base_filename': self.app.base_filename_var.get() if hasattr(self.app, 'base_filename_var') and self.app.base_filename_var else "",
+            'trim_margins': self.app.trim_margins_var.get() if hasattr(self.app, 'trim_margins_var') else False,
+            'spread': self.app.spread_var.get() if hasattr(self.app, 'spread_var') else False,
+            'watchdog': self.app.watchdog_var.get() if hasattr(self.app, 'watchdog_var') else False,
+            'learn_mask': self.app.learn_mask_var.get() if hasattr(self.app, 'learn_mask_var') else False,
+            'blank_pages': self.app.blank_pages_var.get() if hasattr(self.app, 'blank_pages_var') else "keep",
+            # Comparison mask boxes are edited in the file; keep them when saving
+            'compare_roi': getattr(self.app, 'compare_roi', None),
+            'compare_ignore': getattr(self.app, 'compare_ignore', []),
             'version': '1.0'
         }
         
@@ -66,6 +74,19 @@ class SettingsManager:
             # Restore page count
             if settings.get('total_pages'):
                 self.app.pages_var.set(settings['total_pages'])
+
+            if hasattr(self.app, 'trim_margins_var'):
+                self.app.trim_margins_var.set(bool(settings.get('trim_margins')))
+            if hasattr(self.app, 'spread_var'):
+                self.app.spread_var.set(bool(settings.get('spread')))
+            if hasattr(self.app, 'watchdog_var'):
+                self.app.watchdog_var.set(bool(settings.get('watchdog')))
+            if hasattr(self.app, 'learn_mask_var'):
+                self.app.learn_mask_var.set(bool(settings.get('learn_mask')))
+            if hasattr(self.app, 'blank_pages_var'):
+                self.app.blank_pages_var.set(settings.get('blank_pages') or "keep")
+            self.app.compare_roi = settings.get('compare_roi')
+            self.app.compare_ignore = settings.get('compare_ignore') or []
                 
             # Restore base location
             if settings.get('base_location') and hasattr(self.app, 'base_location_var') and self.app.base_location_var:
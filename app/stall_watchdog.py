@@ -0,0 +1,75 @@
+"""
+Stall Watchdog Module for Book Scanner
+Tells the end of a book apart from a reader that stopped responding. A run of
+identical frames used to end the capture; with the watchdog, the capture first
+tries to get the reader moving again (refocus, click again, keyboard page-down)
+and only calls it the end of the book when none of that changes the screen.
+"""
+import logging
+import time
+
+# Recovery actions, in the order they are tried
+RECOVERY_ACTIONS = ('refocus', 'reclick', 'page_down')
+
+
+class StallWatchdog:
+    """
+    Escalating recovery for a stalled reader, with a record of what it cost.
+
+    The engine reports every duplicate frame and every saved page; once it decides
+    the reader is stuck it calls recover(), which tries each action in turn until
+    the frame on screen changes.
+    """
+
+    def __init__(self, actions, frame_id, settle=2.0, log=None):
+        """
+        Args:
+            actions (dict): Callable per name in RECOVERY_ACTIONS; each pokes the reader
+            frame_id (callable): Returns a fingerprint of the frame on screen now
+            settle (float): Seconds to wait after an action before looking again
+            log (callable): log(message, *args, level=logging.INFO)
+        """
+        self.actions = actions
+        self.frame_id = frame_id
+        self.settle = settle
+        self.log = log or (lambda message, *args, level=logging.INFO: None)
+        self.recoveries = []
+        self.seconds_lost = 0.0
+        self.stall_started = None
+
+    def duplicate(self):
+        """A click did not change the page"""
+        if self.stall_started is None:
+            self.stall_started = time.monotonic()
+
+    def progress(self):
+        """A new page was saved"""
+        self.stall_started = None
+
+    def recover(self, page, stalled_frame):
+        """
+        Try each recovery action until the frame differs from the stalled one.
+
+        Args:
+            page (int): Page the capture is stuck on (for the log)
+            stalled_frame: Fingerprint of the frame that kept repeating
+
+        Returns:
+            str: Name of the action that worked, or None if nothing changed the
+                 screen (the reader really is at the end of the book)
+        """
+        started = self.stall_started or time.monotonic()
+        for name in RECOVERY_ACTIONS:
+            self.log(f"🔧 No page change at page {page}, trying {name.replace('_', ' ')}...")
+            self.actions[name]()
+            time.sleep(self.settle)
+            if self.frame_id() != stalled_frame:
+                lost = time.monotonic() - started
+                self.recoveries.append({'page': page, 'action': name, 'seconds': lost})
+                self.seconds_lost += lost
+                self.stall_started = None
+                self.log(f"✅ Reader recovered at page {page} by {name.replace('_', ' ')} ({lost:.1f}s lost)")
+                return name
+        self.log(f"No recovery action changed the screen at page {page}")
+        self.stall_started = None
+        return None
@@ -0,0 +1,140 @@
+"""
+UI Channel Module for Book Scanner
+Thread-safe queue that carries log, status and progress updates from worker
+threads to the Tk main loop, and keeps the output widget to a bounded size
+"""
+import queue
+import time
+import tkinter as tk
+
+
+class UIChannel:
+    """Collects UI events from any thread and applies them on the Tk thread in batches"""
+
+    def __init__(self, app_instance, frame_interval_ms=33, max_lines=2000, trim_slack=500):
+        self.app = app_instance
+        self.frame_interval_ms = frame_interval_ms
+        # The output widget keeps the last max_lines lines; older ones are trimmed
+        # in bulk once trim_slack extra lines have accumulated
+        self.max_lines = max_lines
+        self.trim_slack = trim_slack
+        self._line_count = 0
+        # SimpleQueue.put never blocks and needs no lock on the producer side
+        self._events = queue.SimpleQueue()
+        self._running = False
+
+        # Overhead counters, see stats()
+        self.events_posted = 0
+        self.redraws = 0
+        self.pump_seconds = 0.0
+        self.max_pump_seconds = 0.0
+
+    def log(self, message):
+        """Queue a line for the output widget"""
+        self.events_posted += 1
+        self._events.put(("log", message))
+
+    def set_status(self, text):
+        """Queue a status label update; only the latest one per frame is applied"""
+        self.events_posted += 1
+        self._events.put(("status", text))
+
+    def set_progress(self, value):
+        """Queue a progress bar update; only the latest one per frame is applied"""
+        self.events_posted += 1
+        self._events.put(("progress", value))
+
+    def call(self, func, *args, **kwargs):
+        """Run any other Tk call (window hide/show, dialogs, button state) on the Tk thread"""
+        self.events_posted += 1
+        self._events.put(("call", (func, args, kwargs)))
+
+    def start(self):
+        """Start the root.after pump; must be called from the Tk thread"""
+        if not self._running:
+            self._running = True
+            self.app.root.after(self.frame_interval_ms, self._pump)
+
+    def stop(self):
+        self._running = False
+
+    def _pump(self):
+        if not self._running:
+            return
+        try:
+            self.drain()
+        finally:
+            self.app.root.after(self.frame_interval_ms, self._pump)
+
+    def drain(self):
+        """
+        Apply every queued event with at most one widget update of each kind.
+
+        Returns:
+            int: Number of events applied
+        """
+        lines = []
+        status = None
+        progress = None
+        calls = []
+        count = 0
+        while True:
+            try:
+                kind, payload = self._events.get_nowait()
+            except queue.Empty:
+                break
+            count += 1
+            if kind == "log":
+                lines.append(payload)
+            elif kind == "status":
+                status = payload
+            elif kind == "progress":
+                progress = payload
+            else:
+                # Keep calls ordered relative to the log lines queued before them
+                calls.append((len(lines), payload))
+        if not count:
+            return 0
+
+        start = time.perf_counter()
+        written = 0
+        for position, (func, args, kwargs) in calls:
+            if position > written:
+                self._write_lines(lines[written:position])
+                written = position
+            func(*args, **kwargs)
+        if written < len(lines):
+            self._write_lines(lines[written:])
+        if status is not None:
+            self.app.status_label.config(text=status)
+        if progress is not None:
+            self.app.progress_var.set(progress)
+
+        elapsed = time.perf_counter() - start
+        self.redraws += 1
+        self.pump_seconds += elapsed
+        self.max_pump_seconds = max(self.max_pump_seconds, elapsed)
+        return count
+
+    def _write_lines(self, lines):
+        output_text = self.app.output_text
+        if len(lines) > self.max_lines:
+            lines = lines[-self.max_lines:]
+        text = "\n".join(lines) + "\n"
+        output_text.insert(tk.END, text)
+        self._line_count += text.count("\n")
+        if self._line_count > self.max_lines + self.trim_slack:
+            # One delete for many lines keeps the widget cheap to insert into and scroll
+            excess = self._line_count - self.max_lines
+            output_text.delete("1.0", f"{excess + 1}.0")
+            self._line_count = self.max_lines
+        output_text.see(tk.END)
+
+    def stats(self):
+        """Counters showing how much the UI updates cost"""
+        return {
+            "events": self.events_posted,
+            "redraws": self.redraws,
+            "pump_ms_total": self.pump_seconds * 1000,
+            "pump_ms_max": self.max_pump_seconds * 1000,
+        }
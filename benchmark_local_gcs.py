@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the async GCS OCR path using the local Cloud Storage stand-in.
+Measures upload, operation polling and output-shard download throughput with
+simulated network latency and bandwidth.
+
+Usage:
+    python benchmark_local_gcs.py --pages 200 --latency 0.03 --bandwidth-mbps 40
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import img2pdf
+import numpy as np
+from PIL import Image
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+import google_vision_ocr
+import local_gcs
+
+
+def create_noise_pdf(path, page_count, size=(600, 800)):
+    """Create a PDF of noisy pages so sizes resemble real screenshots"""
+    rng = np.random.default_rng(0)
+    pages = []
+    for _ in range(page_count):
+        pixels = rng.integers(200, 256, size=(size[1], size[0]), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels, 'L').save(buffer, format='PNG')
+        pages.append(buffer.getvalue())
+    with open(path, 'wb') as f:
+        f.write(img2pdf.convert(pages))
+    return path
+
+
+def report(name, seconds, amount, unit):
+    print(f"{name:<38} {seconds:8.3f}s   {amount / seconds if seconds else 0:10.1f} {unit}/s")
+
+
+def bench_upload(storage_client, pdf_path):
+    """Cold upload, then a re-upload that should be skipped by the content-hash check"""
+    size_mb = os.path.getsize(pdf_path) / (1024 * 1024)
+    bucket = storage_client.bucket("bench-bucket")
+
+    start = time.perf_counter()
+    google_vision_ocr._upload_source_blob(bucket, pdf_path)
+    report("upload (cold)", time.perf_counter() - start, size_mb, "MB")
+
+    start = time.perf_counter()
+    google_vision_ocr._upload_source_blob(bucket, pdf_path)
+    report("upload (already present)", time.perf_counter() - start, size_mb, "MB")
+
+
+def bench_polling(vision_client, storage_client, pdf_path, poll_intervals):
+    """Time lost between an operation finishing and the poll loop noticing it"""
+    bucket = storage_client.bucket("bench-bucket")
+    source = google_vision_ocr._upload_source_blob(bucket, pdf_path)
+    for poll_interval in poll_intervals:
+        request = google_vision_ocr._build_async_request(
+            f"gs://bench-bucket/{source.name}", f"gs://bench-bucket/poll-{poll_interval}/")
+        start = time.perf_counter()
+        operation = vision_client.async_batch_annotate_files(requests=[request])
+        while not operation.done():
+            time.sleep(poll_interval)
+        detected = time.perf_counter()
+        print(f"poll interval {poll_interval:>5.2f}s: operation {operation.finished_at - start:6.3f}s, "
+              f"noticed after {detected - start:6.3f}s (lag {detected - operation.finished_at:5.3f}s)")
+
+
+def bench_shard_download(storage_client, shard_count, workers):
+    """Download Vision-style output shards sequentially and in parallel"""
+    bucket = storage_client.bucket("bench-bucket")
+    prefixes = []
+    for index in range(shard_count):
+        prefix = f"download/{index:04d}/"
+        for first in range(1, 21, 2):
+            annotation = local_gcs.fake_full_text_annotation(
+                local_gcs.default_page_text("bench", first) * 20, 612, 792)
+            payload = {"responses": [{"fullTextAnnotation": annotation, "context": {"pageNumber": first}}]}
+            bucket.blob(f"{prefix}output-{first}-to-{first + 1}.json").upload_from_string(json.dumps(payload))
+        prefixes.append(prefix)
+
+    start = time.perf_counter()
+    for prefix in prefixes:
+        google_vision_ocr._read_async_output(bucket, prefix)
+    report(f"shard download x{shard_count} (sequential)", time.perf_counter() - start, shard_count, "shard")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda prefix: google_vision_ocr._read_async_output(bucket, prefix), prefixes))
+    report(f"shard download x{shard_count} ({workers} threads)", time.perf_counter() - start, shard_count, "shard")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the async GCS path against a local stand-in")
+    parser.add_argument("--pages", type=int, default=100, help="Pages in the synthetic PDF")
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated seconds per storage request")
+    parser.add_argument("--bandwidth-mbps", type=float, default=50.0, help="Simulated storage bandwidth (MB/s)")
+    parser.add_argument("--seconds-per-page", type=float, default=0.005, help="Simulated Vision time per page")
+    parser.add_argument("--shards", type=int, default=16, help="Output prefixes for the download benchmark")
+    parser.add_argument("--workers", type=int, default=8, help="Threads for parallel downloads")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        storage_client, vision_client = local_gcs.use_local_backend(
+            os.path.join(root, "gcs"), latency=args.latency,
+            bandwidth=args.bandwidth_mbps * 1024 * 1024, seconds_per_page=args.seconds_per_page)
+        try:
+            pdf_path = create_noise_pdf(os.path.join(root, "bench.pdf"), args.pages)
+            print(f"Synthetic PDF: {args.pages} pages, {os.path.getsize(pdf_path) / (1024 * 1024):.1f} MB")
+            print("-" * 72)
+            bench_upload(storage_client, pdf_path)
+            bench_polling(vision_client, storage_client, pdf_path, [0.1, 1.0, 5.0])
+            bench_shard_download(storage_client, args.shards, args.workers)
+
+            start = time.perf_counter()
+            google_vision_ocr.upload_to_gcs_and_process(pdf_path, "bench-bucket", pages_per_shard=None)
+            report("end to end (single request)", time.perf_counter() - start, args.pages, "page")
+            start = time.perf_counter()
+            google_vision_ocr.async_detect_document_sharded(pdf_path, "bench-bucket",
+                                                            pages_per_shard=max(args.pages // 8, 1))
+            report("end to end (8 shards)", time.perf_counter() - start, args.pages, "page")
+        finally:
+            google_vision_ocr.set_clients()
+
+
+if __name__ == "__main__":
+    main()
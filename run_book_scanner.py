@@ -1,35 +1,92 @@
 #!/usr/bin/env python3
 """
 Book Scanner Application Launcher
-Cross-platform launcher for the Book Scanner GUI
+Cross-platform launcher for the Book Scanner GUI.
+With arguments (e.g. 'capture --profile settings.json') it runs the command line instead.
 """
 
 import sys
 import os
+import json
+import platform
+import shutil
 import subprocess
 
 # Add the app directory to Python path
 app_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app')
 sys.path.insert(0, app_dir)
 
-def check_conda_env():
-    """Check if the book-scanner conda environment exists"""
+# Cached result of the conda environment lookup, so most launches skip running conda
+ENV_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "book-scanner", "launcher_env.json")
+CONDA_ENV_NAME = "book-scanner"
+
+def _env_python(prefix):
+    if platform.system() == 'Windows':
+        return os.path.join(prefix, "python.exe")
+    return os.path.join(prefix, "bin", "python")
+
+def find_conda_env():
+    """
+    Find the book-scanner conda environment.
+    
+    A found environment is cached and reused until conda or its envs folder changes,
+    so 'conda env list' does not run on every launch. A miss is not cached: the
+    environment may be created later in a place the cache key does not watch
+    (~/.conda/envs, an envs_dirs entry in .condarc or a --prefix path).
+    
+    Returns:
+        str: Path of the environment's Python, or None if there is no such environment
+    """
+    conda = os.environ.get("CONDA_EXE") or shutil.which("conda")
+    if not conda:
+        return None
+    envs_dir = os.path.join(os.path.dirname(os.path.dirname(conda)), "envs")
     try:
-        result = subprocess.run("conda info --envs", shell=True, capture_output=True, text=True)
-        return "book-scanner" in result.stdout
-    except Exception:
-        return False
+        key = [conda, os.path.getmtime(conda), os.path.getmtime(envs_dir) if os.path.isdir(envs_dir) else None]
+    except OSError:
+        return None
+    
+    try:
+        with open(ENV_CACHE_FILE, 'r') as f:
+            cached = json.load(f)
+        if cached["key"] == key and cached["python"] and os.path.exists(cached["python"]):
+            return cached["python"]
+    except (OSError, ValueError, KeyError):
+        pass
+    
+    try:
+        result = subprocess.run([conda, "env", "list", "--json"], capture_output=True, text=True, timeout=60)
+        env_prefixes = json.loads(result.stdout).get("envs", [])
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return None
+    python = next((_env_python(prefix) for prefix in env_prefixes
+                   if os.path.basename(prefix) == CONDA_ENV_NAME), None)
+    if not python or not os.path.exists(python):
+        return None
+    
+    try:
+        os.makedirs(os.path.dirname(ENV_CACHE_FILE), exist_ok=True)
+        with open(ENV_CACHE_FILE, 'w') as f:
+            json.dump({"key": key, "python": python}, f)
+    except OSError:
+        pass
+    return python
 
-def run_with_conda():
-    """Run the application using conda environment"""
+def run_with_conda(python):
+    """Run the application with the conda environment's Python"""
     try:
-        print("Running with conda environment: book-scanner")
-        # Use conda run to execute in the specific environment
+        print(f"Running with conda environment: {CONDA_ENV_NAME}")
+        # Put the environment's tools (e.g. poppler for pdf2image) on PATH, as 'conda activate' would
+        prefix = os.path.dirname(python) if platform.system() == 'Windows' else os.path.dirname(os.path.dirname(python))
+        bin_dirs = ([prefix, os.path.join(prefix, "Library", "bin"), os.path.join(prefix, "Scripts")]
+                    if platform.system() == 'Windows' else [os.path.join(prefix, "bin")])
+        env = dict(os.environ, PATH=os.pathsep.join(bin_dirs + [os.environ.get("PATH", "")]),
+                   CONDA_DEFAULT_ENV=CONDA_ENV_NAME, CONDA_PREFIX=prefix)
         cmd = [
-            "conda", "run", "-n", "book-scanner", "python", "-c",
-            "import sys; sys.path.insert(0, 'app'); from book_scanner_gui import main; main()"
+            python, "-c",
+            f"import sys; sys.path.insert(0, {app_dir!r}); from book_scanner_gui import main; main()"
         ]
-        subprocess.run(cmd)
+        subprocess.run(cmd, env=env)
         return True
     except Exception as e:
         print(f"Error running with conda: {e}")
@@ -58,12 +115,23 @@ def run_with_system_python():
 
 def main():
     """Main launcher function"""
+    # Command line mode: no GUI, runs in the current Python environment
+    if len(sys.argv) > 1:
+        from cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
+    
     print("Book Scanner Launcher - Starting...")
     
+    # Already running inside the environment: no need to look for it
+    if os.environ.get("CONDA_DEFAULT_ENV") == CONDA_ENV_NAME:
+        run_with_system_python()
+        return
+    
     # First try conda if available
-    if check_conda_env():
-        print("Found conda environment: book-scanner")
-        if run_with_conda():
+    conda_python = find_conda_env()
+    if conda_python:
+        print(f"Found conda environment: {CONDA_ENV_NAME}")
+        if run_with_conda(conda_python):
             return
         else:
             print("Conda run failed, falling back to system Python...")
@@ -4,10 +4,10 @@ echo "Book Scanner - Starting Application..."
 # Check if conda environment exists
 if conda info --envs | grep -q book-scanner; then
     echo "Using conda environment: book-scanner"
-    conda run -n book-scanner python3 run_book_scanner.py
+    conda run -n book-scanner python3 run_book_scanner.py "$@"
 else
     echo "Conda environment 'book-scanner' not found, using system Python..."
-    python3 run_book_scanner.py
+    python3 run_book_scanner.py "$@"
 fi
 
 if [ $? -ne 0 ]; then
@@ -2,14 +2,20 @@ import os
 import io
 import json
 import re
-import numpy as np
+import tempfile
+import uuid
+import base64
+import hashlib
+import datetime
+import importlib
+import threading
 from PIL import Image
-import cv2
-from google.cloud import vision
-from google.cloud import storage
-from pdf2image import convert_from_path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+# google.cloud.vision, google.cloud.storage, cv2, NumPy and pdf2image take most of
+# this module's import time, so they are imported inside the functions that use
+# them. warm_up() loads them ahead of time in a background thread.
+
 # Set the environment variable for Google Vision API credentials
 # Option 1: Set the environment variable directly (recommended)
 # os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = r'/path/to/your/credentials.json'
@@ -20,6 +26,104 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # The credentials will be automatically detected if the environment variable is set 
 
+# Pages per shard when a large PDF is split for async annotation
+DEFAULT_SHARD_PAGES = 100
+
+# Upper bound on AsyncAnnotateFileRequests submitted in one async_batch_annotate_files call
+MAX_ASYNC_REQUESTS_PER_CALL = 100
+
+# Seconds to wait for an async annotation operation to finish
+ASYNC_TIMEOUT = 420
+
+# Page budget for one async_batch_annotate_files call when batching many books
+MAX_PAGES_PER_ASYNC_CALL = 2000
+
+# Source PDFs at least this large are uploaded in parallel chunks
+LARGE_UPLOAD_THRESHOLD = 32 * 1024 * 1024
+
+# Chunk size for large uploads (GCS requires a multiple of 256 KB)
+DEFAULT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Days uploaded source PDFs are kept so re-processing them needs no upload
+SOURCE_RETENTION_DAYS = 7
+
+# Pages the synchronous file-annotation API accepts per inline PDF request
+INLINE_MAX_PAGES = 5
+
+# Largest inline PDF chunk sent in one synchronous request
+INLINE_MAX_BYTES = 10 * 1024 * 1024
+
+# Starting cost estimates for choose_ocr_method, refined by measured runs:
+# (fixed seconds per run, seconds per unit, units processed in parallel)
+# Units are 5-page requests for 'inline' and pages for 'image' and 'gcs'.
+OCR_METHOD_COSTS = {
+    "inline": [0.5, 1.5, 8],
+    "image": [1.0, 1.5, 4],
+    "gcs": [15.0, 0.1, 1],
+}
+
+# Clients installed with set_clients(), used instead of creating new ones
+_client_overrides = {}
+
+def set_clients(storage_client=None, vision_client=None):
+    """
+    Makes every OCR function use the given clients, e.g. the local stand-ins from
+    local_gcs.py. Passing None restores the default for that client.
+    """
+    _client_overrides["storage"] = storage_client
+    _client_overrides["vision"] = vision_client
+
+def warm_up():
+    """
+    Imports the OCR and cloud libraries so the first OCR call does not pay for them.
+    Safe to call from a background thread.
+    """
+    for module_name in ("google.cloud.vision", "google.cloud.storage", "numpy", "cv2", "pdf2image"):
+        try:
+            importlib.import_module(module_name)
+        except ImportError:
+            pass  # Reported by the OCR call that needs it
+
+def start_warm_up():
+    """Runs warm_up() in a daemon thread and returns the thread"""
+    thread = threading.Thread(target=warm_up, name="ocr-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def _local_gcs():
+    """Imports local_gcs whether this module was loaded from src/ or as src.google_vision_ocr"""
+    try:
+        import local_gcs
+    except ImportError:
+        from . import local_gcs
+    return local_gcs
+
+def get_storage_client():
+    """
+    Returns a Cloud Storage client. When BOOK_SCANNER_LOCAL_GCS names a directory,
+    a local stand-in backed by that directory is returned instead (see local_gcs.py).
+    """
+    if _client_overrides.get("storage") is not None:
+        return _client_overrides["storage"]
+    local_root = os.environ.get("BOOK_SCANNER_LOCAL_GCS")
+    if local_root:
+        return _local_gcs().LocalStorageClient(local_root)
+    from google.cloud import storage
+    return storage.Client()
+
+def get_vision_client():
+    """
+    Returns a Vision API client, or the local fake when BOOK_SCANNER_LOCAL_GCS is set.
+    """
+    if _client_overrides.get("vision") is not None:
+        return _client_overrides["vision"]
+    local_root = os.environ.get("BOOK_SCANNER_LOCAL_GCS")
+    if local_root:
+        local_gcs = _local_gcs()
+        return local_gcs.LocalVisionClient(local_gcs.LocalStorageClient(local_root))
+    from google.cloud import vision
+    return vision.ImageAnnotatorClient()
+
 def detect_text_from_image(image_data):
     """
     Detects text in an image file using Google Vision API and returns it.
@@ -30,7 +134,9 @@ def detect_text_from_image(image_data):
     Returns:
         str: The detected text.
     """
-    client = vision.ImageAnnotatorClient()
+    from google.cloud import vision
+
+    client = get_vision_client()
     image = vision.Image(content=image_data)
 
     # Perform text detection
@@ -43,6 +149,25 @@ def detect_text_from_image(image_data):
     else:
         return ""
 
+def detect_document_layout(image_data):
+    """
+    Detects dense document text in an image and returns it with its layout.
+    
+    Args:
+        image_data (bytes): The image data in bytes format.
+        
+    Returns:
+        dict: The fullTextAnnotation in Vision JSON form ('text' and 'pages' with
+              blocks, paragraphs, words and their bounding boxes); empty if no text
+    """
+    from google.cloud import vision
+
+    client = get_vision_client()
+    response = client.document_text_detection(image=vision.Image(content=image_data))
+    if response.error.message:
+        raise RuntimeError(f"Vision API error: {response.error.message}")
+    return json.loads(vision.AnnotateImageResponse.to_json(response)).get("fullTextAnnotation") or {}
+
 def async_detect_document(gcs_source_uri, gcs_destination_uri, debug_annotations=False, debug_output_dir=None):
     """
     OCR with PDF/TIFF as source files on GCS using async document text detection.
@@ -57,36 +182,18 @@ def async_detect_document(gcs_source_uri, gcs_destination_uri, debug_annotations
     Returns:
         str or tuple: The full text extracted from the document, or (text, annotations) if debug_annotations=True
     """
-    # Supported mime_types are: 'application/pdf' and 'image/tiff'
-    mime_type = "application/pdf"
-
-    # How many pages should be grouped into each json output file.
-    batch_size = 2
-
-    client = vision.ImageAnnotatorClient()
-
-    feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
-
-    gcs_source = vision.GcsSource(uri=gcs_source_uri)
-    input_config = vision.InputConfig(gcs_source=gcs_source, mime_type=mime_type)
-
-    gcs_destination = vision.GcsDestination(uri=gcs_destination_uri)
-    output_config = vision.OutputConfig(
-        gcs_destination=gcs_destination, batch_size=batch_size
-    )
+    client = get_vision_client()
 
-    async_request = vision.AsyncAnnotateFileRequest(
-        features=[feature], input_config=input_config, output_config=output_config
-    )
+    async_request = _build_async_request(gcs_source_uri, gcs_destination_uri)
 
     operation = client.async_batch_annotate_files(requests=[async_request])
 
     print("Waiting for the operation to finish.")
-    operation.result(timeout=420)
+    operation.result(timeout=ASYNC_TIMEOUT)
 
     # Once the request has completed and the output has been
     # written to GCS, we can list all the output files.
-    storage_client = storage.Client()
+    storage_client = get_storage_client()
 
     match = re.match(r"gs://([^/]+)/(.+)", gcs_destination_uri)
     bucket_name = match.group(1)
@@ -95,11 +202,11 @@ def async_detect_document(gcs_source_uri, gcs_destination_uri, debug_annotations
     bucket = storage_client.get_bucket(bucket_name)
 
     # List objects with the given prefix, filtering out folders.
-    blob_list = [
-        blob
-        for blob in list(bucket.list_blobs(prefix=prefix))
-        if not blob.name.endswith("/")
-    ]
+    # Sort by first page so output-10-to-11.json comes after output-2-to-3.json
+    blob_list = sorted(
+        (blob for blob in bucket.list_blobs(prefix=prefix) if not blob.name.endswith("/")),
+        key=lambda blob: _output_first_page(blob.name),
+    )
     print("Output files:")
     for blob in blob_list:
         print(blob.name)
@@ -135,48 +242,736 @@ def async_detect_document(gcs_source_uri, gcs_destination_uri, debug_annotations
         return full_text, annotations_data
     return full_text
 
-def upload_to_gcs_and_process(local_pdf_path, bucket_name, source_blob_name=None, destination_prefix=None, output_folder=None):
+def _build_async_request(gcs_source_uri, gcs_destination_uri, batch_size=2):
+    """
+    Builds an AsyncAnnotateFileRequest for document text detection of a PDF on GCS.
+    
+    Args:
+        gcs_source_uri (str): GCS URI of the source PDF
+        gcs_destination_uri (str): GCS URI prefix for the JSON output files
+        batch_size (int): How many pages should be grouped into each json output file
+        
+    Returns:
+        vision.AsyncAnnotateFileRequest: The request, ready for async_batch_annotate_files
+    """
+    from google.cloud import vision
+
+    # Supported mime_types are: 'application/pdf' and 'image/tiff'
+    mime_type = "application/pdf"
+
+    feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
+
+    gcs_source = vision.GcsSource(uri=gcs_source_uri)
+    input_config = vision.InputConfig(gcs_source=gcs_source, mime_type=mime_type)
+
+    gcs_destination = vision.GcsDestination(uri=gcs_destination_uri)
+    output_config = vision.OutputConfig(
+        gcs_destination=gcs_destination, batch_size=batch_size
+    )
+
+    return vision.AsyncAnnotateFileRequest(
+        features=[feature], input_config=input_config, output_config=output_config
+    )
+
+def _parse_gcs_uri(gcs_uri):
+    """Splits 'gs://bucket/prefix' into (bucket, prefix)"""
+    match = re.match(r"gs://([^/]+)/(.*)", gcs_uri)
+    if not match:
+        raise ValueError(f"Not a GCS URI: {gcs_uri}")
+    return match.group(1), match.group(2)
+
+def _output_first_page(blob_name):
+    """Returns the first page number encoded in an 'output-N-to-M.json' name (0 if absent)"""
+    match = re.search(r"output-(\d+)-to-\d+\.json$", blob_name)
+    return int(match.group(1)) if match else 0
+
+def _read_async_output(bucket, prefix):
+    """
+    Downloads the JSON output files written by an async annotation under a prefix.
+    
+    Args:
+        bucket (storage.Bucket): Bucket holding the output files
+        prefix (str): Object prefix the operation wrote to
+        
+    Returns:
+        list: (page_number, annotation) tuples sorted by page number. Pages without
+              text are returned with an empty annotation so numbering stays intact.
+    """
+    pages = []
+    for blob in bucket.list_blobs(prefix=prefix):
+        if blob.name.endswith("/"):
+            continue
+        response = json.loads(blob.download_as_bytes().decode("utf-8"))
+        first_page = _output_first_page(blob.name)
+        for offset, page_response in enumerate(response.get("responses", [])):
+            page_number = page_response.get("context", {}).get("pageNumber", first_page + offset)
+            pages.append((page_number, page_response.get("fullTextAnnotation", {})))
+    pages.sort(key=lambda item: item[0])
+    return pages
+
+def _annotations_to_text(annotations):
+    """Joins fullTextAnnotation texts the same way async_detect_document does"""
+    return "".join(annotation["text"] + "\n" for annotation in annotations)
+
+def count_pdf_pages(pdf_path):
+    """
+    Counts the pages of a local PDF without rendering it.
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        
+    Returns:
+        int: Number of pages
+    """
+    import pikepdf
+    with pikepdf.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+def split_pdf(pdf_path, pages_per_shard, output_dir):
+    """
+    Splits a PDF into consecutive page-range shards.
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        pages_per_shard (int): Maximum number of pages in each shard
+        output_dir (str): Directory where the shard PDFs are written
+        
+    Returns:
+        list: (shard_path, first_page, last_page) tuples with 1-based page numbers
+    """
+    import pikepdf
+    shards = []
+    base_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    with pikepdf.open(pdf_path) as pdf:
+        total_pages = len(pdf.pages)
+        for start in range(0, total_pages, pages_per_shard):
+            end = min(start + pages_per_shard, total_pages)
+            shard = pikepdf.new()
+            shard.pages.extend(pdf.pages[start:end])
+            shard_path = os.path.join(output_dir, f"{base_name}-{start + 1:05d}-{end:05d}.pdf")
+            shard.save(shard_path, deterministic_id=True)
+            shards.append((shard_path, start + 1, end))
+    return shards
+
+def async_detect_document_sharded(local_pdf_path, bucket_name, pages_per_shard=DEFAULT_SHARD_PAGES,
+                                  source_prefix="ocr_source/", destination_prefix="ocr_output/",
+                                  max_workers=8, debug_annotations=False):
+    """
+    OCR a large local PDF by splitting it into page-range shards that the Vision API
+    processes in parallel. All shards are uploaded concurrently and submitted together
+    in one async_batch_annotate_files call, and the results are merged in page order.
+    The run's JSON output is deleted once it is read, or when the run fails. Shard
+    uploads are kept either way, so a retry reuses them; prune_source_blobs() expires them.
+    
+    Args:
+        local_pdf_path (str): Path to the local PDF file
+        bucket_name (str): Name of the GCS bucket used for shards and output
+        pages_per_shard (int): Maximum number of pages per shard
+        source_prefix (str): Prefix for the uploaded shard PDFs
+        destination_prefix (str): Prefix for the JSON output files
+        max_workers (int): Number of concurrent shard uploads
+        debug_annotations (bool): If True, returns both text and annotation data
+        
+    Returns:
+        str or tuple: The full text, or (text, annotations) if debug_annotations=True
+    """
+    total_pages = count_pdf_pages(local_pdf_path)
+    # Keep the number of requests within a single call's limit
+    pages_per_shard = max(pages_per_shard, -(-total_pages // MAX_ASYNC_REQUESTS_PER_CALL))
+
+    # Unique run id so listing the output never picks up results from earlier runs
+    run_id = uuid.uuid4().hex[:12]
+
+    storage_client = get_storage_client()
+    bucket = storage_client.bucket(bucket_name)
+
+    try:
+        with tempfile.TemporaryDirectory() as shard_dir:
+            shards = split_pdf(local_pdf_path, pages_per_shard, shard_dir)
+            print(f"Split {total_pages} pages into {len(shards)} shards of up to {pages_per_shard} pages")
+
+            # Shards are byte-identical across runs, so retried shards are not uploaded again
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                source_blobs = list(executor.map(
+                    lambda shard: _upload_source_blob(bucket, shard[0], source_prefix=source_prefix), shards))
+
+        output_prefixes = [f"{destination_prefix}{run_id}/shard-{index:04d}/" for index in range(len(shards))]
+        requests = [
+            _build_async_request(f"gs://{bucket_name}/{blob.name}", f"gs://{bucket_name}/{output_prefix}")
+            for blob, output_prefix in zip(source_blobs, output_prefixes)
+        ]
+
+        client = get_vision_client()
+        operation = client.async_batch_annotate_files(requests=requests)
+
+        print(f"Waiting for {len(requests)} shard requests to finish.")
+        operation.result(timeout=ASYNC_TIMEOUT)
+
+        # Download every shard's output concurrently, then renumber pages to book order
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            shard_pages = list(executor.map(lambda prefix: _read_async_output(bucket, prefix), output_prefixes))
+    finally:
+        # The run's output is read, or useless after a failure. Shard sources are shared by
+        # content hash with retries and other runs, so only prune_source_blobs() removes them
+        _delete_blobs(bucket, bucket.list_blobs(prefix=f"{destination_prefix}{run_id}/"))
+
+    annotations_data = [annotation for pages in shard_pages for _, annotation in pages if annotation]
+    full_text = _annotations_to_text(annotations_data)
+
+    if debug_annotations:
+        return full_text, annotations_data
+    return full_text
+
+def _delete_blobs(bucket, blobs):
+    """
+    Deletes objects, logging (not raising) the ones that cannot be deleted.
+    
+    Args:
+        bucket (storage.Bucket): Bucket holding the objects
+        blobs (list): storage.Blob objects to delete
+    """
+    for blob in blobs:
+        try:
+            blob.delete()
+        except Exception as e:
+            print(f"Could not delete gs://{bucket.name}/{blob.name}: {e}")
+
+def _pack_shards_into_calls(shards, max_pages_per_call, max_requests_per_call=MAX_ASYNC_REQUESTS_PER_CALL):
+    """
+    Groups shards into async_batch_annotate_files calls bounded by page count.
+    
+    Args:
+        shards (list): Shard dicts with a 'pages' entry, in submission order
+        max_pages_per_call (int): Page budget per call
+        max_requests_per_call (int): Request budget per call
+        
+    Returns:
+        list: Lists of shards, one list per call
+    """
+    calls = []
+    current = []
+    current_pages = 0
+    for shard in shards:
+        if current and (current_pages + shard["pages"] > max_pages_per_call
+                        or len(current) >= max_requests_per_call):
+            calls.append(current)
+            current = []
+            current_pages = 0
+        current.append(shard)
+        current_pages += shard["pages"]
+    if current:
+        calls.append(current)
+    return calls
+
+def async_batch_process_pdfs(pdf_paths, bucket_name, output_folder, pages_per_shard=DEFAULT_SHARD_PAGES,
+                             max_pages_per_call=MAX_PAGES_PER_ASYNC_CALL, source_prefix="ocr_source/",
+                             destination_prefix="ocr_output/", max_workers=8, poll_interval=5,
+                             timeout=None):
+    """
+    OCR many PDFs through the async GCS path at once. Books are split into shards,
+    uploaded concurrently and packed into async_batch_annotate_files calls by page
+    count (smallest books first), so a huge book never holds back the small ones.
+    All operations are tracked together and each book's text file is written as soon
+    as all of its shards are done. A book that cannot be read, split or uploaded fails
+    on its own while the other books go ahead. The run's JSON output is deleted at the end.
+    
+    Args:
+        pdf_paths (list): Paths of the local PDF files
+        bucket_name (str): Name of the GCS bucket used for sources and output
+        output_folder (str): Folder where '<name>.pdf.txt' files are written
+        pages_per_shard (int, optional): Maximum number of pages per shard; None sends
+            each book whole
+        max_pages_per_call (int): Page budget for each async call
+        source_prefix (str): Prefix for the uploaded shard PDFs
+        destination_prefix (str): Prefix for the JSON output files
+        max_workers (int): Number of concurrent uploads and downloads
+        poll_interval (float): Seconds between operation status checks
+        timeout (float, optional): Give up on operations still running after this many seconds
+        
+    Returns:
+        dict: Maps each PDF path to its output text file, or None if it failed
+    """
+    import time
+
+    os.makedirs(output_folder, exist_ok=True)
+    run_id = uuid.uuid4().hex[:12]
+
+    storage_client = get_storage_client()
+    bucket = storage_client.bucket(bucket_name)
+    client = get_vision_client()
+
+    results = {}
+    books = []
+    for pdf_path in pdf_paths:
+        try:
+            pages = count_pdf_pages(pdf_path)
+        except Exception as e:
+            print(f"Skipping {pdf_path}: {e}")
+            results[pdf_path] = None
+            continue
+        books.append({"path": pdf_path, "pages": pages, "shards": []})
+    books.sort(key=lambda book: book["pages"])
+    total_pages = sum(book["pages"] for book in books)
+    print(f"Batching {len(books)} PDFs ({total_pages} pages) for async OCR")
+
+    start_time = time.time()
+    try:
+        with tempfile.TemporaryDirectory() as shard_dir, ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Split books and start all uploads, smallest book first
+            shards = []
+            for book_index, book in enumerate(books):
+                try:
+                    if pages_per_shard and book["pages"] > pages_per_shard:
+                        book_dir = os.path.join(shard_dir, str(book_index))
+                        os.makedirs(book_dir)
+                        pieces = split_pdf(book["path"], pages_per_shard, book_dir)
+                    else:
+                        pieces = [(book["path"], 1, book["pages"])]
+                except Exception as e:
+                    print(f"Skipping {book['path']}: {e}")
+                    results[book["path"]] = None
+                    continue
+                for shard_index, (shard_path, first_page, last_page) in enumerate(pieces):
+                    shard = {
+                        "book": book,
+                        "pages": last_page - first_page + 1,
+                        "output_prefix": f"{destination_prefix}{run_id}/{book_index:04d}-{shard_index:04d}/",
+                        "upload": executor.submit(_upload_source_blob, bucket, shard_path,
+                                                  source_prefix=source_prefix),
+                        "done": False,
+                    }
+                    book["shards"].append(shard)
+                    shards.append(shard)
+
+            # Submit each call as soon as its own uploads are finished
+            operations = []
+            for call_shards in _pack_shards_into_calls(shards, max_pages_per_call):
+                for shard in call_shards:
+                    try:
+                        shard["blob"] = shard["upload"].result()
+                    except Exception as e:
+                        print(f"Upload failed for {shard['book']['path']}: {e}")
+                        results[shard["book"]["path"]] = None
+                # A book with a failed upload is left out of every call
+                call_shards = [shard for shard in call_shards if shard["book"]["path"] not in results]
+                if not call_shards:
+                    continue
+                requests = [
+                    _build_async_request(f"gs://{bucket_name}/{shard['blob'].name}",
+                                         f"gs://{bucket_name}/{shard['output_prefix']}")
+                    for shard in call_shards
+                ]
+                operations.append((client.async_batch_annotate_files(requests=requests), call_shards))
+                print(f"Submitted call {len(operations)}: {len(requests)} requests, "
+                      f"{sum(shard['pages'] for shard in call_shards)} pages")
+
+            def finish_book(book):
+                pages = [page for shard in book["shards"]
+                         for page in _read_async_output(bucket, shard["output_prefix"])]
+                text = _annotations_to_text([annotation for _, annotation in pages if annotation])
+                output_file = os.path.join(output_folder, f"{os.path.basename(book['path'])}.txt")
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                return output_file
+
+            # Track all operations together, writing each book as soon as it is complete
+            pending = list(operations)
+            writes = {}
+            while pending:
+                for entry in list(pending):
+                    operation, call_shards = entry
+                    if not operation.done():
+                        continue
+                    pending.remove(entry)
+                    try:
+                        operation.result()
+                        failed = False
+                    except Exception as e:
+                        print(f"Async call failed: {e}")
+                        failed = True
+                    for shard in call_shards:
+                        shard["done"] = True
+                        shard["failed"] = failed
+                        book = shard["book"]
+                        if book["path"] in results or book["path"] in writes:
+                            continue
+                        if any(s.get("failed") for s in book["shards"]):
+                            results[book["path"]] = None
+                        elif all(s["done"] for s in book["shards"]):
+                            writes[book["path"]] = executor.submit(finish_book, book)
+                if pending:
+                    if timeout is not None and time.time() - start_time > timeout:
+                        print(f"Timed out with {len(pending)} async calls still running")
+                        break
+                    time.sleep(poll_interval)
+
+            for pdf_path, future in writes.items():
+                try:
+                    results[pdf_path] = future.result()
+                    print(f"Wrote {results[pdf_path]}")
+                except Exception as e:
+                    print(f"Failed to collect OCR output for {pdf_path}: {e}")
+                    results[pdf_path] = None
+    finally:
+        # Written books have been read and the rest failed or were given up on
+        _delete_blobs(bucket, bucket.list_blobs(prefix=f"{destination_prefix}{run_id}/"))
+
+    for book in books:
+        results.setdefault(book["path"], None)
+    prune_source_blobs(bucket_name, source_prefix=source_prefix)
+    elapsed = time.time() - start_time
+    print(f"Async batch finished in {elapsed:.1f}s ({total_pages / elapsed if elapsed else 0:.1f} pages/sec)")
+    return results
+
+def _file_checksums(path):
+    """
+    Computes the checksums GCS reports for an object, reading the file once.
+    
+    Args:
+        path (str): Path to the local file
+        
+    Returns:
+        tuple: (md5_hex, md5_base64, crc32c_base64). crc32c_base64 is None when
+               google-crc32c is not installed.
+    """
+    md5 = hashlib.md5()
+    try:
+        import google_crc32c
+        crc32c = google_crc32c.Checksum()
+    except ImportError:
+        crc32c = None
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            md5.update(chunk)
+            if crc32c is not None:
+                crc32c.update(chunk)
+    md5_b64 = base64.b64encode(md5.digest()).decode("ascii")
+    crc32c_b64 = base64.b64encode(crc32c.digest()).decode("ascii") if crc32c is not None else None
+    return md5.hexdigest(), md5_b64, crc32c_b64
+
+def _upload_source_blob(bucket, local_path, blob_name=None, source_prefix="ocr_source/",
+                        chunk_size=DEFAULT_UPLOAD_CHUNK_SIZE, max_workers=8):
+    """
+    Uploads a local file under a content-hash name unless an identical object already exists.
+    
+    Args:
+        bucket (storage.Bucket): Destination bucket
+        local_path (str): Path to the local file
+        blob_name (str, optional): Object name. If None, uses '<source_prefix><md5>.pdf'.
+        source_prefix (str): Prefix for content-hash names
+        chunk_size (int): Chunk size for large uploads, a multiple of 256 KB
+        max_workers (int): Parallel chunk uploads for large files
+        
+    Returns:
+        storage.Blob: The uploaded (or already present) object
+    """
+    md5_hex, md5_b64, crc32c_b64 = _file_checksums(local_path)
+    if blob_name is None:
+        blob_name = f"{source_prefix}{md5_hex}.pdf"
+
+    # Composite and multipart objects have no MD5, so accept a CRC32C match as well
+    existing = bucket.get_blob(blob_name)
+    if existing is not None and (existing.md5_hash == md5_b64 or
+                                 (crc32c_b64 is not None and existing.crc32c == crc32c_b64)):
+        print(f"Already uploaded: gs://{bucket.name}/{blob_name}")
+        _touch_blob(existing)
+        return existing
+
+    blob = bucket.blob(blob_name)
+    print(f"Uploading {local_path} to gs://{bucket.name}/{blob_name}")
+    if os.path.getsize(local_path) >= LARGE_UPLOAD_THRESHOLD:
+        from google.cloud import storage
+        try:
+            from google.cloud.storage import transfer_manager
+        except ImportError:
+            transfer_manager = None
+        if transfer_manager is not None and isinstance(blob, storage.Blob):
+            transfer_manager.upload_chunks_concurrently(
+                local_path, blob, content_type="application/pdf", chunk_size=chunk_size,
+                worker_type=transfer_manager.THREAD, max_workers=max_workers)
+        else:
+            # Older google-cloud-storage or a local stand-in: chunked resumable upload
+            blob.chunk_size = chunk_size
+            blob.upload_from_filename(local_path, content_type="application/pdf")
+    else:
+        blob.upload_from_filename(local_path, content_type="application/pdf")
+    return blob
+
+def _touch_blob(blob):
+    """
+    Restarts a reused source's retention window by setting its custom time to now.
+    prune_source_blobs() measures age from it, so a source reused by a run is never
+    pruned at the end of that run.
+    
+    Args:
+        blob (storage.Blob): The reused object
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    # GCS only lets custom time move forward, which is all this needs
+    if blob.custom_time is None or blob.custom_time < now:
+        blob.custom_time = now
+        blob.patch()
+
+def upload_pdf_to_gcs(local_pdf_path, bucket_name, source_blob_name=None, source_prefix="ocr_source/",
+                      chunk_size=DEFAULT_UPLOAD_CHUNK_SIZE, max_workers=8):
+    """
+    Uploads a local PDF to GCS under its content hash, skipping the upload when an
+    object with a matching MD5/CRC32C is already there. Large files are uploaded
+    in parallel chunks.
+    
+    Args:
+        local_pdf_path (str): Path to the local PDF file
+        bucket_name (str): Name of the GCS bucket
+        source_blob_name (str, optional): Object name. If None, uses '<source_prefix><md5>.pdf'.
+        source_prefix (str): Prefix for content-hash names
+        chunk_size (int): Chunk size for large uploads, a multiple of 256 KB
+        max_workers (int): Parallel chunk uploads for large files
+        
+    Returns:
+        str: GCS URI of the source object
+    """
+    storage_client = get_storage_client()
+    bucket = storage_client.bucket(bucket_name)
+    blob = _upload_source_blob(bucket, local_pdf_path, blob_name=source_blob_name,
+                               source_prefix=source_prefix, chunk_size=chunk_size, max_workers=max_workers)
+    return f"gs://{bucket_name}/{blob.name}"
+
+def prune_source_blobs(bucket_name, source_prefix="ocr_source/", retention_days=SOURCE_RETENTION_DAYS):
+    """
+    Deletes uploaded source PDFs not used within the retention window. Age is measured
+    from the last upload or reuse (the object's custom time, see _touch_blob). A bucket
+    lifecycle rule on the same prefix with daysSinceCustomTime does the same job server-side.
+    
+    Args:
+        bucket_name (str): Name of the GCS bucket
+        source_prefix (str): Prefix the source PDFs were uploaded under
+        retention_days (float): Age in days after which sources are deleted
+        
+    Returns:
+        int: Number of deleted objects
+    """
+    storage_client = get_storage_client()
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=retention_days)
+    deleted = 0
+    for blob in storage_client.bucket(bucket_name).list_blobs(prefix=source_prefix):
+        last_used = blob.custom_time or blob.updated
+        if last_used is not None and last_used < cutoff:
+            blob.delete()
+            deleted += 1
+    if deleted:
+        print(f"Pruned {deleted} source files older than {retention_days} days")
+    return deleted
+
+def upload_to_gcs_and_process(local_pdf_path, bucket_name, source_blob_name=None, destination_prefix=None, output_folder=None,
+                              pages_per_shard=DEFAULT_SHARD_PAGES, retention_days=SOURCE_RETENTION_DAYS):
     """
     Uploads a local PDF to GCS and processes it using async document text detection.
+    PDFs longer than pages_per_shard are split and processed as parallel shards.
+    The source is stored under its content hash and kept for retention_days, so
+    re-processing the same PDF skips the upload.
     
     Args:
         local_pdf_path (str): Path to the local PDF file
         bucket_name (str): Name of the GCS bucket
         source_blob_name (str, optional): Name for the uploaded file in GCS. 
-                                         If None, uses the original filename.
+                                         If None, uses 'ocr_source/<md5>.pdf'. Ignored when
+                                         the PDF is sharded: each shard is stored under its
+                                         own content hash.
         destination_prefix (str, optional): Prefix for output files in GCS.
                                            If None, uses 'ocr_output/'.
         output_folder (str, optional): Folder to save debug files. If None, uses directory of PDF file.
+        pages_per_shard (int, optional): Shard size for large PDFs. None or 0 disables sharding.
+        retention_days (float): Days to keep uploaded sources before they are pruned
     
     Returns:
         str: The extracted text from the PDF
     """
-    if source_blob_name is None:
-        source_blob_name = os.path.basename(local_pdf_path)
-    
     if destination_prefix is None:
         destination_prefix = "ocr_output/"
     
-    # Upload file to GCS
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(source_blob_name)
+    if pages_per_shard and count_pdf_pages(local_pdf_path) > pages_per_shard:
+        if source_blob_name:
+            print(f"Sharding {local_pdf_path}: source_blob_name is ignored, shards are named by content hash")
+        extracted_text = async_detect_document_sharded(local_pdf_path, bucket_name, pages_per_shard=pages_per_shard,
+                                                       destination_prefix=destination_prefix)
+    else:
+        # Upload file to GCS (skipped if the same content is already there)
+        gcs_source_uri = upload_pdf_to_gcs(local_pdf_path, bucket_name, source_blob_name=source_blob_name)
+        
+        # Write to a fresh output prefix so results of earlier runs are not listed
+        gcs_destination_uri = f"gs://{bucket_name}/{destination_prefix}{uuid.uuid4().hex[:12]}/"
+        
+        # Process with async document detection
+        extracted_text = async_detect_document(gcs_source_uri, gcs_destination_uri)
     
-    print(f"Uploading {local_pdf_path} to gs://{bucket_name}/{source_blob_name}")
-    blob.upload_from_filename(local_pdf_path)
+    # Sources are kept for the retention window instead of being deleted right away
+    prune_source_blobs(bucket_name, retention_days=retention_days)
     
-    # Construct URIs
-    gcs_source_uri = f"gs://{bucket_name}/{source_blob_name}"
-    gcs_destination_uri = f"gs://{bucket_name}/{destination_prefix}"
+    return extracted_text
+
+def _iter_pdf_chunks(pdf_path, pages_per_chunk):
+    """
+    Splits a PDF into in-memory chunks of consecutive pages.
     
-    # Process with async document detection
-    extracted_text = async_detect_document(gcs_source_uri, gcs_destination_uri)
+    Args:
+        pdf_path (str): Path to the PDF file
+        pages_per_chunk (int): Maximum number of pages in each chunk
+        
+    Yields:
+        tuple: (pdf_bytes, first_page, page_count) with a 1-based first page number
+    """
+    import pikepdf
+    with pikepdf.open(pdf_path) as pdf:
+        for start in range(0, len(pdf.pages), pages_per_chunk):
+            chunk = pikepdf.new()
+            chunk.pages.extend(pdf.pages[start:start + pages_per_chunk])
+            buffer = io.BytesIO()
+            chunk.save(buffer)
+            yield buffer.getvalue(), start + 1, len(chunk.pages)
+
+def _detect_document_chunk(client, pdf_bytes, first_page, page_count):
+    """
+    OCR up to INLINE_MAX_PAGES pages of inline PDF content with the synchronous API.
     
-    # Clean up: delete the uploaded source file (optional)
-    print(f"Cleaning up: deleting gs://{bucket_name}/{source_blob_name}")
-    blob.delete()
+    Args:
+        client (vision.ImageAnnotatorClient): Shared client
+        pdf_bytes (bytes): PDF content with at most INLINE_MAX_PAGES pages
+        first_page (int): Book page number of the chunk's first page
+        page_count (int): Number of pages in the chunk; the API rejects pages past the end
+        
+    Returns:
+        list: (page_number, text) tuples
+
+    Raises:
+        RuntimeError: The file or one of its pages was rejected, or pages are missing
+    """
+    from google.cloud import vision
+
+    feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
+    input_config = vision.InputConfig(content=pdf_bytes, mime_type="application/pdf")
+    request = vision.AnnotateFileRequest(
+        features=[feature], input_config=input_config, pages=list(range(1, page_count + 1))
+    )
+    response = client.batch_annotate_files(requests=[request])
+
+    file_response = response.responses[0]
+    last_page = first_page + page_count - 1
+    # A rejected file (unreadable or too large) has a file-level error and no pages
+    if file_response.error.message:
+        raise RuntimeError(f"Pages {first_page}-{last_page}: {file_response.error.message}")
+    if len(file_response.responses) != page_count:
+        raise RuntimeError(f"Pages {first_page}-{last_page}: got {len(file_response.responses)} "
+                           f"page responses for {page_count} pages")
+    results = []
+    for offset, page_response in enumerate(file_response.responses):
+        if page_response.error.message:
+            raise RuntimeError(f"Page {first_page + offset}: {page_response.error.message}")
+        results.append((first_page + offset, page_response.full_text_annotation.text))
+    return results
+
+def detect_document_inline(pdf_path, max_workers=8):
+    """
+    OCR a PDF without Cloud Storage, sending 5-page chunks of inline PDF content to
+    the synchronous file-annotation API in parallel. Avoids the upload, operation
+    polling and output download of the async path, which dominate for short PDFs.
     
-    return extracted_text
+    Args:
+        pdf_path (str): Path to the PDF file
+        max_workers (int): Number of chunks processed in parallel
+        
+    Returns:
+        str: The full text, one block per page in page order
+    """
+    client = get_vision_client()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_detect_document_chunk, client, pdf_bytes, first_page, page_count)
+                   for pdf_bytes, first_page, page_count in _iter_pdf_chunks(pdf_path, INLINE_MAX_PAGES)]
+        pages = sorted(page for future in futures for page in future.result())
+    return "".join(text + "\n" for _, text in pages if text)
+
+def estimate_ocr_seconds(method, pages):
+    """
+    Estimates the wall-clock seconds an OCR method needs for a PDF.
+    
+    Args:
+        method (str): 'inline', 'image' or 'gcs'
+        pages (int): Number of pages in the PDF
+        
+    Returns:
+        float: Estimated seconds
+    """
+    fixed, per_unit, parallel = OCR_METHOD_COSTS[method]
+    units = -(-pages // INLINE_MAX_PAGES) if method == "inline" else pages
+    return fixed + per_unit * -(-units // parallel)
+
+def record_ocr_latency(method, pages, seconds, weight=0.3):
+    """
+    Folds a measured run into the per-unit cost estimate of a method.
+    
+    Args:
+        method (str): 'inline', 'image' or 'gcs'
+        pages (int): Number of pages processed
+        seconds (float): Measured wall-clock seconds
+        weight (float): Weight of the new measurement in the moving average
+    """
+    fixed, per_unit, parallel = OCR_METHOD_COSTS[method]
+    units = -(-pages // INLINE_MAX_PAGES) if method == "inline" else pages
+    rounds = -(-units // parallel)
+    if rounds <= 0:
+        return
+    measured = max(seconds - fixed, 0) / rounds
+    OCR_METHOD_COSTS[method][1] = (1 - weight) * per_unit + weight * measured
+
+def choose_ocr_method(pdf_path, bucket_name=None):
+    """
+    Picks the fastest OCR method for a PDF from its page count, file size and the
+    measured latency of earlier runs.
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        bucket_name (str, optional): GCS bucket. Without one the async method is not considered.
+        
+    Returns:
+        str: 'inline' (chunked synchronous PDF), 'image' (per-page image requests) or 'gcs' (async)
+    """
+    pages = count_pdf_pages(pdf_path)
+    candidates = ["image"]
+    # Inline chunks must stay within the request size limit
+    if pages and os.path.getsize(pdf_path) / pages * INLINE_MAX_PAGES <= INLINE_MAX_BYTES:
+        candidates.append("inline")
+    if bucket_name:
+        candidates.append("gcs")
+    return min(candidates, key=lambda method: estimate_ocr_seconds(method, pages))
+
+def ocr_pdf(pdf_path, bucket_name=None, method="auto"):
+    """
+    OCR a PDF with the method chosen by choose_ocr_method (or the one given) and
+    record how long it took to improve later choices.
+    
+    Args:
+        pdf_path (str): Path to the PDF file
+        bucket_name (str, optional): GCS bucket for the async method
+        method (str): 'auto', 'inline', 'image' or 'gcs'
+        
+    Returns:
+        tuple: (text, method used)
+    """
+    import time
+
+    if method == "auto":
+        method = choose_ocr_method(pdf_path, bucket_name)
+    pages = count_pdf_pages(pdf_path)
+    print(f"OCR method for {os.path.basename(pdf_path)} ({pages} pages): {method}")
+
+    start_time = time.time()
+    if method == "inline":
+        text = detect_document_inline(pdf_path)
+    elif method == "gcs":
+        text = upload_to_gcs_and_process(pdf_path, bucket_name)
+    else:
+        text = "".join(page_text for _, page_text in _ocr_pdf_pages(pdf_path))
+    record_ocr_latency(method, pages, time.time() - start_time)
+    return text, method
 
 def preprocess_image(image):
     """
@@ -188,6 +983,9 @@ def preprocess_image(image):
     Returns:
         PIL.Image.Image: The preprocessed image.
     """
+    import cv2
+    import numpy as np
+
     # Convert PIL image to OpenCV format
     image_np = np.array(image)
     gray = cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
@@ -217,6 +1015,27 @@ def process_page(page, page_number):
     
     return (page_number, extracted_text)
 
+def _ocr_pdf_pages(pdf_path):
+    """
+    Renders each page of a PDF and OCRs the images in parallel.
+    
+    Args:
+        pdf_path (str): The path to the PDF file.
+        
+    Returns:
+        list: (page_number, text) tuples in page order.
+    """
+    from pdf2image import convert_from_path
+
+    # Convert PDF to images
+    pages = convert_from_path(pdf_path)
+
+    # Use ThreadPoolExecutor to process pages in parallel
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(process_page, page, page_number)
+                   for page_number, page in enumerate(pages, start=1)]
+        return sorted([future.result() for future in as_completed(futures)], key=lambda x: x[0])
+
 def process_pdf(pdf_path, output_folder):
     """
     Processes each page in a PDF file and performs OCR.
@@ -225,41 +1044,133 @@ def process_pdf(pdf_path, output_folder):
         pdf_path (str): The path to the PDF file.
         output_folder (str): The folder where the output text file will be saved.
     """
-    # Convert PDF to images
-    pages = convert_from_path(pdf_path)
+    results = _ocr_pdf_pages(pdf_path)
 
     # Define the output text file path
     output_text_file = os.path.join(output_folder, f"{os.path.basename(pdf_path)}.txt")
     
     with open(output_text_file, 'w', encoding='utf-8') as text_file:
-        # Use ThreadPoolExecutor to process pages in parallel
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            futures = [executor.submit(process_page, page, page_number)
-                       for page_number, page in enumerate(pages, start=1)]
-            results = sorted([future.result() for future in as_completed(futures)], key=lambda x: x[0])
-        
         # Write results to file in the correct order
         for page_number, text in results:
             # text_file.write(f"\n--- Page {page_number} ---\n")
             text_file.write(text)
             # text_file.write("\n\n")
 
-def process_all_pdfs(input_folder, output_folder):
+def _ocr_pdf_page(pdf_path, page_number):
+    """
+    Renders a single PDF page and OCRs it, so a page image only exists while
+    its page is being processed.
+    
+    Returns:
+        tuple: (page_number, text)
+    """
+    from pdf2image import convert_from_path
+
+    page = convert_from_path(pdf_path, first_page=page_number, last_page=page_number)[0]
+    return process_page(page, page_number)
+
+def batch_process_pdfs(pdf_paths, output_folder, max_workers=8, on_file_done=None):
+    """
+    OCR many PDFs with one shared pool of page workers. Pages from all files are
+    queued largest file first, so the long books start early and the small ones
+    fill the gaps at the end instead of leaving workers idle. Each file's text is
+    written as soon as its last page is done.
+    
+    Args:
+        pdf_paths (list): Paths of the local PDF files
+        output_folder (str): Folder where '<name>.pdf.txt' files are written
+        max_workers (int): Pages OCRed at the same time across all files
+        on_file_done (callable, optional): Called as on_file_done(pdf_path, output_file)
+            from a worker thread when a file finishes; output_file is None if it failed
+        
+    Returns:
+        dict: Maps each PDF path to its output text file, or None if it failed
+    """
+    import time
+
+    os.makedirs(output_folder, exist_ok=True)
+    results = {}
+    books = []
+    for pdf_path in pdf_paths:
+        try:
+            pages = count_pdf_pages(pdf_path)
+        except Exception as e:
+            print(f"Skipping {pdf_path}: {e}")
+            results[pdf_path] = None
+            continue
+        books.append({"path": pdf_path, "pages": pages, "remaining": pages, "texts": {}, "failed": False})
+    books.sort(key=lambda book: book["pages"], reverse=True)
+    total_pages = sum(book["pages"] for book in books)
+    print(f"Batching {len(books)} PDFs ({total_pages} pages) on {max_workers} OCR workers")
+
+    lock = threading.Lock()
+    start_time = time.time()
+
+    def finish_book(book):
+        output_file = None
+        if not book["failed"]:
+            try:
+                output_file = os.path.join(output_folder, f"{os.path.basename(book['path'])}.txt")
+                with open(output_file, 'w', encoding='utf-8') as f:
+                    for page_number in sorted(book["texts"]):
+                        f.write(book["texts"][page_number])
+                print(f"Wrote {output_file} ({book['pages']} pages, {time.time() - start_time:.1f}s)")
+            except OSError as e:
+                print(f"Failed to write OCR output for {book['path']}: {e}")
+                output_file = None
+        book["texts"] = {}
+        results[book["path"]] = output_file
+        if on_file_done is not None:
+            on_file_done(book["path"], output_file)
+
+    def run_page(book, page_number):
+        # Once a page of a file has failed, its remaining pages are not sent to the API
+        text = None
+        if not book["failed"]:
+            try:
+                _, text = _ocr_pdf_page(book["path"], page_number)
+            except Exception as e:
+                with lock:
+                    if not book["failed"]:
+                        print(f"OCR failed for page {page_number} of {book['path']}: {e}")
+                    book["failed"] = True
+        with lock:
+            if text is not None:
+                book["texts"][page_number] = text
+            book["remaining"] -= 1
+            finished = book["remaining"] == 0
+        if finished:
+            finish_book(book)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = []
+        for book in books:
+            if book["pages"] == 0:
+                finish_book(book)
+            for page_number in range(1, book["pages"] + 1):
+                futures.append(executor.submit(run_page, book, page_number))
+        for future in futures:
+            future.result()
+
+    elapsed = time.time() - start_time
+    print(f"Batch finished in {elapsed:.1f}s ({total_pages / elapsed if elapsed else 0:.1f} pages/sec)")
+    return results
+
+def process_all_pdfs(input_folder, output_folder, max_workers=8):
     """
     Processes all PDFs in the input folder and stores the results in the output folder.
     
     Args:
         input_folder (str): The folder containing PDF files.
         output_folder (str): The folder where the output text files will be saved.
+        max_workers (int): Pages OCRed at the same time across all files.
     """
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
-    for file_name in os.listdir(input_folder):
-        if file_name.endswith(".pdf"):
-            pdf_path = os.path.join(input_folder, file_name)
-            print(f"Processing {pdf_path}...")
-            process_pdf(pdf_path, output_folder)
+    pdf_paths = [os.path.join(input_folder, file_name)
+                 for file_name in sorted(os.listdir(input_folder)) if file_name.endswith(".pdf")]
+    batch_process_pdfs(pdf_paths, output_folder, max_workers=max_workers)
 
 def debug_annotation_structure(gcs_source_uri, gcs_destination_uri, debug_output_dir=None):
     """
@@ -0,0 +1,369 @@
+"""
+Page-level OCR job queue for Book Scanner.
+
+Books are split into page jobs in a SQLite database. Any number of worker
+processes claim pages with time-limited leases, so a crashed or stuck worker's
+pages are retried by others once the lease expires. When the last page of a
+book is done its text is reassembled in page order.
+
+    python run_book_scanner.py queue add ~/books --db /srv/ocr/queue.sqlite
+    python run_book_scanner.py queue worker --db /srv/ocr/queue.sqlite --threads 8
+    python run_book_scanner.py queue status --db /srv/ocr/queue.sqlite
+
+WAL mode (the default) is the fastest and supports many worker processes on one
+machine. WAL needs shared memory, so for workers on several machines sharing the
+database over a network filesystem use journal_mode="DELETE", which relies on
+file locks only. Lease times use the wall clock, so machines need synced clocks.
+"""
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+DEFAULT_QUEUE_DB = os.path.join(os.path.expanduser("~"), "Documents", "book-scanner", "ocr_queue.sqlite")
+
+# Seconds a worker may hold a page before others may retry it
+DEFAULT_LEASE_SECONDS = 300
+
+# Attempts before a page (and its book) is marked as failed
+DEFAULT_MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL,
+    output TEXT NOT NULL,
+    pages INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    added_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    book_id INTEGER NOT NULL REFERENCES books(id),
+    page INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    text TEXT,
+    error TEXT,
+    finished_at REAL,
+    PRIMARY KEY (book_id, page)
+);
+CREATE INDEX IF NOT EXISTS pages_claimable ON pages (status, lease_expires);
+"""
+
+
+class JobQueue:
+    """
+    SQLite-backed queue of page jobs. Each thread gets its own connection,
+    so one JobQueue can be shared by a worker's threads.
+    """
+
+    def __init__(self, db_path=DEFAULT_QUEUE_DB, lease_seconds=DEFAULT_LEASE_SECONDS,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS, journal_mode="WAL"):
+        """
+        Args:
+            db_path (str): Database file; put it on shared storage for several machines
+            lease_seconds (float): Seconds a claimed page is reserved for its worker
+            max_attempts (int): Claims per page before it is marked as failed
+            journal_mode (str): 'WAL' for one machine, 'DELETE' for a network filesystem
+        """
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.journal_mode = journal_mode
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Autocommit mode; transactions are opened explicitly with BEGIN IMMEDIATE
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _transaction(self, work):
+        """Run work(connection) in a write transaction, taking the write lock up front"""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(connection)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return result
+
+    def add_book(self, pdf_path, output_path=None, pages=None):
+        """
+        Queue every page of a PDF.
+
+        Args:
+            pdf_path (str): PDF path as seen by all workers
+            output_path (str, optional): Text file to write (default: '<pdf>.txt')
+            pages (int, optional): Page count, if already known
+
+        Returns:
+            int: Book id
+        """
+        if pages is None:
+            from google_vision_ocr import count_pdf_pages
+            pages = count_pdf_pages(pdf_path)
+        pdf_path = os.path.abspath(pdf_path)
+        output_path = os.path.abspath(output_path or pdf_path + ".txt")
+
+        def insert(connection):
+            cursor = connection.execute(
+                "INSERT INTO books (path, output, pages, added_at) VALUES (?, ?, ?, ?)",
+                (pdf_path, output_path, pages, time.time()))
+            book_id = cursor.lastrowid
+            connection.executemany("INSERT INTO pages (book_id, page) VALUES (?, ?)",
+                                   ((book_id, page) for page in range(1, pages + 1)))
+            if pages == 0:
+                connection.execute("UPDATE books SET status = 'ready' WHERE id = ?", (book_id,))
+            return book_id
+        return self._transaction(insert)
+
+    def claim(self, worker_id, limit=1):
+        """
+        Lease up to limit pages: pending pages first, then pages whose lease expired.
+
+        Returns:
+            list: (book_id, page, pdf_path) tuples
+        """
+        def take(connection):
+            now = time.time()
+            rows = connection.execute(
+                "SELECT p.book_id, p.page, b.path FROM pages p JOIN books b ON b.id = p.book_id "
+                "WHERE p.status = 'pending' OR (p.status = 'leased' AND p.lease_expires < ?) "
+                "ORDER BY p.status DESC, p.book_id, p.page LIMIT ?",
+                (now, limit)).fetchall()
+            connection.executemany(
+                "UPDATE pages SET status = 'leased', lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1 WHERE book_id = ? AND page = ?",
+                ((worker_id, now + self.lease_seconds, book_id, page) for book_id, page, _ in rows))
+            return rows
+
+        claimed = self._transaction(take)
+        # Pages that have used up their attempts go straight to failed instead of running again
+        exhausted = self._connection().execute(
+            "SELECT book_id, page FROM pages WHERE lease_owner = ? AND status = 'leased' AND attempts > ?",
+            (worker_id, self.max_attempts)).fetchall()
+        if exhausted:
+            for book_id, page in exhausted:
+                self._finish_page(book_id, page, worker_id, None, "too many attempts", retry=False)
+            exhausted = set(exhausted)
+            claimed = [row for row in claimed if (row[0], row[1]) not in exhausted]
+        return claimed
+
+    def extend_leases(self, worker_id, pages):
+        """Renew the leases on pages a worker is still working on"""
+        expires = time.time() + self.lease_seconds
+        self._transaction(lambda connection: connection.executemany(
+            "UPDATE pages SET lease_expires = ? WHERE book_id = ? AND page = ? AND lease_owner = ? "
+            "AND status = 'leased'", ((expires, book_id, page, worker_id) for book_id, page in pages)))
+
+    def complete(self, book_id, page, worker_id, text):
+        """
+        Store a page's text. Ignored if the lease was lost to another worker.
+
+        Returns:
+            bool: True if the book has no pages left and can be assembled
+        """
+        return self._finish_page(book_id, page, worker_id, text, None, retry=False)
+
+    def fail(self, book_id, page, worker_id, error):
+        """Give a page back for retry, or fail it (and its book) after max_attempts"""
+        return self._finish_page(book_id, page, worker_id, None, str(error), retry=True)
+
+    def _finish_page(self, book_id, page, worker_id, text, error, retry):
+        def update(connection):
+            row = connection.execute(
+                "SELECT attempts FROM pages WHERE book_id = ? AND page = ? AND status = 'leased' "
+                "AND lease_owner = ?", (book_id, page, worker_id)).fetchone()
+            if row is None:
+                return False
+            if error is None:
+                connection.execute(
+                    "UPDATE pages SET status = 'done', text = ?, error = NULL, lease_owner = NULL, "
+                    "finished_at = ? WHERE book_id = ? AND page = ?", (text, time.time(), book_id, page))
+            elif retry and row[0] < self.max_attempts:
+                connection.execute(
+                    "UPDATE pages SET status = 'pending', error = ?, lease_owner = NULL, lease_expires = NULL "
+                    "WHERE book_id = ? AND page = ?", (error, book_id, page))
+                return False
+            else:
+                connection.execute(
+                    "UPDATE pages SET status = 'failed', error = ?, lease_owner = NULL "
+                    "WHERE book_id = ? AND page = ?", (error, book_id, page))
+                connection.execute("UPDATE books SET status = 'failed', finished_at = ? WHERE id = ?",
+                                   (time.time(), book_id))
+                # The book cannot be completed, so its other pages are not worth OCRing
+                connection.execute(
+                    "UPDATE pages SET status = 'skipped', lease_owner = NULL "
+                    "WHERE book_id = ? AND status IN ('pending', 'leased')", (book_id,))
+                return False
+
+            remaining = connection.execute(
+                "SELECT COUNT(*) FROM pages WHERE book_id = ? AND status != 'done'", (book_id,)).fetchone()[0]
+            if remaining == 0:
+                # Only the transaction that flips the book to 'ready' reports it
+                cursor = connection.execute(
+                    "UPDATE books SET status = 'ready' WHERE id = ? AND status = 'pending'", (book_id,))
+                return cursor.rowcount == 1
+            return False
+        return self._transaction(update)
+
+    def assemble(self, book_id):
+        """
+        Write a finished book's text in page order and mark it done. Safe to run
+        twice: the file is replaced atomically with the same content.
+
+        Returns:
+            str: Output text file, or None if the book is not finished
+        """
+        connection = self._connection()
+        row = connection.execute("SELECT output, status FROM books WHERE id = ?", (book_id,)).fetchone()
+        if row is None or row[1] not in ("ready", "done"):
+            return None
+        output_path = row[0]
+        if row[1] == "done":
+            return output_path
+        texts = connection.execute("SELECT text FROM pages WHERE book_id = ? ORDER BY page", (book_id,))
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".assemble-", dir=os.path.dirname(output_path))
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                for (text,) in texts:
+                    f.write(text or "")
+            os.replace(temp_path, output_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        self._transaction(lambda connection: connection.execute(
+            "UPDATE books SET status = 'done', finished_at = ? WHERE id = ? AND status = 'ready'",
+            (time.time(), book_id)))
+        return output_path
+
+    def ready_books(self):
+        """Books whose pages are all done but whose text was not written (e.g. after a crash)"""
+        return [book_id for (book_id,) in
+                self._connection().execute("SELECT id FROM books WHERE status = 'ready'")]
+
+    def stats(self, window=60):
+        """
+        Returns:
+            dict: Page counts by status, book counts by status and pages/sec over
+                  the last window seconds
+        """
+        connection = self._connection()
+        pages = dict(connection.execute("SELECT status, COUNT(*) FROM pages GROUP BY status").fetchall())
+        books = dict(connection.execute("SELECT status, COUNT(*) FROM books GROUP BY status").fetchall())
+        recent = connection.execute("SELECT COUNT(*) FROM pages WHERE finished_at > ?",
+                                    (time.time() - window,)).fetchone()[0]
+        expired = connection.execute("SELECT COUNT(*) FROM pages WHERE status = 'leased' AND lease_expires < ?",
+                                     (time.time(),)).fetchone()[0]
+        return {"pages": pages, "books": books, "expired_leases": expired, "pages_per_sec": recent / window}
+
+    def has_work(self):
+        """True while any page is pending or leased"""
+        return self._connection().execute(
+            "SELECT 1 FROM pages WHERE status IN ('pending', 'leased') LIMIT 1").fetchone() is not None
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def run_worker(queue, worker_id=None, threads=4, ocr_page=None, exit_when_idle=False, idle_sleep=2.0,
+               stop_event=None):
+    """
+    Claim pages, OCR them and report results until stopped.
+
+    A new page is claimed as soon as one finishes, so a slow page never leaves the
+    other threads idle, and the leases of pages still being OCRed are renewed every
+    third of the lease time, so a page slower than the lease is not claimed again.
+
+    Args:
+        queue (JobQueue): The shared queue
+        worker_id (str, optional): Lease owner name (default: host-pid-random)
+        threads (int): Pages OCRed at the same time by this worker
+        ocr_page (callable, optional): ocr_page(pdf_path, page) -> (page, text);
+            defaults to rendering the page and calling the Vision API
+        exit_when_idle (bool): Return once no pages are pending or leased
+        idle_sleep (float): Seconds to wait when there is nothing to claim
+        stop_event (threading.Event, optional): Set to stop after the current pages
+
+    Returns:
+        int: Pages completed by this worker
+    """
+    if ocr_page is None:
+        from google_vision_ocr import _ocr_pdf_page as ocr_page
+    worker_id = worker_id or default_worker_id()
+    stop_event = stop_event or threading.Event()
+    completed = 0
+    start_time = time.time()
+
+    def work(job):
+        book_id, page, pdf_path = job
+        try:
+            _, text = ocr_page(pdf_path, page)
+        except Exception as e:
+            queue.fail(book_id, page, worker_id, e)
+            return False
+        if queue.complete(book_id, page, worker_id, text):
+            output = queue.assemble(book_id)
+            print(f"[{worker_id}] Wrote {output}")
+        return True
+
+    # Future -> (book_id, page) of the pages being OCRed
+    in_flight = {}
+    renew_interval = queue.lease_seconds / 3
+    next_renewal = time.monotonic() + renew_interval
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        while True:
+            starved = False
+            if not stop_event.is_set() and len(in_flight) < threads:
+                jobs = queue.claim(worker_id, limit=threads - len(in_flight))
+                for job in jobs:
+                    in_flight[executor.submit(work, job)] = job[:2]
+                starved = not jobs
+            if not in_flight:
+                if stop_event.is_set():
+                    break
+                # Pick up books left unassembled by a worker that stopped mid-way
+                for book_id in queue.ready_books():
+                    queue.assemble(book_id)
+                if exit_when_idle and not queue.has_work():
+                    break
+                stop_event.wait(idle_sleep)
+                continue
+
+            # Wait for a page to finish, waking up to renew leases (and to look for work again)
+            timeout = max(0.0, next_renewal - time.monotonic())
+            if starved:
+                timeout = min(timeout, idle_sleep)
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                del in_flight[future]
+                completed += future.result()
+            if time.monotonic() >= next_renewal:
+                if in_flight:
+                    queue.extend_leases(worker_id, list(in_flight.values()))
+                next_renewal = time.monotonic() + renew_interval
+
+    elapsed = time.time() - start_time
+    print(f"[{worker_id}] {completed} pages in {elapsed:.1f}s ({completed / elapsed if elapsed else 0:.2f} pages/sec)")
+    return completed
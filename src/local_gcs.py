@@ -0,0 +1,481 @@
+"""
+Local stand-in for Google Cloud Storage and the Vision file annotation API.
+
+Lets the GCS code path (upload_to_gcs_and_process, async_detect_document, the
+sharded and batch modes) run offline. Objects live in a directory on disk, and a
+fake long-running annotate operation writes Vision-style JSON output shards into
+it. Point google_vision_ocr at it with either:
+
+    export BOOK_SCANNER_LOCAL_GCS=/tmp/local-gcs
+
+or, from Python:
+
+    import local_gcs
+    local_gcs.use_local_backend("/tmp/local-gcs", latency=0.05)
+"""
+import os
+import io
+import json
+import time
+import base64
+import hashlib
+import datetime
+import threading
+import tempfile
+
+
+def _not_found(message):
+    """Returns the same NotFound exception the real client raises, if available"""
+    try:
+        from google.api_core.exceptions import NotFound
+        return NotFound(message)
+    except ImportError:
+        return FileNotFoundError(message)
+
+
+def _invalid_argument(message):
+    """Returns the same InvalidArgument exception the real client raises, if available"""
+    try:
+        from google.api_core.exceptions import InvalidArgument
+        return InvalidArgument(message)
+    except ImportError:
+        return ValueError(message)
+
+
+def _checksums(data):
+    """Returns (md5_base64, crc32c_base64) the way GCS reports them"""
+    md5_b64 = base64.b64encode(hashlib.md5(data).digest()).decode("ascii")
+    try:
+        import google_crc32c
+        crc32c_b64 = base64.b64encode(google_crc32c.Checksum(data).digest()).decode("ascii")
+    except ImportError:
+        crc32c_b64 = None
+    return md5_b64, crc32c_b64
+
+
+def _replace_file(path, payload):
+    """Writes a file through a temp file, so concurrent readers never see it half written"""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        f.write(payload)
+    os.replace(temp_path, path)
+
+
+class LocalStorageClient:
+    """Directory-backed replacement for google.cloud.storage.Client"""
+
+    def __init__(self, root_dir, latency=0.0, bandwidth=None, project="local-project"):
+        """
+        Args:
+            root_dir (str): Directory holding one sub-directory per bucket
+            latency (float): Seconds added to every request, to mimic a network round trip
+            bandwidth (float, optional): Bytes per second for uploads and downloads
+            project (str): Project id reported by the client
+        """
+        self.root_dir = os.path.abspath(root_dir)
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.project = project
+        os.makedirs(self.root_dir, exist_ok=True)
+
+    def _simulate_request(self, nbytes=0):
+        delay = self.latency
+        if self.bandwidth:
+            delay += nbytes / self.bandwidth
+        if delay > 0:
+            time.sleep(delay)
+
+    def bucket(self, bucket_name):
+        return LocalBucket(self, bucket_name)
+
+    def create_bucket(self, bucket_name):
+        bucket = LocalBucket(self, bucket_name)
+        os.makedirs(bucket._data_dir, exist_ok=True)
+        return bucket
+
+    def get_bucket(self, bucket_name):
+        # Buckets are created on first use so scripts can run against an empty directory
+        self._simulate_request()
+        return self.create_bucket(bucket_name)
+
+    def list_blobs(self, bucket_or_name, prefix=None):
+        bucket = bucket_or_name if isinstance(bucket_or_name, LocalBucket) else self.bucket(bucket_or_name)
+        return bucket.list_blobs(prefix=prefix)
+
+
+class LocalBucket:
+    """Replacement for google.cloud.storage.Bucket"""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._data_dir = os.path.join(client.root_dir, name, "objects")
+        self._meta_dir = os.path.join(client.root_dir, name, "metadata")
+
+    def blob(self, blob_name, chunk_size=None):
+        return LocalBlob(self, blob_name, chunk_size=chunk_size)
+
+    def get_blob(self, blob_name):
+        blob = LocalBlob(self, blob_name)
+        try:
+            blob.reload()
+        except Exception:
+            return None
+        return blob
+
+    def exists(self):
+        return os.path.isdir(self._data_dir)
+
+    def list_blobs(self, prefix=None):
+        self.client._simulate_request()
+        names = []
+        for dirpath, _, filenames in os.walk(self._data_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                names.append(os.path.relpath(path, self._data_dir).replace(os.sep, "/"))
+        # GCS lists objects in lexicographic order
+        blobs = []
+        for name in sorted(names):
+            if prefix is None or name.startswith(prefix):
+                blob = LocalBlob(self, name)
+                blob._load_metadata()
+                blobs.append(blob)
+        return blobs
+
+
+class LocalBlob:
+    """Replacement for google.cloud.storage.Blob"""
+
+    def __init__(self, bucket, name, chunk_size=None):
+        self.bucket = bucket
+        self.name = name
+        self.chunk_size = chunk_size
+        self.content_type = None
+        self.md5_hash = None
+        self.crc32c = None
+        self.size = None
+        self.updated = None
+        self.custom_time = None
+        self.generation = None
+        self.metadata = None
+
+    @property
+    def _data_path(self):
+        return os.path.join(self.bucket._data_dir, *self.name.split("/"))
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.bucket._meta_dir, *self.name.split("/")) + ".json"
+
+    def _load_metadata(self):
+        with open(self._meta_path, "r") as f:
+            meta = json.load(f)
+        self.content_type = meta.get("contentType")
+        self.md5_hash = meta.get("md5Hash")
+        self.crc32c = meta.get("crc32c")
+        self.size = meta.get("size")
+        self.metadata = meta.get("metadata")
+        self.updated = datetime.datetime.fromisoformat(meta["updated"])
+        self.custom_time = datetime.datetime.fromisoformat(meta["customTime"]) if meta.get("customTime") else None
+        self.generation = meta.get("generation")
+
+    def _write(self, data, content_type):
+        self.bucket.client._simulate_request(len(data))
+        for path in (self._data_path, self._meta_path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        md5_b64, crc32c_b64 = _checksums(data)
+        meta = {
+            "contentType": content_type or "application/octet-stream",
+            "md5Hash": md5_b64,
+            "crc32c": crc32c_b64,
+            "size": len(data),
+            "metadata": self.metadata,
+            "updated": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            # Like GCS, every write of the content is a new generation; metadata patches are not
+            "generation": time.time_ns(),
+        }
+        # Write to a temp file first so concurrent readers never see a partial object
+        for path, payload in ((self._data_path, data), (self._meta_path, json.dumps(meta).encode("utf-8"))):
+            _replace_file(path, payload)
+        self._load_metadata()
+
+    def patch(self, **kwargs):
+        """Saves changed metadata and custom_time (the content and generation stay the same)"""
+        self.bucket.client._simulate_request()
+        try:
+            with open(self._meta_path, "r") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            raise _not_found(f"gs://{self.bucket.name}/{self.name}")
+        meta["metadata"] = self.metadata
+        meta["customTime"] = self.custom_time.isoformat() if self.custom_time else None
+        meta["updated"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        _replace_file(self._meta_path, json.dumps(meta).encode("utf-8"))
+        self._load_metadata()
+
+    def upload_from_filename(self, filename, content_type=None, **kwargs):
+        with open(filename, "rb") as f:
+            self._write(f.read(), content_type)
+
+    def upload_from_string(self, data, content_type=None, **kwargs):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._write(data, content_type)
+
+    def upload_from_file(self, file_obj, content_type=None, **kwargs):
+        self._write(file_obj.read(), content_type)
+
+    def download_as_bytes(self, **kwargs):
+        try:
+            with open(self._data_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            raise _not_found(f"gs://{self.bucket.name}/{self.name}")
+        self.bucket.client._simulate_request(len(data))
+        return data
+
+    def download_as_text(self, encoding="utf-8", **kwargs):
+        return self.download_as_bytes().decode(encoding)
+
+    def download_to_filename(self, filename, **kwargs):
+        with open(filename, "wb") as f:
+            f.write(self.download_as_bytes())
+
+    def exists(self, **kwargs):
+        self.bucket.client._simulate_request()
+        return os.path.exists(self._meta_path)
+
+    def reload(self, **kwargs):
+        self.bucket.client._simulate_request()
+        try:
+            self._load_metadata()
+        except FileNotFoundError:
+            raise _not_found(f"gs://{self.bucket.name}/{self.name}")
+
+    def delete(self, **kwargs):
+        self.bucket.client._simulate_request()
+        try:
+            os.remove(self._data_path)
+            os.remove(self._meta_path)
+        except FileNotFoundError:
+            raise _not_found(f"gs://{self.bucket.name}/{self.name}")
+
+
+def default_page_text(source_name, page_number):
+    """Text the fake Vision API 'recognizes' on a page"""
+    return (f"{source_name} page {page_number}\n"
+            f"The quick brown fox jumps over the lazy dog.\n"
+            f"Line three of page {page_number}.")
+
+
+def fake_full_text_annotation(text, width, height):
+    """
+    Builds a fullTextAnnotation dict shaped like the Vision API JSON output, with
+    one block per line and normalized word bounding boxes laid out top to bottom.
+
+    Args:
+        text (str): Page text, one line per block
+        width (float): Page width reported in the annotation
+        height (float): Page height reported in the annotation
+
+    Returns:
+        dict: The annotation
+    """
+    def box(x0, y0, x1, y1):
+        return {"normalizedVertices": [{"x": x0, "y": y0}, {"x": x1, "y": y0},
+                                       {"x": x1, "y": y1}, {"x": x0, "y": y1}]}
+
+    blocks = []
+    lines = text.split("\n")
+    line_height = 0.8 / max(len(lines), 1)
+    for line_index, line in enumerate(lines):
+        y0 = 0.1 + line_index * line_height
+        y1 = y0 + line_height * 0.7
+        words = []
+        x = 0.1
+        for word in line.split():
+            word_width = 0.012 * len(word)
+            words.append({
+                "boundingBox": box(x, y0, x + word_width, y1),
+                "symbols": [{"text": char} for char in word],
+            })
+            x += word_width + 0.012
+        blocks.append({
+            "blockType": "TEXT",
+            "boundingBox": box(0.1, y0, max(x, 0.11), y1),
+            "paragraphs": [{"boundingBox": box(0.1, y0, max(x, 0.11), y1), "words": words}],
+        })
+    return {
+        "pages": [{"width": width, "height": height, "blocks": blocks}],
+        "text": text + "\n",
+    }
+
+
+class LocalOperation:
+    """Replacement for the long-running operation returned by async_batch_annotate_files"""
+
+    def __init__(self, work):
+        self._error = None
+        self.finished_at = None
+        self._thread = threading.Thread(target=self._run, args=(work,), daemon=True)
+        self._thread.start()
+
+    def _run(self, work):
+        try:
+            work()
+        except Exception as e:
+            self._error = e
+        self.finished_at = time.perf_counter()
+
+    def done(self):
+        return not self._thread.is_alive()
+
+    def result(self, timeout=None):
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            from concurrent.futures import TimeoutError
+            raise TimeoutError("Operation did not finish in time")
+        if self._error is not None:
+            raise self._error
+        return None
+
+
+class LocalVisionClient:
+    """Replacement for vision.ImageAnnotatorClient that fakes text detection"""
+
+    def __init__(self, storage_client, seconds_per_page=0.0, text_for_page=None):
+        """
+        Args:
+            storage_client (LocalStorageClient): Store the async operations read from and write to
+            seconds_per_page (float): Simulated processing time per page
+            text_for_page (callable, optional): f(source_name, page_number) -> text
+        """
+        self.storage_client = storage_client
+        self.seconds_per_page = seconds_per_page
+        self.text_for_page = text_for_page or default_page_text
+
+    def _open_gcs_uri(self, uri):
+        bucket_name, _, name = uri[len("gs://"):].partition("/")
+        return self.storage_client.bucket(bucket_name), name
+
+    def _annotate_pdf(self, pdf_bytes, source_name, pages=None):
+        """Returns (page_number, annotation) for the requested pages of a PDF"""
+        import pikepdf
+        results = []
+        with pikepdf.open(io.BytesIO(pdf_bytes)) as pdf:
+            page_numbers = pages or range(1, len(pdf.pages) + 1)
+            for page_number in page_numbers:
+                # The real API rejects the whole request when a page does not exist
+                if not 1 <= page_number <= len(pdf.pages):
+                    raise _invalid_argument(f"Invalid page number {page_number}: "
+                                            f"the file has {len(pdf.pages)} pages")
+                mediabox = pdf.pages[page_number - 1].mediabox
+                width = float(mediabox[2]) - float(mediabox[0])
+                height = float(mediabox[3]) - float(mediabox[1])
+                if self.seconds_per_page:
+                    time.sleep(self.seconds_per_page)
+                text = self.text_for_page(source_name, page_number)
+                results.append((page_number, fake_full_text_annotation(text, width, height)))
+        return results
+
+    def _run_async_request(self, request):
+        source_uri = request.input_config.gcs_source.uri
+        source_bucket, source_name = self._open_gcs_uri(source_uri)
+        pages = self._annotate_pdf(source_bucket.blob(source_name).download_as_bytes(), source_name)
+
+        output_bucket, prefix = self._open_gcs_uri(request.output_config.gcs_destination.uri)
+        batch_size = request.output_config.batch_size or 20
+        for start in range(0, len(pages), batch_size):
+            batch = pages[start:start + batch_size]
+            shard = {
+                "inputConfig": {"gcsSource": {"uri": source_uri}, "mimeType": "application/pdf"},
+                "responses": [
+                    {"fullTextAnnotation": annotation,
+                     "context": {"uri": source_uri, "pageNumber": page_number}}
+                    for page_number, annotation in batch
+                ],
+            }
+            name = f"{prefix}output-{batch[0][0]}-to-{batch[-1][0]}.json"
+            output_bucket.blob(name).upload_from_string(json.dumps(shard), content_type="application/json")
+
+    def async_batch_annotate_files(self, requests):
+        """Starts a fake operation that writes output-N-to-M.json shards for each request"""
+        def work():
+            # Like the real service, the files of one call are processed in parallel
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=max(len(requests), 1)) as executor:
+                for future in [executor.submit(self._run_async_request, request) for request in requests]:
+                    future.result()
+        return LocalOperation(work)
+
+    def batch_annotate_files(self, requests):
+        """Synchronous annotation of inline PDF content (up to 5 pages per request)"""
+        import pikepdf
+        from google.cloud import vision
+        file_responses = []
+        for request in requests:
+            try:
+                pages = self._annotate_pdf(request.input_config.content, "inline", list(request.pages) or None)
+            except pikepdf.PdfError as e:
+                # Like the real API, content it cannot read fails the file, not the call
+                file_responses.append(vision.AnnotateFileResponse(error={"code": 3, "message": f"Bad PDF: {e}"}))
+                continue
+            file_responses.append(vision.AnnotateFileResponse(
+                total_pages=len(pages),
+                responses=[vision.AnnotateImageResponse(
+                    full_text_annotation=vision.TextAnnotation(text=annotation["text"]))
+                    for _, annotation in pages],
+            ))
+        return vision.BatchAnnotateFilesResponse(responses=file_responses)
+
+    def text_detection(self, image, **kwargs):
+        """Image text detection with word boxes laid out like fake_full_text_annotation"""
+        from google.cloud import vision
+        from PIL import Image
+        if self.seconds_per_page:
+            time.sleep(self.seconds_per_page)
+        width, height = Image.open(io.BytesIO(image.content)).size
+        annotation = fake_full_text_annotation(self.text_for_page("image", 1), width, height)
+        words = []
+        for block in annotation["pages"][0]["blocks"]:
+            for word in block["paragraphs"][0]["words"]:
+                vertices = [vision.Vertex(x=int(v["x"] * width), y=int(v["y"] * height))
+                            for v in word["boundingBox"]["normalizedVertices"]]
+                words.append(vision.EntityAnnotation(
+                    description="".join(symbol["text"] for symbol in word["symbols"]),
+                    bounding_poly=vision.BoundingPoly(vertices=vertices)))
+        full_text = vision.EntityAnnotation(description=annotation["text"])
+        return vision.AnnotateImageResponse(text_annotations=[full_text] + words)
+
+    def document_text_detection(self, image, **kwargs):
+        """Dense text detection; the fullTextAnnotation uses fake_full_text_annotation's layout"""
+        from google.cloud import vision
+        from PIL import Image
+        if self.seconds_per_page:
+            time.sleep(self.seconds_per_page)
+        width, height = Image.open(io.BytesIO(image.content)).size
+        annotation = fake_full_text_annotation(self.text_for_page("image", 1), width, height)
+        return vision.AnnotateImageResponse.from_json(json.dumps({"fullTextAnnotation": annotation}))
+
+
+def use_local_backend(root_dir, latency=0.0, bandwidth=None, seconds_per_page=0.0):
+    """
+    Routes all google_vision_ocr storage and Vision calls to local stand-ins.
+
+    Args:
+        root_dir (str): Directory backing the fake object store
+        latency (float): Seconds added to every storage request
+        bandwidth (float, optional): Storage bytes per second
+        seconds_per_page (float): Simulated Vision processing time per page
+
+    Returns:
+        tuple: (LocalStorageClient, LocalVisionClient)
+    """
+    try:
+        import google_vision_ocr
+    except ImportError:
+        from . import google_vision_ocr
+    storage_client = LocalStorageClient(root_dir, latency=latency, bandwidth=bandwidth)
+    vision_client = LocalVisionClient(storage_client, seconds_per_page=seconds_per_page)
+    google_vision_ocr.set_clients(storage_client, vision_client)
+    return storage_client, vision_client
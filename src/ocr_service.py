@@ -0,0 +1,451 @@
+"""
+Local HTTP OCR service for Book Scanner.
+
+One long-running process keeps the OCR libraries and Vision client warm and
+shares a single page worker pool between every station that submits work:
+
+    python run_book_scanner.py serve --port 8765
+
+    POST /jobs                 PDF bytes (Content-Type: application/pdf) or
+                               JSON {"path": "/shared/book.pdf"} for a file under
+                               the service's path root; returns the job
+    GET  /jobs/<id>            Job status and throughput
+    GET  /jobs/<id>/stream     Server-Sent Events: one 'page' event per finished
+                               page (in completion order), then 'done' or 'failed'
+    GET  /jobs/<id>/text       Full text in page order, once the job is done
+    GET  /stats                Service-wide counters and pages/sec
+
+Results are cached by content hash, so submitting the same PDF again returns
+the existing job instead of OCRing it twice. Finished jobs are kept for
+JOB_TTL_SECONDS (at most MAX_FINISHED_JOBS of them) and uploaded PDFs are deleted
+as soon as their job ends. Submitting by path is off unless a path root is given,
+and then only files under it are read. The service listens on 127.0.0.1 by
+default; it has no authentication, so only expose it on trusted networks.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8765
+
+# Largest PDF accepted in a request body
+MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+
+# Seconds a finished job (and its text) stays available, and how many finished jobs are kept at most
+JOB_TTL_SECONDS = 3600
+MAX_FINISHED_JOBS = 1000
+
+
+class OCRJob:
+    """One submitted PDF; pages finish in any order and are kept until the job is dropped"""
+
+    def __init__(self, pdf_path, sha256, pages):
+        self.id = uuid.uuid4().hex[:12]
+        self.pdf_path = pdf_path
+        self.sha256 = sha256
+        self.pages = pages
+        # The PDF is an upload in the spool folder, deleted when the job ends
+        self.spooled = False
+        self.status = "queued"
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # (page, text) in completion order, so stream readers can resume by index
+        self.completed = []
+        self.changed = threading.Condition()
+
+    def to_dict(self):
+        with self.changed:
+            done = len(self.completed)
+            end = self.finished_at or time.time()
+            elapsed = end - self.started_at if self.started_at else 0.0
+            return {
+                "id": self.id,
+                "status": self.status,
+                "pages": self.pages,
+                "pages_done": done,
+                "error": self.error,
+                "elapsed": round(elapsed, 3),
+                "pages_per_sec": round(done / elapsed, 3) if elapsed else 0.0,
+                "path": self.pdf_path,
+            }
+
+    def text(self):
+        with self.changed:
+            return "".join(text for _, text in sorted(self.completed))
+
+
+class OCRService:
+    """Job registry and shared page worker pool behind the HTTP handler"""
+
+    def __init__(self, max_workers=8, spool_dir=None, ocr_page=None, warm_up=True, path_root=None,
+                 job_ttl=JOB_TTL_SECONDS, max_finished_jobs=MAX_FINISHED_JOBS):
+        """
+        Args:
+            max_workers (int): Pages OCRed at the same time across all jobs
+            spool_dir (str, optional): Folder for uploaded PDFs (default: a temporary folder)
+            ocr_page (callable, optional): ocr_page(pdf_path, page) -> (page, text);
+                defaults to rendering the page and calling the Vision API
+            warm_up (bool): Import the OCR libraries and create one shared Vision client now
+            path_root (str, optional): Folder whose PDFs may be submitted by path; None
+                disables submitting by path
+            job_ttl (float): Seconds a finished job is kept
+            max_finished_jobs (int): Finished jobs kept at most; the oldest are dropped first
+        """
+        import google_vision_ocr
+
+        self._spool = None
+        if spool_dir is None:
+            self._spool = tempfile.TemporaryDirectory(prefix="book-scanner-jobs-")
+            spool_dir = self._spool.name
+        self.spool_dir = spool_dir
+        os.makedirs(spool_dir, exist_ok=True)
+        self.max_workers = max_workers
+        self.path_root = os.path.realpath(path_root) if path_root else None
+        self.job_ttl = job_ttl
+        self.max_finished_jobs = max_finished_jobs
+        self.ocr_page = ocr_page or google_vision_ocr._ocr_pdf_page
+        self.count_pages = google_vision_ocr.count_pdf_pages
+
+        if warm_up and ocr_page is None:
+            google_vision_ocr.warm_up()
+            # One client for every request: gRPC channels are thread-safe and costly to create
+            if google_vision_ocr._client_overrides.get("vision") is None:
+                try:
+                    google_vision_ocr.set_clients(
+                        storage_client=google_vision_ocr._client_overrides.get("storage"),
+                        vision_client=google_vision_ocr.get_vision_client())
+                except Exception as e:
+                    print(f"Could not create a shared Vision client yet ({e}); pages will create their own")
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr-page")
+        self._lock = threading.Lock()
+        self.jobs = {}
+        self._by_hash = {}
+        self.started_at = time.time()
+        self.cache_hits = 0
+        # Finish times of recent pages, for the throughput figure in stats()
+        self._page_times = []
+
+    def submit_bytes(self, data):
+        """Spool uploaded PDF bytes and queue them; returns (job, cached)"""
+        sha256 = hashlib.sha256(data).hexdigest()
+        job, cached = self._job_for(sha256)
+        if cached:
+            return job, True
+        # One spool file per job, so a finished job never deletes a newer job's upload
+        path = os.path.join(self.spool_dir, f"{sha256}.{job.id}.pdf")
+        try:
+            with open(path + ".part", "wb") as f:
+                f.write(data)
+            os.replace(path + ".part", path)
+        except BaseException as e:
+            self._finish(job, f"could not spool upload: {e}")
+            raise
+        job.spooled = True
+        return self._start(job, path), False
+
+    def submit_path(self, path):
+        """
+        Queue a PDF under the path root that the service can read directly; returns (job, cached)
+
+        Raises:
+            PermissionError: Submitting by path is disabled or the file is outside the path root
+            FileNotFoundError: There is no such file
+        """
+        if self.path_root is None:
+            raise PermissionError("submitting by path is disabled on this service")
+        real_path = os.path.realpath(path)
+        if os.path.commonpath([real_path, self.path_root]) != self.path_root:
+            raise PermissionError(f"{path} is outside {self.path_root}")
+        if not os.path.isfile(real_path):
+            raise FileNotFoundError(path)
+        digest = hashlib.sha256()
+        with open(real_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        job, cached = self._job_for(digest.hexdigest())
+        if cached:
+            return job, True
+        return self._start(job, real_path), False
+
+    def _job_for(self, sha256):
+        """
+        The live job for this content, or a new one registered for it. Lookup and insert
+        happen under one lock, so identical uploads arriving together share one job.
+
+        Returns:
+            tuple: (job, cached)
+        """
+        with self._lock:
+            self._evict()
+            job = self._by_hash.get(sha256)
+            if job is not None and job.status != "failed":
+                self.cache_hits += 1
+                return job, True
+            job = OCRJob(None, sha256, 0)
+            self.jobs[job.id] = job
+            self._by_hash[sha256] = job
+            return job, False
+
+    def _start(self, job, path):
+        """Count the new job's pages and queue them"""
+        job.pdf_path = path
+        try:
+            pages = self.count_pages(path)
+        except Exception as e:
+            self._finish(job, f"could not read PDF: {e}")
+            raise
+        with job.changed:
+            job.pages = pages
+        if pages == 0:
+            self._finish(job, None)
+        for page in range(1, pages + 1):
+            self._executor.submit(self._run_page, job, page)
+        return job
+
+    def _evict(self):
+        # Called with the lock held: drop finished jobs past the TTL, then the oldest past the cap
+        now = time.time()
+        finished = sorted((job for job in self.jobs.values() if job.finished_at is not None),
+                          key=lambda job: job.finished_at)
+        excess = len(finished) - self.max_finished_jobs
+        for job in finished:
+            if excess <= 0 and job.finished_at > now - self.job_ttl:
+                break
+            del self.jobs[job.id]
+            if self._by_hash.get(job.sha256) is job:
+                del self._by_hash[job.sha256]
+            excess -= 1
+
+    def _run_page(self, job, page):
+        with job.changed:
+            if job.status == "failed":
+                return
+            if job.status == "queued":
+                job.status = "running"
+                job.started_at = time.time()
+        try:
+            _, text = self.ocr_page(job.pdf_path, page)
+        except Exception as e:
+            self._finish(job, f"page {page}: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            self._page_times.append(now)
+            if len(self._page_times) > 10000:
+                del self._page_times[:5000]
+        with job.changed:
+            if job.status == "failed":
+                return
+            job.completed.append((page, text))
+            job.changed.notify_all()
+            all_done = len(job.completed) == job.pages
+        if all_done:
+            self._finish(job, None)
+
+    def _finish(self, job, error):
+        with job.changed:
+            if job.status in ("done", "failed"):
+                return
+            if job.spooled:
+                # The text is kept in memory; the upload is no longer needed
+                try:
+                    os.unlink(job.pdf_path)
+                except FileNotFoundError:
+                    pass
+            job.status = "failed" if error else "done"
+            job.error = error
+            job.finished_at = time.time()
+            job.started_at = job.started_at or job.finished_at
+            job.changed.notify_all()
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def stats(self, window=60):
+        now = time.time()
+        with self._lock:
+            self._evict()
+            jobs = list(self.jobs.values())
+            recent = sum(1 for finished in self._page_times if finished > now - window)
+            cache_hits = self.cache_hits
+        by_status = {}
+        pages_done = 0
+        for job in jobs:
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+            pages_done += len(job.completed)
+        uptime = now - self.started_at
+        return {
+            "jobs": by_status,
+            "pages_done": pages_done,
+            "pages_per_sec": round(recent / min(window, uptime), 3) if uptime > 0 else 0.0,
+            "cache_hits": cache_hits,
+            "workers": self.max_workers,
+            "uptime": round(uptime, 1),
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._spool is not None:
+            self._spool.cleanup()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "BookScannerOCR/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _job_or_404(self, job_id):
+        job = self.service.get(job_id)
+        if job is None:
+            self._send_json(404, {"error": f"no job {job_id}"})
+        return job
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            self._send_json(400, {"error": "empty request body"})
+            return
+        if length > MAX_UPLOAD_BYTES:
+            self._send_json(413, {"error": f"upload larger than {MAX_UPLOAD_BYTES} bytes"})
+            return
+        body = self.rfile.read(length)
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip()
+        try:
+            if content_type == "application/json":
+                path = json.loads(body).get("path")
+                if not path:
+                    raise ValueError("JSON body needs a 'path'")
+                job, cached = self.service.submit_path(path)
+            elif body.startswith(b"%PDF"):
+                job, cached = self.service.submit_bytes(body)
+            else:
+                raise ValueError("send a PDF (application/pdf) or JSON {\"path\": ...}")
+        except PermissionError as e:
+            self._send_json(403, {"error": str(e)})
+            return
+        except FileNotFoundError as e:
+            self._send_json(404, {"error": f"no such file: {e}"})
+            return
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send_json(422, {"error": f"could not read PDF: {e}"})
+            return
+        payload = job.to_dict()
+        payload.update(cached=cached, status_url=f"/jobs/{job.id}", stream_url=f"/jobs/{job.id}/stream",
+                       text_url=f"/jobs/{job.id}/text")
+        self._send_json(200 if cached else 202, payload)
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/stats":
+            self._send_json(200, self.service.stats())
+            return
+        match = re.fullmatch(r"/jobs/([0-9a-f]+)(/stream|/text)?", path)
+        if not match:
+            self._send_json(404, {"error": "not found"})
+            return
+        job = self._job_or_404(match.group(1))
+        if job is None:
+            return
+        if match.group(2) == "/stream":
+            self._stream(job)
+        elif match.group(2) == "/text":
+            if job.status != "done":
+                self._send_json(409, {"error": f"job is {job.status}"})
+                return
+            body = job.text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(200, job.to_dict())
+
+    def _stream(self, job):
+        """Send finished pages as Server-Sent Events until the job ends or the client leaves"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        sent = 0
+        try:
+            while True:
+                with job.changed:
+                    while len(job.completed) == sent and job.status not in ("done", "failed"):
+                        if not job.changed.wait(timeout=15):
+                            break
+                    new_pages = job.completed[sent:]
+                    status = job.status
+                if not new_pages and status not in ("done", "failed"):
+                    # Comment line keeps proxies and idle timeouts from closing the stream
+                    self.wfile.write(b": keep-alive\n\n")
+                for page, text in new_pages:
+                    data = json.dumps({"page": page, "text": text})
+                    self.wfile.write(f"event: page\ndata: {data}\n\n".encode("utf-8"))
+                sent += len(new_pages)
+                self.wfile.flush()
+                if status in ("done", "failed") and sent == len(job.completed):
+                    data = json.dumps(job.to_dict())
+                    self.wfile.write(f"event: {status}\ndata: {data}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    return
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+
+def make_server(service, host="127.0.0.1", port=DEFAULT_PORT, verbose=False):
+    """Create (but do not start) the HTTP server; port 0 picks a free port"""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT, max_workers=8, spool_dir=None, verbose=False, path_root=None):
+    """Run the service until interrupted"""
+    service = OCRService(max_workers=max_workers, spool_dir=spool_dir, path_root=path_root)
+    server = make_server(service, host, port, verbose)
+    print(f"OCR service listening on http://{host}:{server.server_address[1]} ({max_workers} page workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+        print("OCR service stopped")
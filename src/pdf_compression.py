@@ -0,0 +1,225 @@
+"""
+PDF compression profiles for Book Scanner.
+
+Captured pages are lossless PNG screenshots, which makes a book PDF hundreds of
+MB. The profiles here look at each page and store it in the smallest form that
+keeps the text sharp:
+
+    text   Dark text on a plain background: one 1-bit image, CCITT G4 compressed
+    gray   Text with grayscale pictures: mixed raster content (MRC), a full
+           resolution 1-bit text mask painted over a downsampled JPEG background
+    color  The same with a color JPEG background
+
+Pages are encoded in a process pool, a window of pages at a time, and the PDF is
+assembled with pikepdf, which embeds the G4 and JPEG data as they are.
+"""
+import io
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+# 'lossless' keeps the PNGs (img2pdf); the others classify and re-encode each page
+PROFILES = {
+    'lossless': None,
+    'balanced': {'background_scale': 2, 'jpeg_quality': 60},
+    'smallest': {'background_scale': 3, 'jpeg_quality': 40},
+}
+DEFAULT_PROFILE = 'lossless'
+
+# Resolution assumed for screenshots without DPI information (img2pdf's default)
+DEFAULT_DPI = 96
+
+# Gray level below which a pixel belongs to the text mask
+TEXT_THRESHOLD = 128
+
+# A pixel is colored if its channels differ by more than this
+COLOR_SPREAD = 48
+
+# Share of colored pixels that makes a page 'color'
+COLOR_FRACTION = 0.002
+
+# A tile with this share of mid-gray pixels holds a picture, not text edges
+PICTURE_TILE_FRACTION = 0.35
+TILE_SIZE = 32
+
+
+def classify_page(image):
+    """
+    Decide how a page can be stored.
+
+    Args:
+        image (PIL.Image): The page
+
+    Returns:
+        str: 'text', 'gray' or 'color'
+    """
+    import numpy as np
+
+    rgb = np.asarray(image.convert('RGB'), dtype=np.int16)
+    spread = rgb.max(axis=2) - rgb.min(axis=2)
+    if (spread > COLOR_SPREAD).mean() > COLOR_FRACTION:
+        return 'color'
+
+    # Anti-aliased text only has mid-gray pixels along its edges; pictures fill whole tiles with them
+    gray = np.asarray(image.convert('L'))
+    rows, columns = gray.shape[0] // TILE_SIZE, gray.shape[1] // TILE_SIZE
+    if rows and columns:
+        tiles = gray[:rows * TILE_SIZE, :columns * TILE_SIZE].reshape(rows, TILE_SIZE, columns, TILE_SIZE)
+        midtones = ((tiles > 64) & (tiles < 192)).mean(axis=(1, 3))
+        if (midtones > PICTURE_TILE_FRACTION).any():
+            return 'gray'
+    return 'text'
+
+
+def _text_mask(image):
+    """1-bit image of the page's dark pixels (black) on white"""
+    return image.convert('L').point(lambda value: 255 if value >= TEXT_THRESHOLD else 0).convert('1')
+
+
+def _g4(mask):
+    """CCITT G4 data of a 1-bit image, taken from the single strip of a TIFF"""
+    buffer = io.BytesIO()
+    mask.save(buffer, format='TIFF', compression='group4', strip_size=1 << 30)
+    with Image.open(io.BytesIO(buffer.getvalue())) as tiff:
+        offset, = tiff.tag_v2[273]
+        length, = tiff.tag_v2[279]
+    return buffer.getvalue()[offset:offset + length]
+
+
+def encode_page(image_data, profile):
+    """
+    Encode one page for a compression profile. Runs in the worker processes.
+
+    Args:
+        image_data (bytes): The page image (PNG)
+        profile (str): A key of PROFILES other than 'lossless'
+
+    Returns:
+        dict: kind, size in pixels, dpi, G4 'mask' and, for mixed pages, the JPEG 'background'
+    """
+    settings = PROFILES[profile]
+    with Image.open(io.BytesIO(image_data)) as image:
+        image.load()
+    dpi = image.info.get('dpi', (DEFAULT_DPI, DEFAULT_DPI))[0] or DEFAULT_DPI
+    kind = classify_page(image)
+    page = {'kind': kind, 'width': image.width, 'height': image.height, 'dpi': float(dpi),
+            'mask': _g4(_text_mask(image))}
+    if kind != 'text':
+        scale = settings['background_scale']
+        size = (max(1, image.width // scale), max(1, image.height // scale))
+        background = image.convert('RGB' if kind == 'color' else 'L').resize(size, Image.LANCZOS)
+        buffer = io.BytesIO()
+        background.save(buffer, format='JPEG', quality=settings['jpeg_quality'], optimize=True)
+        page['background'] = buffer.getvalue()
+        page['background_size'] = size
+    return page
+
+
+def _add_page(pdf, page):
+    import pikepdf
+
+    width = page['width'] * 72.0 / page['dpi']
+    height = page['height'] * 72.0 / page['dpi']
+    mask = pikepdf.Stream(pdf, page['mask'])
+    mask.Type = pikepdf.Name.XObject
+    mask.Subtype = pikepdf.Name.Image
+    mask.Width, mask.Height = page['width'], page['height']
+    mask.BitsPerComponent = 1
+    mask.Filter = pikepdf.Name.CCITTFaxDecode
+    # PIL writes 1-bit TIFFs as MinIsBlack, so G4 'black' runs are our white pixels
+    mask.DecodeParms = pikepdf.Dictionary(K=-1, Columns=page['width'], Rows=page['height'], BlackIs1=True)
+    images = pikepdf.Dictionary()
+    content = []
+
+    if page['kind'] == 'text':
+        # A plain 1-bit image: black text, white paper
+        mask.ColorSpace = pikepdf.Name.DeviceGray
+        images.Page = mask
+        content.append(f"q {width:.3f} 0 0 {height:.3f} 0 0 cm /Page Do Q")
+    else:
+        background = pikepdf.Stream(pdf, page['background'])
+        background.Type = pikepdf.Name.XObject
+        background.Subtype = pikepdf.Name.Image
+        background.Width, background.Height = page['background_size']
+        background.BitsPerComponent = 8
+        background.ColorSpace = pikepdf.Name.DeviceRGB if page['kind'] == 'color' else pikepdf.Name.DeviceGray
+        background.Filter = pikepdf.Name.DCTDecode
+        # Stencil mask: its black (0) samples are painted in the fill color, the rest is left alone
+        mask.ImageMask = True
+        images.Background = background
+        images.Text = mask
+        content.append(f"q {width:.3f} 0 0 {height:.3f} 0 0 cm /Background Do Q")
+        content.append(f"q 0 g {width:.3f} 0 0 {height:.3f} 0 0 cm /Text Do Q")
+
+    pdf_page = pikepdf.Page(pikepdf.Dictionary(
+        Type=pikepdf.Name.Page,
+        MediaBox=[0, 0, width, height],
+        Resources=pikepdf.Dictionary(XObject=images),
+        Contents=pikepdf.Stream(pdf, "\n".join(content).encode('ascii')),
+    ))
+    pdf.pages.append(pdf_page)
+
+
+def write_pdf(pages, output_path, profile=DEFAULT_PROFILE, max_workers=None):
+    """
+    Write page images to a PDF using a compression profile.
+
+    Args:
+        pages (iterable): Page images (PNG) as bytes-like objects; read one window at a time
+        output_path (str): PDF to write
+        profile (str): A key of PROFILES
+        max_workers (int, optional): Encoding processes (default: CPU count)
+
+    Returns:
+        dict: profile, pages, input_bytes, bytes (PDF size), seconds, kinds (pages per kind)
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown compression profile {profile!r} (choose from {', '.join(PROFILES)})")
+    start = time.monotonic()
+    input_bytes = 0
+    kinds = Counter()
+
+    if PROFILES[profile] is None:
+        import img2pdf
+
+        data = [bytes(page) for page in pages]
+        input_bytes = sum(len(page) for page in data)
+        kinds['lossless'] = len(data)
+        with open(output_path, 'wb') as f:
+            img2pdf.convert(data, outputstream=f)
+    else:
+        import pikepdf
+
+        max_workers = max_workers or os.cpu_count() or 1
+        pdf = pikepdf.new()
+        window = deque()
+
+        def add_next():
+            page = window.popleft().result()
+            kinds[page['kind']] += 1
+            _add_page(pdf, page)
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for page in pages:
+                data = bytes(page)
+                input_bytes += len(data)
+                window.append(executor.submit(encode_page, data, profile))
+                if len(window) >= max_workers * 2:
+                    add_next()
+            while window:
+                add_next()
+        temp_path = output_path + ".tmp"
+        pdf.save(temp_path)
+        os.replace(temp_path, output_path)
+
+    return {
+        'profile': profile,
+        'pages': sum(kinds.values()),
+        'input_bytes': input_bytes,
+        'bytes': os.path.getsize(output_path),
+        'seconds': time.monotonic() - start,
+        'kinds': dict(kinds),
+    }
@@ -0,0 +1,323 @@
+"""
+Searchable PDF output for Book Scanner.
+
+Adds an invisible text layer, positioned from the word boxes of the Vision API's
+fullTextAnnotation, to the image-only PDFs the capture writes. The page images
+are kept as they are: pikepdf copies their streams to the output without decoding
+or re-encoding them, and each page only gains a small text content stream.
+
+The text uses a Type0 font with Identity-H encoding and a ToUnicode map (text
+render mode 3, so nothing is drawn). Like Tesseract's text layer, the font is a
+tiny embedded TrueType font whose only glyph has no outline, so viewers never
+substitute a system font. Any Unicode text in the Basic Multilingual Plane,
+including Korean and CJK, can be searched, selected and extracted.
+"""
+import io
+import os
+import struct
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Width of every glyph in the text layer font, in 1/1000 of the font size
+_GLYPH_WIDTH = 500
+
+# Vision detectedBreak types that mean a space after the word
+_SPACE_BREAKS = {1, 2, 3, "SPACE", "SURE_SPACE", "EOL_SURE_SPACE"}
+_LINE_BREAKS = {5, "LINE_BREAK"}
+
+
+def _get(data, camel, snake):
+    """Field from Vision JSON output (camelCase) or proto-plus to_dict() output (snake_case)"""
+    value = data.get(camel)
+    return data.get(snake) if value is None else value
+
+
+def _box(bounding_box, width, height):
+    """Normalized (x0, y0, x1, y1) of a boundingBox, top-left origin"""
+    vertices = _get(bounding_box, "normalizedVertices", "normalized_vertices") or []
+    scale_x = scale_y = 1.0
+    if not vertices:
+        vertices = bounding_box.get("vertices") or []
+        if not vertices or not width or not height:
+            return None
+        scale_x, scale_y = 1.0 / width, 1.0 / height
+    xs = [vertex.get("x", 0) * scale_x for vertex in vertices]
+    ys = [vertex.get("y", 0) * scale_y for vertex in vertices]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def page_words(annotation):
+    """
+    Words of one page's fullTextAnnotation.
+
+    Args:
+        annotation (dict): fullTextAnnotation of a single page (JSON or to_dict() form)
+
+    Returns:
+        list: (text, x0, y0, x1, y1) with coordinates normalized to 0-1 from the top-left;
+              text ends with ' ' or '\\n' where Vision detected a break after the word
+    """
+    words = []
+    for page in (annotation or {}).get("pages", []):
+        width, height = page.get("width"), page.get("height")
+        for block in page.get("blocks", []):
+            for paragraph in block.get("paragraphs", []):
+                for word in paragraph.get("words", []):
+                    symbols = word.get("symbols", [])
+                    text = "".join(symbol.get("text", "") for symbol in symbols)
+                    box = _box(_get(word, "boundingBox", "bounding_box") or {}, width, height)
+                    if not text or box is None:
+                        continue
+                    detected = _get(symbols[-1].get("property") or {}, "detectedBreak", "detected_break") or {}
+                    kind = detected.get("type") if "type" in detected else detected.get("type_")
+                    if kind in _SPACE_BREAKS:
+                        text += " "
+                    elif kind in _LINE_BREAKS:
+                        text += "\n"
+                    words.append((text,) + box)
+    return words
+
+
+def _encode(text):
+    """UTF-16 code units as CIDs; characters outside the BMP become U+FFFD"""
+    return "".join(f"{ord(char):04X}" if ord(char) <= 0xFFFF else "FFFD" for char in text)
+
+
+def text_layer_content(words, page_width, page_height, left=0.0, bottom=0.0):
+    """
+    Content stream drawing words invisibly over a page.
+
+    Args:
+        words (list): (text, x0, y0, x1, y1) from page_words()
+        page_width, page_height (float): Page size in points
+        left, bottom (float): MediaBox origin
+
+    Returns:
+        bytes: The content stream
+    """
+    parts = [b"q BT 3 Tr"]
+    for text, x0, y0, x1, y1 in words:
+        size = (y1 - y0) * page_height
+        visible = text.rstrip()
+        if size <= 0 or not visible:
+            continue
+        natural_width = len(visible) * _GLYPH_WIDTH / 1000.0 * size
+        scale = 100.0 * (x1 - x0) * page_width / natural_width
+        x = left + x0 * page_width
+        # Baseline a little above the bottom of the box, where descenders end
+        y = bottom + (1.0 - y1) * page_height + size * 0.15
+        parts.append(f"/BSText {size:.2f} Tf {scale:.2f} Tz 1 0 0 1 {x:.2f} {y:.2f} Tm <{_encode(text)}> Tj"
+                     .encode("ascii"))
+    parts.append(b"ET Q")
+    return b"\n".join(parts)
+
+
+def _to_unicode_cmap():
+    """Identity ToUnicode map for two-byte codes, in bfrange blocks of at most 100 entries"""
+    lines = [
+        "/CIDInit /ProcSet findresource begin", "12 dict begin", "begincmap",
+        "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+        "/CMapName /Adobe-Identity-UCS def", "/CMapType 2 def",
+        "1 begincodespacerange", "<0000> <FFFF>", "endcodespacerange",
+    ]
+    ranges = [f"<{high:02X}00> <{high:02X}FF> <{high:02X}00>" for high in range(256) if not 0xD8 <= high <= 0xDF]
+    for start in range(0, len(ranges), 100):
+        chunk = ranges[start:start + 100]
+        lines.append(f"{len(chunk)} beginbfrange")
+        lines.extend(chunk)
+        lines.append("endbfrange")
+    lines += ["endcmap", "CMapName currentdict /CMap defineresource pop", "end", "end"]
+    return "\n".join(lines).encode("ascii")
+
+
+def _checksum(data):
+    data += b"\0" * (-len(data) % 4)
+    return sum(struct.unpack(f">{len(data) // 4}I", data)) & 0xFFFFFFFF
+
+
+def glyphless_font():
+    """
+    TrueType font with units of 1000 per em and two glyphs, .notdef and a blank glyph
+    _GLYPH_WIDTH wide, neither with an outline. It maps no characters itself: the PDF
+    maps every CID to the blank glyph.
+
+    Returns:
+        bytes: The font file
+    """
+    name = "GlyphLessFont"
+    names = [(1, name), (2, "Regular"), (4, name), (6, name)]
+    strings = b"".join(text.encode("utf-16-be") for _, text in names)
+    records = b""
+    offset = 0
+    for name_id, text in names:
+        length = len(text.encode("utf-16-be"))
+        records += struct.pack(">6H", 3, 1, 0x409, name_id, length, offset)
+        offset += length
+    tables = {
+        b"OS/2": struct.pack(">HhHHH11h10s4I4sHHHhhhHH2IhhHHH", 4, _GLYPH_WIDTH, 400, 5, 0,
+                             650, 700, 0, 140, 650, 700, 0, 480, 50, 250, 0, b"\0" * 10, 0, 0, 0, 0,
+                             b"    ", 0x40, 0x20, 0xFFFF, 1000, 0, 0, 1000, 0, 1, 0, 0, 1000, 0, 0x20, 0),
+        # Windows Unicode cmap with only the required final segment: no character has a glyph
+        b"cmap": struct.pack(">HHHHI", 0, 1, 3, 1, 12) + struct.pack(">12H", 4, 24, 0, 2, 2, 0, 0,
+                                                                       0xFFFF, 0, 0xFFFF, 1, 0),
+        b"glyf": b"",
+        b"head": struct.pack(">IIIIHHqqhhhhHHhhh", 0x00010000, 0x00010000, 0, 0x5F0F3CF5, 0x000B, 1000,
+                             0, 0, 0, 0, _GLYPH_WIDTH, 1000, 0, 3, 2, 0, 0),
+        b"hhea": struct.pack(">Ihhh H hhh hhh hhhh h H".replace(" ", ""), 0x00010000, 1000, 0, 0, _GLYPH_WIDTH,
+                             0, 0, _GLYPH_WIDTH, 1, 0, 0, 0, 0, 0, 0, 0, 2),
+        b"hmtx": struct.pack(">HhHh", _GLYPH_WIDTH, 0, _GLYPH_WIDTH, 0),
+        b"loca": struct.pack(">3H", 0, 0, 0),
+        b"maxp": struct.pack(">I14H", 0x00010000, 2, 0, 0, 0, 0, 2, 0, 0, 0, 0, 0, 0, 0, 0),
+        b"name": struct.pack(">3H", 0, len(names), 6 + len(records)) + records + strings,
+        b"post": struct.pack(">IihhIIIII", 0x00030000, 0, -100, 50, 1, 0, 0, 0, 0),
+    }
+    count = len(tables)
+    search_range = 16 * 2 ** (count.bit_length() - 1)
+    directory = struct.pack(">IHHHH", 0x00010000, count, search_range, count.bit_length() - 1,
+                            count * 16 - search_range)
+    offset = len(directory) + 16 * count
+    data = b""
+    for tag in sorted(tables):
+        table = tables[tag]
+        directory += struct.pack(">4sIII", tag, _checksum(table), offset + len(data), len(table))
+        data += table + b"\0" * (-len(table) % 4)
+    font = bytearray(directory + data)
+    # checkSumAdjustment makes the whole file sum to the magic number
+    head = offset + data.index(tables[b"head"])
+    struct.pack_into(">I", font, head + 8, (0xB1B0AFBA - _checksum(bytes(font))) & 0xFFFFFFFF)
+    return bytes(font)
+
+
+def _text_layer_font(pdf):
+    """Type0 font shared by every page's text layer, with the glyphless font embedded"""
+    import pikepdf
+
+    font_file = glyphless_font()
+    font_stream = pdf.make_stream(zlib.compress(font_file), Filter=pikepdf.Name.FlateDecode,
+                                  Length1=len(font_file))
+    # Every CID (the text's UTF-16 code units) is drawn with glyph 1, the blank glyph
+    gid_map = pdf.make_stream(zlib.compress(b"\0\1" * 65536), Filter=pikepdf.Name.FlateDecode)
+    descriptor = pdf.make_indirect(pikepdf.Dictionary(
+        Type=pikepdf.Name.FontDescriptor, FontName=pikepdf.Name.GlyphLessFont, Flags=5,
+        FontBBox=[0, 0, _GLYPH_WIDTH, 1000], ItalicAngle=0, Ascent=1000, Descent=0,
+        CapHeight=1000, StemV=80, FontFile2=font_stream))
+    cid_font = pikepdf.Dictionary(
+        Type=pikepdf.Name.Font, Subtype=pikepdf.Name.CIDFontType2, BaseFont=pikepdf.Name.GlyphLessFont,
+        CIDSystemInfo=pikepdf.Dictionary(Registry=pikepdf.String("Adobe"), Ordering=pikepdf.String("Identity"),
+                                         Supplement=0),
+        FontDescriptor=descriptor, DW=_GLYPH_WIDTH, CIDToGIDMap=gid_map)
+    return pdf.make_indirect(pikepdf.Dictionary(
+        Type=pikepdf.Name.Font, Subtype=pikepdf.Name.Type0, BaseFont=pikepdf.Name.GlyphLessFont,
+        Encoding=pikepdf.Name("/Identity-H"), DescendantFonts=[pdf.make_indirect(cid_font)],
+        ToUnicode=pdf.make_stream(_to_unicode_cmap())))
+
+
+def _add_layer(pdf, page, words, font):
+    import pikepdf
+
+    if not words:
+        return
+    left, bottom, right, top = [float(value) for value in page.mediabox]
+    content = text_layer_content(words, right - left, top - bottom, left, bottom)
+    resources = page.obj.get("/Resources")
+    if resources is None:
+        page.obj.Resources = resources = pikepdf.Dictionary()
+    if "/Font" not in resources:
+        resources.Font = pikepdf.Dictionary()
+    resources.Font.BSText = font
+    page.contents_add(pdf.make_stream(content), prepend=False)
+
+
+def _save_atomic(pdf, output_path):
+    temp_path = output_path + ".tmp"
+    pdf.save(temp_path)
+    os.replace(temp_path, output_path)
+
+
+def add_text_layer(pdf_path, words_by_page, output_path=None):
+    """
+    Write a searchable copy of an image PDF using word boxes that are already known.
+
+    Args:
+        pdf_path (str): Image PDF (e.g. from the capture)
+        words_by_page (dict): Page number (1-based) -> page_words() list
+        output_path (str, optional): Output PDF (default: replace pdf_path)
+
+    Returns:
+        str: The output path
+    """
+    import pikepdf
+
+    output_path = output_path or pdf_path
+    with pikepdf.open(pdf_path) as pdf:
+        font = _text_layer_font(pdf)
+        for page_number, page in enumerate(pdf.pages, start=1):
+            _add_layer(pdf, page, words_by_page.get(page_number), font)
+        _save_atomic(pdf, output_path)
+    return output_path
+
+
+def page_image_bytes(pdf_path, page, page_number):
+    """The page's image as PNG bytes, decoded from its single image stream when it has one"""
+    import pikepdf
+
+    resources = page.obj.get("/Resources") or pikepdf.Dictionary()
+    xobjects = list(resources.get("/XObject", pikepdf.Dictionary()).values())
+    # Pages with stencil masks (e.g. mixed raster pages) need rendering, not just their image
+    if len(xobjects) == 1 and xobjects[0].get("/Subtype") == pikepdf.Name.Image:
+        image = pikepdf.PdfImage(xobjects[0]).as_pil_image()
+    else:
+        from pdf2image import convert_from_path
+        image = convert_from_path(pdf_path, first_page=page_number, last_page=page_number)[0]
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_searchable(pdf_path, output_path=None, text_path=None, max_workers=8, detect_layout=None):
+    """
+    OCR an image PDF once and write both a searchable PDF and the text file.
+
+    Pages are read, OCRed and given their text layer a window of max_workers at a
+    time, so only that many page images are in memory at once.
+
+    Args:
+        pdf_path (str): Image PDF
+        output_path (str, optional): Searchable PDF (default: replace pdf_path)
+        text_path (str, optional): Text file (default: '<pdf_path>.txt')
+        max_workers (int): Pages OCRed at the same time
+        detect_layout (callable, optional): detect_layout(image_bytes) -> fullTextAnnotation dict;
+            defaults to google_vision_ocr.detect_document_layout
+
+    Returns:
+        tuple: (output_path, text_path)
+    """
+    import pikepdf
+
+    if detect_layout is None:
+        from google_vision_ocr import detect_document_layout as detect_layout
+
+    output_path = output_path or pdf_path
+    text_path = text_path or f"{pdf_path}.txt"
+    lock = threading.Lock()
+    with pikepdf.open(pdf_path) as pdf, open(text_path + ".part", "w", encoding="utf-8") as text_file:
+        font = _text_layer_font(pdf)
+        pages = list(pdf.pages)
+
+        def ocr(page_number):
+            with lock:
+                # pikepdf objects are not thread-safe; only the API call runs in parallel
+                image_data = page_image_bytes(pdf_path, pages[page_number - 1], page_number)
+            return detect_layout(image_data)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for start in range(1, len(pages) + 1, max_workers):
+                numbers = range(start, min(start + max_workers, len(pages) + 1))
+                for page_number, annotation in zip(numbers, executor.map(ocr, numbers)):
+                    text_file.write(annotation.get("text", ""))
+                    with lock:
+                        _add_layer(pdf, pages[page_number - 1], page_words(annotation), font)
+        _save_atomic(pdf, output_path)
+    os.replace(text_path + ".part", text_path)
+    return output_path, text_path
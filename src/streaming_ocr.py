@@ -0,0 +1,200 @@
+"""
+Streaming OCR for Book Scanner.
+
+OCRs pages while the capture is still running: each saved page is queued at once,
+at most `window` pages are at the Vision API at a time, and the text file is
+appended in page order as results come back. When the last page is turned only
+the last few pages are still in flight, so the text is ready seconds later instead
+of after a full OCR pass over the finished PDF.
+"""
+import io
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+# Pages sent to the Vision API at the same time
+DEFAULT_WINDOW = 8
+
+# Extra attempts for a page whose OCR call fails
+DEFAULT_RETRIES = 2
+
+
+def _ocr_image(image_data, page_number):
+    """Default page OCR: the same preprocessing and API call as process_pdf()"""
+    from google_vision_ocr import process_page
+
+    with Image.open(io.BytesIO(image_data)) as image:
+        return process_page(image.convert('RGB'), page_number)
+
+
+def _ocr_image_layout(image_data, page_number):
+    """Page OCR that also keeps the word boxes, for a searchable PDF"""
+    from google_vision_ocr import detect_document_layout
+    from searchable_pdf import page_words
+
+    annotation = detect_document_layout(image_data)
+    return page_number, annotation.get("text", ""), page_words(annotation)
+
+
+class StreamingOCR:
+    """
+    OCRs pages as they are submitted and writes their text in page order.
+
+    Pages are submitted as loader callables, so a page waiting for a free slot
+    costs no memory: its image is only read when it is sent. The text goes to
+    '<output_path>.part' and is renamed to output_path when close() succeeds.
+    """
+
+    def __init__(self, output_path, window=DEFAULT_WINDOW, retries=DEFAULT_RETRIES, ocr_image=None,
+                 layout=False, log=None):
+        """
+        Args:
+            output_path (str): Text file to write
+            window (int): Pages OCRed at the same time
+            retries (int): Extra attempts for a page whose OCR fails
+            ocr_image (callable, optional): ocr_image(image_bytes, page_number) -> (page_number, text),
+                or (page_number, text, words) to collect word boxes in self.words
+            layout (bool): With the default ocr_image, also collect word boxes for a searchable PDF
+            log (callable, optional): log(message)
+        """
+        self.output_path = output_path
+        self.window = window
+        self.retries = retries
+        self.ocr_image = ocr_image or (_ocr_image_layout if layout else _ocr_image)
+        self.log = log or (lambda message, *args, **kwargs: None)
+
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        self._part_path = output_path + ".part"
+        self._file = open(self._part_path, 'w', encoding='utf-8')
+        self._executor = ThreadPoolExecutor(max_workers=window, thread_name_prefix="stream-ocr")
+        self._lock = threading.Lock()
+        self._all_written = threading.Condition(self._lock)
+        self._waiting = deque()
+        self._in_flight = 0
+        self._results = {}
+        self._next_page = 1
+        self.submitted = 0
+        self.skipped = 0
+        self.written = 0
+        self.failed = []
+        # Page number -> word boxes, when ocr_image returns them
+        self.words = {}
+        self.peak_in_flight = 0
+        self.last_submit_time = None
+        self._closed = False
+
+    def submit(self, page_number, load):
+        """
+        Queue a page. Pages must be numbered 1, 2, 3... in submission order.
+
+        Args:
+            page_number (int): Page number in the book (1-based)
+            load (callable): Returns the page image as bytes when the page is sent
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("StreamingOCR is closed")
+            self.submitted += 1
+            self.last_submit_time = time.monotonic()
+            self._waiting.append((page_number, load))
+            self._dispatch()
+
+    def skip(self, page_number, text=""):
+        """
+        Write text for a page without OCRing it (e.g. a blank page), in page order.
+
+        Args:
+            page_number (int): Page number in the book, numbered like submit()
+            text (str): Text written in the page's place
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("StreamingOCR is closed")
+            self.submitted += 1
+            self.skipped += 1
+            self._results[page_number] = text
+            self._write_ready()
+
+    def _dispatch(self):
+        # Called with the lock held
+        while self._waiting and self._in_flight < self.window:
+            page_number, load = self._waiting.popleft()
+            self._in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self._in_flight)
+            self._executor.submit(self._run, page_number, load)
+
+    def _run(self, page_number, load):
+        text = ""
+        words = None
+        for attempt in range(self.retries + 1):
+            try:
+                result = self.ocr_image(load(), page_number)
+                text = result[1]
+                words = result[2] if len(result) > 2 else None
+                break
+            except Exception as e:
+                if attempt == self.retries:
+                    self.log(f"OCR failed for page {page_number}: {e}")
+                    with self._lock:
+                        self.failed.append(page_number)
+                    text = ""
+        with self._lock:
+            self._in_flight -= 1
+            self._results[page_number] = text
+            if words is not None:
+                self.words[page_number] = words
+            self._write_ready()
+            self._dispatch()
+
+    def _write_ready(self):
+        # Called with the lock held: append every page that is next in order
+        while self._next_page in self._results:
+            self._file.write(self._results.pop(self._next_page))
+            self._next_page += 1
+            self.written += 1
+        self._file.flush()
+        if self.written == self.submitted:
+            self._all_written.notify_all()
+
+    def pending(self):
+        """Pages submitted but not yet written"""
+        with self._lock:
+            return self.submitted - self.written
+
+    def close(self, timeout=None):
+        """
+        Wait for every submitted page and publish the text file.
+
+        Returns:
+            str: output_path
+
+        Raises:
+            TimeoutError: Pages were still in flight after timeout seconds
+        """
+        with self._lock:
+            self._closed = True
+            if not self._all_written.wait_for(lambda: self.written == self.submitted, timeout):
+                raise TimeoutError(f"{self.submitted - self.written} pages still being OCRed")
+            self._file.close()
+        self._executor.shutdown()
+        os.replace(self._part_path, self.output_path)
+        if self.last_submit_time is not None:
+            self.log(f"Streaming OCR finished {time.monotonic() - self.last_submit_time:.1f}s after the last page "
+                     f"({self.written} pages, up to {self.peak_in_flight} in flight)")
+        return self.output_path
+
+    def abort(self):
+        """Drop queued pages and remove the partial text file"""
+        with self._lock:
+            self._closed = True
+            self._waiting.clear()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+        if os.path.exists(self._part_path):
+            os.unlink(self._part_path)
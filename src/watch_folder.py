@@ -0,0 +1,325 @@
+"""
+Watch-folder OCR for Book Scanner.
+
+Watches a folder (e.g. a share that scanning stations drop PDFs into) and OCRs
+new or changed PDFs as they arrive. A manifest keyed by content hash records what
+has been processed, so restarts and rescans skip finished files without re-OCR.
+
+    python run_book_scanner.py watch /srv/scans --output-dir /srv/text
+"""
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import select
+import struct
+import tempfile
+import threading
+import time
+
+MANIFEST_NAME = ".book_scanner_manifest.json"
+
+# Seconds a file's size and mtime must stay unchanged before it is processed
+DEFAULT_SETTLE_SECONDS = 2.0
+
+# Seconds between folder scans when no change notifications arrive
+DEFAULT_POLL_INTERVAL = 5.0
+
+# Seconds before a failed file is retried; doubles with every failed attempt up to RETRY_MAX_SECONDS
+RETRY_BASE_SECONDS = 60.0
+RETRY_MAX_SECONDS = 6 * 3600.0
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Content hash used as the manifest key"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    Processed-file records, saved atomically after every change.
+
+    'files' maps content hash to the outcome; 'paths' maps each seen path to the
+    size/mtime signature it had when hashed, so unchanged files are skipped with a
+    dictionary lookup and no hashing. Failed files keep their attempt count and the
+    time of their next retry, which backs off exponentially.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+        self.paths = {}
+        self.dirty = False
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.paths = data.get("paths", {})
+
+    def known_hash(self, path, size, mtime_ns):
+        """Content hash recorded for path if the file has not changed since, else None"""
+        entry = self.paths.get(path)
+        if entry and entry["size"] == size and entry["mtime_ns"] == mtime_ns:
+            return entry["sha256"]
+        return None
+
+    def is_done(self, sha256):
+        """True if content with this hash was processed successfully"""
+        return self.files.get(sha256, {}).get("status") == "done"
+
+    def is_due(self, sha256, now=None):
+        """True if content with this hash needs OCR: never tried, or failed and due for a retry"""
+        entry = self.files.get(sha256)
+        if entry is None:
+            return True
+        if entry["status"] == "done":
+            return False
+        return (time.time() if now is None else now) >= entry.get("retry_at", 0)
+
+    def remember_path(self, path, size, mtime_ns, sha256):
+        entry = {"size": size, "mtime_ns": mtime_ns, "sha256": sha256}
+        if self.paths.get(path) != entry:
+            self.paths[path] = entry
+            self.dirty = True
+
+    def record(self, sha256, path, output_file, now=None):
+        now = time.time() if now is None else now
+        entry = {
+            "path": path,
+            "output": output_file,
+            "status": "done" if output_file else "failed",
+            "processed_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(now)),
+        }
+        if not output_file:
+            # A network or quota error should not skip the file for good
+            attempts = self.files.get(sha256, {}).get("attempts", 0) + 1
+            entry["attempts"] = attempts
+            entry["retry_at"] = now + min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+        self.files[sha256] = entry
+        self.dirty = True
+
+    def save(self):
+        """Write to a temporary file and rename it, so a crash never leaves a torn manifest"""
+        folder = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix=".manifest-", dir=folder)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"version": 1, "files": self.files, "paths": self.paths}, f, indent=1)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+            self.dirty = False
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+class _Inotify:
+    """Minimal Linux inotify wrapper through ctypes; used only to wake the scan loop early"""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    _EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {folder}")
+
+    def wait(self, timeout):
+        """Block until a change arrives or timeout seconds pass; returns the changed names"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        names = []
+        offset = 0
+        while offset + self._EVENT_HEADER.size <= len(data):
+            _, _, _, length = self._EVENT_HEADER.unpack_from(data, offset)
+            start = offset + self._EVENT_HEADER.size
+            names.append(os.fsdecode(data[start:start + length].rstrip(b"\0")))
+            offset = start + length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+    Scans a folder for PDFs and OCRs the ones the manifest has not seen.
+
+    Change notifications (inotify on Linux) only wake the loop early; every pass
+    rescans the folder with stat(), so missed events and network shares without
+    notifications are handled by the polling interval.
+    """
+
+    def __init__(self, input_folder, output_folder, manifest_path=None, poll_interval=DEFAULT_POLL_INTERVAL,
+                 settle_seconds=DEFAULT_SETTLE_SECONDS, max_workers=8, use_inotify=True, process_files=None):
+        """
+        Args:
+            input_folder (str): Folder to watch for PDF files
+            output_folder (str): Folder where '<name>.pdf.txt' files are written
+            manifest_path (str, optional): Manifest file (default: in output_folder)
+            poll_interval (float): Seconds between scans without notifications
+            settle_seconds (float): Seconds a file must stay unchanged before it is processed
+            max_workers (int): Pages OCRed at the same time across a batch of files
+            use_inotify (bool): Use inotify when available instead of polling only
+            process_files (callable, optional): process_files(paths, output_folder, max_workers,
+                on_file_done) -> {path: output or None}; defaults to batch_process_pdfs
+        """
+        self.input_folder = os.path.abspath(input_folder)
+        self.output_folder = os.path.abspath(output_folder)
+        os.makedirs(self.output_folder, exist_ok=True)
+        self.manifest = Manifest(manifest_path or os.path.join(self.output_folder, MANIFEST_NAME))
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.max_workers = max_workers
+        self.process_files = process_files
+        self._stop = threading.Event()
+        # path -> ((size, mtime_ns), first time this signature was seen)
+        self._pending = {}
+
+        self._inotify = None
+        if use_inotify:
+            try:
+                self._inotify = _Inotify(self.input_folder)
+            except (OSError, AttributeError) as e:
+                print(f"Change notifications unavailable ({e}), polling every {poll_interval:g}s")
+
+    @property
+    def mode(self):
+        return "inotify" if self._inotify else "polling"
+
+    def stop(self):
+        """Finish the current batch, then return from run() (safe to call from signal handlers)"""
+        self._stop.set()
+
+    def scan(self, now=None):
+        """
+        Look for new or changed PDFs.
+
+        Returns:
+            list: (path, sha256) for files that are ready and not processed yet
+        """
+        now = time.monotonic() if now is None else now
+        ready = []
+        seen = set()
+        with os.scandir(self.input_folder) as entries:
+            for entry in entries:
+                if not entry.name.lower().endswith(".pdf") or entry.name.startswith(".") or not entry.is_file():
+                    continue
+                path = entry.path
+                seen.add(path)
+                stat = entry.stat()
+                signature = (stat.st_size, stat.st_mtime_ns)
+
+                known = self.manifest.known_hash(path, *signature)
+                if known is not None and not self.manifest.is_due(known):
+                    continue
+
+                # Wait until the writer has finished: same size and mtime for settle_seconds
+                previous = self._pending.get(path)
+                if previous is None or previous[0] != signature:
+                    self._pending[path] = (signature, now)
+                    if self.settle_seconds > 0:
+                        continue
+                elif now - previous[1] < self.settle_seconds:
+                    continue
+                del self._pending[path]
+
+                sha256 = known or file_sha256(path)
+                self.manifest.remember_path(path, *signature, sha256)
+                if not self.manifest.is_due(sha256):
+                    # Same content under another name, touched without changes, or waiting for a retry
+                    continue
+                ready.append((path, sha256))
+
+        for path in list(self._pending):
+            if path not in seen:
+                del self._pending[path]
+        return ready
+
+    def process(self, ready):
+        """OCR the ready files as one batch, saving the manifest as each file finishes"""
+        if not ready:
+            return {}
+        process_files = self.process_files
+        if process_files is None:
+            from google_vision_ocr import batch_process_pdfs as process_files
+
+        hashes = dict(ready)
+        recorded = set()
+        lock = threading.Lock()
+
+        def on_file_done(path, output_file):
+            with lock:
+                self.manifest.record(hashes[path], path, output_file)
+                self.manifest.save()
+                recorded.add(path)
+
+        print(f"Processing {len(ready)} new or changed PDF(s)")
+        results = process_files([path for path, _ in ready], self.output_folder,
+                                max_workers=self.max_workers, on_file_done=on_file_done)
+        # Files the batch could not even open never reach on_file_done
+        with lock:
+            for path, output_file in results.items():
+                if path not in recorded:
+                    self.manifest.record(hashes[path], path, output_file)
+            self.manifest.save()
+        return results
+
+    def _next_wait(self):
+        if not self._pending:
+            return self.poll_interval
+        oldest = min(first_seen for _, first_seen in self._pending.values())
+        return max(0.1, min(self.poll_interval, oldest + self.settle_seconds - time.monotonic()))
+
+    def _wait(self, seconds):
+        """Sleep until the next scan is due, a change notification arrives or stop() is called"""
+        if not self._inotify:
+            self._stop.wait(seconds)
+            return
+        deadline = time.monotonic() + seconds
+        while not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            # Short waits so stop() is noticed within a second
+            if self._inotify.wait(min(remaining, 1.0)):
+                return
+
+    def run(self):
+        """Scan and process until stop() is called"""
+        print(f"Watching {self.input_folder} ({self.mode}), writing text to {self.output_folder}")
+        try:
+            while not self._stop.is_set():
+                ready = self.scan()
+                if ready:
+                    self.process(ready)
+                    continue
+                if self.manifest.dirty:
+                    self.manifest.save()
+                self._wait(self._next_wait())
+        finally:
+            if self._inotify:
+                self._inotify.close()
+                self._inotify = None
+        print("Watcher stopped")
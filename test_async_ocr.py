@@ -2,6 +2,9 @@
 """
 Test script for async document OCR with Google Cloud Storage.
 This script tests the async document detection functionality.
+
+Set BOOK_SCANNER_LOCAL_GCS=/some/dir to run it offline against the local
+Cloud Storage stand-in (src/local_gcs.py) instead of the real bucket.
 """
 
 import os
@@ -81,6 +84,11 @@ def check_prerequisites():
     """Check if all prerequisites are met."""
     print("Checking prerequisites...")
     
+    local_root = os.environ.get('BOOK_SCANNER_LOCAL_GCS')
+    if local_root:
+        print(f"✓ Using local Cloud Storage stand-in: {local_root}")
+        return True
+    
     # Check if google-cloud-storage is installed
     try:
         from google.cloud import storage
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test script for multi-file batch OCR with a shared worker budget
+Page OCR is replaced by a timed stand-in, so no API calls or poppler are needed
+"""
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import img2pdf
+from PIL import Image
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+import google_vision_ocr
+
+
+def create_pdf(path, page_count):
+    pages = []
+    for _ in range(page_count):
+        buffer = io.BytesIO()
+        Image.new('L', (60, 80), 255).save(buffer, format='PNG')
+        pages.append(buffer.getvalue())
+    with open(path, 'wb') as f:
+        f.write(img2pdf.convert(pages))
+    return path
+
+
+class TimedPageOCR:
+    """Stands in for _ocr_pdf_page; records call order and peak concurrency"""
+    def __init__(self, seconds_per_page=0.01, fail_page=None):
+        self.seconds_per_page = seconds_per_page
+        self.fail_page = fail_page
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, pdf_path, page_number):
+        with self.lock:
+            self.calls.append((os.path.basename(pdf_path), page_number))
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.seconds_per_page)
+            if (os.path.basename(pdf_path), page_number) == self.fail_page:
+                raise RuntimeError("quota exceeded")
+            return page_number, f"{os.path.basename(pdf_path)} page {page_number}\n"
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def run_batch(page_counts, fake, max_workers=4):
+    original = google_vision_ocr._ocr_pdf_page
+    google_vision_ocr._ocr_pdf_page = fake
+    done = []
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            paths = [create_pdf(os.path.join(folder, f"{name}.pdf"), pages) for name, pages in page_counts]
+            output_folder = os.path.join(folder, "out")
+            results = google_vision_ocr.batch_process_pdfs(
+                paths, output_folder, max_workers=max_workers,
+                on_file_done=lambda path, output: done.append(os.path.basename(path)))
+            texts = {}
+            for path, output in results.items():
+                if output:
+                    with open(output, encoding='utf-8') as f:
+                        texts[os.path.basename(path)] = f.read()
+                else:
+                    texts[os.path.basename(path)] = None
+            return texts, done
+    finally:
+        google_vision_ocr._ocr_pdf_page = original
+
+
+def test_shared_budget_largest_first():
+    """Pages of all files share one pool, the largest file starts first, each file is written whole"""
+    fake = TimedPageOCR()
+    texts, done = run_batch([("small", 2), ("large", 12), ("medium", 5)], fake, max_workers=4)
+
+    assert fake.calls[0][0] == "large.pdf"
+    assert fake.peak == 4
+    assert sorted(done) == ["large.pdf", "medium.pdf", "small.pdf"]
+    assert texts["medium.pdf"] == "".join(f"medium.pdf page {n}\n" for n in range(1, 6))
+    assert texts["large.pdf"].count("\n") == 12
+    print("✓ 19 pages from 3 files shared 4 workers, largest file first")
+
+
+def test_failed_page_fails_only_its_file():
+    """A failing page marks its own file as failed; the other files are still written"""
+    fake = TimedPageOCR(fail_page=("bad.pdf", 1))
+    texts, done = run_batch([("bad", 6), ("good", 3)], fake, max_workers=1)
+    assert texts["bad.pdf"] is None
+    assert texts["good.pdf"].count("\n") == 3
+    # Only the failing page of bad.pdf was sent
+    assert [call for call in fake.calls if call[0] == "bad.pdf"] == [("bad.pdf", 1)]
+    print("✓ A failed page stops only its own file")
+
+
+if __name__ == "__main__":
+    test_shared_budget_largest_first()
+    test_failed_page_fails_only_its_file()
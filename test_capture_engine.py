@@ -0,0 +1,662 @@
+#!/usr/bin/env python3
+"""
+Test script for the GUI-independent capture engine and CLI
+Uses a fake screen, so no display, pyautogui or Tk window is needed
+"""
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
+
+from capture_engine import CaptureEngine, load_profile
+from capture_options import OutputOptions, PageOptions
+from capture_session import CaptureSession, SessionLockedError, SessionMismatchError, find_sessions
+from multi_capture import MultiCapture
+import cli
+
+
+class FakeScreen:
+    """Shows a list of page images; clicking the next button moves to the next one"""
+    def __init__(self, page_count, next_button_pos=(950, 650)):
+        self.pages = []
+        for i in range(page_count):
+            image = Image.new('RGB', (200, 300), 'white')
+            ImageDraw.Draw(image).text((20, 20), f"Page {i + 1}", fill='black')
+            self.pages.append(image)
+        self.next_button_pos = next_button_pos
+        self.current = 0
+        self.clicks = 0
+
+    def screenshot(self, region):
+        # The reader stays on its last page, like a real book
+        return self.pages[min(self.current, len(self.pages) - 1)].copy()
+
+    def click(self, position):
+        self.clicks += 1
+        # The first click only focuses the reader
+        if self.clicks > 1 and position == self.next_button_pos:
+            self.current += 1
+
+
+class SpreadScreen(FakeScreen):
+    """A reader showing two-page spreads: frame i holds pages 2i+1 and 2i+2"""
+    def __init__(self, spread_count, next_button_pos=(950, 650)):
+        super().__init__(0, next_button_pos)
+        for i in range(spread_count):
+            image = Image.new('RGB', (400, 300), 'white')
+            draw = ImageDraw.Draw(image)
+            draw.text((20, 20), f"Page {2 * i + 1}", fill='black')
+            draw.text((240, 20), f"Page {2 * i + 2}", fill='black')
+            self.pages.append(image)
+
+
+class ScrollScreen:
+    """A continuous-scroll reader: a long document seen through a window that scrolls 37 px per step"""
+    def __init__(self, height=2400, window=(300, 200), step_pixels=37):
+        words = "the quick brown fox jumps over a lazy dog while lorem ipsum dolor sit amet".split()
+        rng = random.Random(3)
+        self.document = Image.new('RGB', (window[0], height), 'white')
+        draw = ImageDraw.Draw(self.document)
+        for y in range(10, height - 20, 18):
+            draw.text((10, y), " ".join(rng.choice(words) for _ in range(rng.randint(3, 6))), fill='black')
+        self.window = window
+        self.step_pixels = step_pixels
+        self.offset = 0
+        self.next_button_pos = None
+
+    def screenshot(self, region):
+        width, height = self.window
+        return self.document.crop((0, self.offset, width, self.offset + height))
+
+    def click(self, position):
+        pass
+
+    def scroll(self, position, amount):
+        self.offset = min(self.offset + amount * self.step_pixels, self.document.height - self.window[1])
+
+
+class StallingScreen(FakeScreen):
+    """A reader that loses the focus on one page and ignores its next button on another"""
+    def __init__(self, page_count, lose_focus_at, button_stuck_at):
+        super().__init__(page_count)
+        self.lose_focus_at = lose_focus_at
+        self.button_stuck_at = button_stuck_at
+        self.focused = True
+
+    def click(self, position):
+        self.clicks += 1
+        if position != self.next_button_pos:
+            self.focused = True
+        elif self.clicks > 1 and self.focused and self.current != self.button_stuck_at:
+            self.current += 1
+            self.focused = self.current != self.lose_focus_at
+
+    def press(self, key):
+        if self.focused and key == 'pagedown':
+            self.current += 1
+
+
+class ToolbarScreen(FakeScreen):
+    """A reader that shows or hides its toolbar, a band across the top of the page, when the page is clicked"""
+    def __init__(self, page_count, page_box=(100, 100, 300, 400)):
+        super().__init__(page_count)
+        self.page_box = page_box
+        self.toolbar = False
+        self.focus_clicks = []
+
+    def screenshot(self, region):
+        frame = super().screenshot(region)
+        if self.toolbar:
+            ImageDraw.Draw(frame).rectangle((0, 0, 199, 24), fill='gray')
+        return frame
+
+    def click(self, position):
+        super().click(position)
+        if position != self.next_button_pos:
+            self.focus_clicks.append(position)
+            left, top, right, bottom = self.page_box
+            if left <= position[0] < right and top <= position[1] < bottom:
+                self.toolbar = not self.toolbar
+
+    def press(self, key):
+        pass
+
+
+class ClockScreen(FakeScreen):
+    """A reader with a clock in its status bar that ticks on every screenshot"""
+    def __init__(self, page_count):
+        super().__init__(page_count)
+        self.ticks = 0
+
+    def screenshot(self, region):
+        frame = super().screenshot(region)
+        self.ticks += 1
+        ImageDraw.Draw(frame).text((150, 280), f"{self.ticks % 60:02d}", fill='black')
+        return frame
+
+
+class RenderingScreen(FakeScreen):
+    """A reader that needs render_time seconds after a click before the next page shows"""
+    def __init__(self, page_count, next_button_pos, render_time):
+        super().__init__(page_count, next_button_pos)
+        self.render_time = render_time
+        self.clicked_at = 0.0
+        self.early_screenshots = 0
+
+    def screenshot(self, region):
+        if time.monotonic() - self.clicked_at < self.render_time:
+            self.early_screenshots += 1
+        return super().screenshot(region)
+
+    def click(self, position):
+        super().click(position)
+        self.clicked_at = time.monotonic()
+
+
+class BlankScreen(FakeScreen):
+    """A book full of text except for a few blank pages (a speck of dust on each)"""
+    def __init__(self, page_count, blank=(3, 6)):
+        super().__init__(page_count)
+        for number, image in enumerate(self.pages, start=1):
+            draw = ImageDraw.Draw(image)
+            if number in blank:
+                draw.rectangle((0, 0, 199, 299), fill='white')
+                draw.point((number * 10, 290), fill='black')
+            else:
+                for line in range(12):
+                    draw.text((20, 40 + line * 20), "lorem ipsum dolor sit", fill='black')
+
+
+def make_engine(screen, total_pages, output_dir, base_filename="book", **kwargs):
+    return CaptureEngine((100, 100), (300, 400), screen.next_button_pos, total_pages,
+                         base_location=output_dir, base_filename=base_filename, screen=screen,
+                         start_delay=0, click_delay=0, page_delay=0, click_sound=False, **kwargs)
+
+
+def test_engine_stops_at_end_of_book():
+    """Pages past the end of the book are detected as duplicates and not saved"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        engine = make_engine(FakeScreen(5), total_pages=20, output_dir=output_dir)
+        events = list(engine.run_iter())
+        kinds = [event['type'] for event in events]
+        assert kinds == ['page_saved'] * 5 + ['duplicate'] * 3 + ['end_of_book']
+        assert len(engine.images) == 5
+
+        pdf_path = engine.save_pdf()
+        assert pdf_path == os.path.join(output_dir, "book.pdf")
+        assert os.path.getsize(pdf_path) > 0
+    print("✓ Engine captured 5 pages and stopped at the end of the book")
+
+
+def test_engine_stop_and_callbacks():
+    """stop() ends the loop before the next page; progress goes through the callback"""
+    progress = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        engine = make_engine(FakeScreen(10), total_pages=10, output_dir=output_dir, on_progress=progress.append)
+        for event in engine.run_iter():
+            if event['type'] == 'page_saved' and event['page'] == 3:
+                engine.stop()
+        assert event['type'] == 'stopped'
+        assert len(engine.images) == 3
+        assert progress == [0.0, 5.0, 10.0]
+
+        result = make_engine(FakeScreen(3), total_pages=3, output_dir=output_dir).run(ocr=False)
+        assert result['pages'] == 3 and not result['stopped']
+        assert result['pdf_path'].endswith("book.pdf") and result['text_path'] is None
+    print("✓ Engine stops on request and reports progress")
+
+
+def test_stopped_capture_resumes():
+    """A stopped capture continues from its session after the last saved page"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        screen = FakeScreen(8)
+        engine = make_engine(screen, total_pages=8, output_dir=output_dir)
+        for event in engine.run_iter():
+            if event['type'] == 'page_saved' and event['page'] == 3:
+                engine.stop()
+        assert event['type'] == 'stopped'
+
+        # Simulate a crash while the next manifest line was being written
+        with open(os.path.join(engine.session.path, "manifest.jsonl"), 'a') as f:
+            f.write('{"index": 3, "file": "pages/pa')
+        (session,) = find_sessions(output_dir)
+        assert session.next_index == 3 and session.status == 'capturing'
+
+        # The reader moved on in the meantime: resuming must refuse rather than skip pages
+        screen.current = 5
+        try:
+            CaptureEngine.from_session(session, screen=screen, start_delay=0, click_delay=0, page_delay=0,
+                                       click_sound=False).run(ocr=False)
+            assert False, "resumed on the wrong page"
+        except SessionMismatchError:
+            pass
+
+        screen.current = 2
+        resumed = CaptureEngine.from_session(CaptureSession.open(session.path), screen=screen, start_delay=0,
+                                             click_delay=0, page_delay=0, click_sound=False)
+        result = resumed.run(ocr=False)
+        assert result['pages'] == 8 and result['pdf_path'] == os.path.join(output_dir, "book.pdf")
+        assert [record['index'] for record in resumed.session.pages] == list(range(8))
+        assert find_sessions(output_dir) == []
+    print("✓ Stopped capture resumed from its session after a torn manifest line")
+
+
+def test_page_store_budget_and_cleanup():
+    """Pages share one container file; the budget stops capture and verified outputs remove the session"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        screen = FakeScreen(6)
+        buffer = io.BytesIO()
+        screen.pages[0].save(buffer, format='PNG')
+        page_size = buffer.tell()
+
+        # Room for three pages: capture stops resumably at the fourth
+        engine = make_engine(screen, total_pages=6, output_dir=output_dir,
+                             output_options=OutputOptions(disk_budget=page_size * 3 + page_size // 2))
+        result = engine.run(ocr=False)
+        assert result['stopped'] and result['stop_reason'] == "disk_budget" and result['pages'] == 3
+        session = engine.session
+        assert set(os.listdir(session.path)) == {"session.json", "manifest.jsonl", "pages.bin", "session.lock"}
+        offsets = [record['offset'] for record in session.pages]
+        assert offsets[0] == 0 and offsets == sorted(offsets)
+
+        # Page bytes with no manifest line (crash between the two writes) are ignored when
+        # listing and dropped once the session is locked to resume
+        with open(session.container_path, 'ab') as f:
+            f.write(b"\x89PNG half a page")
+        reopened = CaptureSession.open(session.path)
+        assert reopened.size() == session.size() < os.path.getsize(session.container_path)
+        reopened.lock()
+        assert os.path.getsize(session.container_path) == reopened.size()
+
+        reopened.settings['disk_budget'] = None
+        resumed = CaptureEngine.from_session(reopened, screen=screen, start_delay=0, click_delay=0,
+                                             page_delay=0, click_sound=False)
+        result = resumed.run(ocr=False)
+        assert result['pages'] == 6 and os.path.exists(result['pdf_path'])
+        assert not os.path.exists(session.path)
+    print("✓ Page store stopped at its budget, resumed and was removed after the PDF was verified")
+
+
+def test_listing_leaves_a_running_capture_alone():
+    """Listing sessions while a capture writes never cuts its files; resuming it is refused until it stops"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        screen = FakeScreen(6)
+        engine = make_engine(screen, total_pages=6, output_dir=output_dir,
+                             output_options=OutputOptions(keep_session=True))
+        capture = engine.run_iter()
+        next(capture)
+        next(capture)
+
+        # The capture is between writing a page's bytes and its manifest line
+        manifest = os.path.join(engine.session.path, "manifest.jsonl")
+        with open(engine.session.container_path, 'ab') as f:
+            f.write(b"\x89PNG page in flight")
+        with open(manifest, 'a') as f:
+            f.write('{"index": 2, "file": "pag')
+        sizes = os.path.getsize(engine.session.container_path), os.path.getsize(manifest)
+
+        (listed,) = find_sessions(output_dir)
+        assert len(listed.pages) == 2
+        assert (os.path.getsize(engine.session.container_path), os.path.getsize(manifest)) == sizes
+        try:
+            CaptureEngine.from_session(listed, screen=screen)
+            assert False, "resumed a session another capture is writing"
+        except SessionLockedError:
+            pass
+        assert (os.path.getsize(engine.session.container_path), os.path.getsize(manifest)) == sizes
+
+        # Once the capture stops, the session can be resumed and is repaired
+        engine.stop()
+        assert list(capture)[-1]['type'] == 'stopped'
+        resumed = CaptureEngine.from_session(CaptureSession.open(listed.path), screen=screen, start_delay=0,
+                                             click_delay=0, page_delay=0, click_sound=False,
+                                             output_options=OutputOptions(keep_session=True))
+        assert len(resumed.session.pages) == 2
+        assert os.path.getsize(engine.session.container_path) == resumed.session.size()
+        resumed.session.close()
+    print("✓ Listing left a running capture alone; resuming waited for it to stop")
+
+
+def test_streaming_ocr_during_capture():
+    """With stream_ocr, pages are OCRed from the page store during capture and the text is in page order"""
+    def fake_ocr(image_data, page_number):
+        assert image_data[:8] == b"\x89PNG\r\n\x1a\n"
+        time.sleep(0.02)
+        return page_number, f"page {page_number}\n"
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        engine = make_engine(FakeScreen(12), total_pages=12, output_dir=output_dir,
+                             output_options=OutputOptions(stream_ocr=True, ocr_window=3, ocr_image=fake_ocr))
+        result = engine.run(ocr=True)
+        with open(result['text_path'], encoding='utf-8') as f:
+            assert f.read() == "".join(f"page {page}\n" for page in range(1, 13))
+        assert result['text_path'] == result['pdf_path'] + ".txt"
+        assert not os.path.exists(result['session'])
+    print("✓ Streaming OCR finished with the capture, text in page order")
+
+
+def test_compressed_pdf():
+    """A compression profile stores the text-only pages as 1-bit G4 images"""
+    import pikepdf
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        engine = make_engine(FakeScreen(3), total_pages=3, output_dir=output_dir,
+                             output_options=OutputOptions(compression="balanced"))
+        list(engine.run_iter())
+        pdf_path = engine.save_pdf()
+        with pikepdf.open(pdf_path) as pdf:
+            assert len(pdf.pages) == 3
+            assert all(page.obj.Resources.XObject.Page.Filter == "/CCITTFaxDecode" for page in pdf.pages)
+    print("✓ Compressed PDF written with bilevel pages")
+
+
+def test_trimmed_pages_resume_with_same_box():
+    """Trimmed pages keep one box across the book, including after a resume"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        screen = FakeScreen(6)
+        engine = make_engine(screen, total_pages=6, output_dir=output_dir,
+                             page_options=PageOptions(trim_margins=True),
+                             output_options=OutputOptions(keep_session=True))
+        for event in engine.run_iter():
+            if event['type'] == 'page_saved' and event['page'] == 3:
+                engine.stop()
+        box = engine.session.settings['trim_box']
+
+        screen.current = 2
+        (session,) = find_sessions(output_dir)
+        resumed = CaptureEngine.from_session(session, screen=screen, start_delay=0, click_delay=0, page_delay=0,
+                                             click_sound=False,
+                                             output_options=OutputOptions(keep_session=True))
+        result = resumed.run(ocr=False)
+        assert resumed.page_options.trim_margins and resumed.trims['trim_box'].box == tuple(box)
+        assert result['pages'] == 6 and result['pixels_kept'] < 0.5
+        with resumed.session.page_buffers() as buffers:
+            sizes = {Image.open(io.BytesIO(buffer.read_bytes())).size for buffer in buffers}
+        assert sizes == {(box[2] - box[0], box[3] - box[1])}
+    print(f"✓ Trimmed pages kept {result['pixels_kept']:.0%} of the pixels with one box across a resume")
+
+
+def test_trimmed_pages_padded_to_final_box():
+    """Pages trimmed before the box grew are padded to the final box, so every PDF page has one size"""
+    import pikepdf
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        screen = FakeScreen(5)
+        ImageDraw.Draw(screen.pages[3]).text((20, 260), "Footnote", fill='black')
+        engine = make_engine(screen, total_pages=5, output_dir=output_dir,
+                             page_options=PageOptions(trim_margins=True),
+                             output_options=OutputOptions(keep_session=True))
+        result = engine.run(ocr=False)
+        box = engine.session.settings['trim_box']
+        assert engine.images[0]['trim_box'] != box and engine.images[-1]['trim_box'] == box
+
+        with engine.session.page_buffers() as buffers:
+            pages = [Image.open(io.BytesIO(buffer.read_bytes())).convert('RGB') for buffer in buffers]
+        # Content stays where it was on screen: each page is its frame cut to the final box
+        assert [page.tobytes() for page in pages] == [frame.crop(box).tobytes() for frame in screen.pages]
+        with pikepdf.open(result['pdf_path']) as pdf:
+            assert len({tuple(page.mediabox) for page in pdf.pages}) == 1
+    print("✓ Pages trimmed before the box grew were padded to the final box")
+
+
+def test_spread_pages_split_and_resume():
+    """Each spread is saved as two pages; a stop between its halves resumes with the right page"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        screen = SpreadScreen(4)
+        engine = make_engine(screen, total_pages=4, output_dir=output_dir, page_options=PageOptions(spread=True),
+                             output_options=OutputOptions(keep_session=True))
+        for event in engine.run_iter():
+            if event['type'] == 'page_saved' and event['page'] == 2:
+                assert event['saved'] == 2
+                engine.stop()
+
+        # Crash after the left page of the second spread was saved
+        manifest = os.path.join(engine.session.path, "manifest.jsonl")
+        with open(manifest) as f:
+            lines = f.readlines()
+        with open(manifest, 'w') as f:
+            f.writelines(lines[:-1])
+        screen.current = 1
+
+        (session,) = find_sessions(output_dir)
+        resumed = CaptureEngine.from_session(session, screen=screen, start_delay=0, click_delay=0, page_delay=0,
+                                             click_sound=False)
+        result = resumed.run(ocr=False)
+        assert resumed.page_options.spread and result['pages'] == 8
+        assert [(record['index'], record['half']) for record in resumed.session.pages] == \
+            [(index, half) for index in range(4) for half in ('left', 'right')]
+        assert screen.clicks == 4
+    print("✓ Spreads saved as two pages each and resumed between halves")
+
+
+def test_scroll_and_stitch():
+    """Scroll mode stitches the frames back into the document and cuts it into pages"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        screen = ScrollScreen()
+        engine = make_engine(screen, total_pages=200, output_dir=output_dir,
+                             page_options=PageOptions(scroll_amount=3, page_height=500),
+                             output_options=OutputOptions(keep_session=True))
+        # session.json is rewritten when pages are cut and on stop, not for every scrolled frame
+        marks = []
+        mark = CaptureSession.mark
+        CaptureSession.mark = lambda session, status, **extra: (marks.append(extra), mark(session, status, **extra))
+        try:
+            frames = 0
+            for event in engine.run_iter():
+                frames += 1
+                if event['type'] == 'page_saved' and len(engine.images) == 2:
+                    engine.stop()
+        finally:
+            CaptureSession.mark = mark
+        assert event['type'] == 'stopped'
+        assert len([extra for extra in marks if 'last_frame' in extra]) == 2 < frames
+
+        (session,) = find_sessions(output_dir)
+        resumed = CaptureEngine.from_session(session, screen=screen, start_delay=0, click_delay=0, page_delay=0,
+                                             click_sound=False,
+                                             output_options=OutputOptions(keep_session=True))
+        resumed.run(ocr=False)
+        with resumed.session.page_buffers() as buffers:
+            pages = [Image.open(io.BytesIO(buffer.read_bytes())).convert('RGB') for buffer in buffers]
+        assert all(page.height <= 500 for page in pages)
+
+        # The pages put back together are the whole document, without gaps or repeats
+        strip = Image.new('RGB', (300, sum(page.height for page in pages)))
+        y = 0
+        for page in pages:
+            strip.paste(page, (0, y))
+            y += page.height
+        assert strip.tobytes() == screen.document.tobytes()
+    print(f"✓ Scrolled document stitched into {len(pages)} pages across a resume")
+
+
+def test_watchdog_recovers_stalled_reader():
+    """A stalled reader is recovered instead of ending the capture; the real end of the book still ends it"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        engine = make_engine(StallingScreen(10, lose_focus_at=3, button_stuck_at=6), total_pages=40,
+                             output_dir=output_dir)
+        engine.run(ocr=False)
+        assert len(engine.images) == 4
+
+        engine = make_engine(StallingScreen(10, lose_focus_at=3, button_stuck_at=6), total_pages=40,
+                             output_dir=output_dir, page_options=PageOptions(watchdog=True))
+        events = list(engine.run_iter())
+        assert len(engine.images) == 10
+        assert [event['action'] for event in events if event['type'] == 'recovered'] == ['refocus', 'page_down']
+        assert events[-1]['type'] == 'end_of_book'
+        result = engine.complete(False, 1.0, ocr=False)
+        assert [recovery['page'] for recovery in result['recoveries']] == [8, 15]
+        assert result['seconds_lost'] >= 0
+    print(f"✓ Watchdog recovered the reader by {', '.join(r['action'] for r in result['recoveries'])}")
+
+
+def test_watchdog_ignores_reader_ui_changes():
+    """A refocus click that only toggles the reader's toolbar is no recovery; the end of the book still ends the run"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        # The refocus click lands outside the capture area, where it toggles nothing
+        screen = ToolbarScreen(5)
+        engine = make_engine(screen, total_pages=40, output_dir=output_dir, page_options=PageOptions(watchdog=True))
+        events = list(engine.run_iter())
+        assert events[-1]['type'] == 'end_of_book' and len(engine.images) == 5
+        assert not [event for event in events if event['type'] == 'recovered']
+        assert screen.focus_clicks and all(not 100 <= x < 300 for x, y in screen.focus_clicks)
+        engine.cancel_streaming()
+
+        # Clicked in the margin beside the content region, the toolbar shows, but outside the compared part
+        screen = ToolbarScreen(5)
+        engine = make_engine(screen, total_pages=40, output_dir=output_dir, base_filename="roi",
+                             page_options=PageOptions(watchdog=True, compare_roi=(20, 25, 180, 300)))
+        events = list(engine.run_iter())
+        assert screen.toolbar and 100 <= screen.focus_clicks[0][0] < 120
+        assert events[-1]['type'] == 'end_of_book' and len(engine.images) == 5
+        assert not [event for event in events if event['type'] == 'recovered']
+    print("✓ Watchdog clicked beside the page and did not count a toolbar toggle as a recovery")
+
+
+def test_masked_fingerprints_find_end_of_book():
+    """Reader UI that changes on its own is left out of the fingerprints, set in the profile or learned"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        engine = make_engine(ClockScreen(5), total_pages=12, output_dir=output_dir)
+        assert [event['type'] for event in engine.run_iter()].count('end_of_book') == 0
+        assert len(engine.images) == 12
+        engine.cancel_streaming()
+
+        engine = make_engine(ClockScreen(5), total_pages=12, output_dir=output_dir, base_filename="masked",
+                             page_options=PageOptions(compare_ignore=[(140, 270, 200, 300)]))
+        assert list(engine.run_iter())[-1]['type'] == 'end_of_book' and len(engine.images) == 5
+
+        screen = ClockScreen(5)
+        engine = make_engine(screen, total_pages=12, output_dir=output_dir, base_filename="learned",
+                             page_options=PageOptions(learn_mask=True),
+                             output_options=OutputOptions(keep_session=True))
+        for event in engine.run_iter():
+            if event['type'] == 'page_saved' and event['page'] == 3:
+                engine.stop()
+        (box,) = engine.session.settings['compare_ignore']
+        assert box[0] <= 150 < box[2] and box[1] <= 280 < box[3] and (box[2] - box[0]) * (box[3] - box[1]) < 3000
+
+        # The resume check and the fingerprints use the learned mask, although the clock moved on
+        session = CaptureSession.open(engine.session.path)
+        resumed = CaptureEngine.from_session(session, screen=screen, start_delay=0, click_delay=0, page_delay=0,
+                                             click_sound=False)
+        assert list(resumed.run_iter())[-1]['type'] == 'end_of_book' and len(resumed.images) == 5
+    print(f"✓ Masked fingerprints ignore the reader clock (learned box {box})")
+
+
+def test_blank_pages_skip_ocr():
+    """Blank pages are not OCRed but keep their number in the text; placeholder and drop shrink the book"""
+    import pikepdf
+
+    calls = []
+
+    def fake_ocr(image_data, page_number):
+        calls.append(page_number)
+        return page_number, f"page {page_number}\n"
+
+    expected = "".join("[Page %d: blank page]\n\n" % page if page in (3, 6) else f"page {page}\n"
+                       for page in range(1, 8))
+    bytes_saved = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        for policy, pdf_pages in (('skip-ocr', 7), ('placeholder', 7), ('drop', 5)):
+            calls.clear()
+            # Blank pages also skip OCR when the text is made after the PDF
+            engine = make_engine(BlankScreen(7), total_pages=7, output_dir=output_dir, base_filename=policy,
+                                 page_options=PageOptions(blank_pages=policy),
+                                 output_options=OutputOptions(stream_ocr=policy == 'drop', ocr_image=fake_ocr))
+            result = engine.run(ocr=True)
+            assert sorted(calls) == [1, 2, 4, 5, 7]
+            assert result['blank_pages'] == 2 and result['ocr_calls_saved'] == 2
+            with open(result['text_path'], encoding='utf-8') as f:
+                assert f.read() == expected
+            with pikepdf.open(result['pdf_path']) as pdf:
+                assert len(pdf.pages) == pdf_pages
+            assert not os.path.exists(result['session'])
+            bytes_saved[policy] = result['bytes_saved']
+    assert bytes_saved['skip-ocr'] == 0 < bytes_saved['placeholder'] <= bytes_saved['drop']
+    print(f"✓ Blank pages skipped OCR, {bytes_saved['drop']} bytes saved by dropping them")
+
+
+def test_multi_target_interleaves():
+    """Two readers are captured in about the time of one; no page is captured before it has loaded"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        screens = [RenderingScreen(5, (250, 500), 0.3), RenderingScreen(5, (750, 500), 0.3)]
+        engines = [CaptureEngine((0, 0), (400, 400), screens[0].next_button_pos, 5, base_location=output_dir,
+                                 screen=screens[0], start_delay=0, click_delay=0, page_delay=0.3, click_sound=False),
+                   CaptureEngine((500, 0), (900, 400), screens[1].next_button_pos, 5, base_location=output_dir,
+                                 screen=screens[1], start_delay=0, click_delay=0, page_delay=0.3, click_sound=False)]
+        multi = MultiCapture(engines, ["left", "right"], start_delay=0)
+        result = multi.run(ocr=False)
+
+        assert result['pages'] == 10 and not multi.errors
+        # Per reader a 0.5s focus pause and 4 page loads of 0.3s: 2.2s when interleaved, 3.4s one after the other
+        assert result['seconds'] < 2.8, result['seconds']
+        assert all(screen.early_screenshots == 0 for screen in screens)
+        pdf_paths = [result['targets'][name]['pdf_path'] for name in ("left", "right")]
+        assert pdf_paths[0] != pdf_paths[1] and all(os.path.exists(path) for path in pdf_paths)
+
+        overlapping = CaptureEngine((300, 0), (700, 400), (750, 500), 5, base_location=output_dir)
+        try:
+            MultiCapture([engines[0], overlapping])
+            assert False, "overlapping capture areas accepted"
+        except ValueError:
+            pass
+    print(f"✓ Two readers captured interleaved in {result['seconds']:.2f}s")
+
+
+def test_cli_merges_profile_and_arguments():
+    """Command line values override the profile saved by the GUI"""
+    with tempfile.TemporaryDirectory() as folder:
+        profile = os.path.join(folder, "settings.json")
+        with open(profile, 'w') as f:
+            json.dump({"top_left": [10, 20], "bottom_right": [500, 700], "next_button_pos": [600, 300],
+                       "total_pages": "15", "base_location": "", "base_filename": "novel"}, f)
+        assert load_profile(profile)['total_pages'] == 15
+
+        args = cli.build_parser().parse_args(["capture", "--profile", profile, "--pages", "40",
+                                              "--output-dir", folder, "--blank-pages", "drop"])
+        settings = cli._capture_settings(args)
+    assert settings['top_left'] == (10, 20)
+    assert settings['blank_pages'] == "drop"
+    assert settings['total_pages'] == 40
+    assert settings['base_location'] == folder and settings['base_filename'] == "novel"
+    print("✓ CLI merges profile and command line arguments")
+
+
+def test_capture_overhead():
+    """Engine bookkeeping per page (hash, save) with no delays, for benchmarking"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        engine = make_engine(FakeScreen(50), total_pages=50, output_dir=output_dir)
+        start = time.perf_counter()
+        result = engine.run(ocr=False)
+        elapsed = time.perf_counter() - start
+    assert result['pages'] == 50
+    print(f"✓ {result['pages'] / result['seconds']:.0f} pages/s capture loop, {elapsed:.2f}s including PDF")
+
+
+if __name__ == "__main__":
+    test_engine_stops_at_end_of_book()
+    test_engine_stop_and_callbacks()
+    test_stopped_capture_resumes()
+    test_page_store_budget_and_cleanup()
+    test_listing_leaves_a_running_capture_alone()
+    test_streaming_ocr_during_capture()
+    test_compressed_pdf()
+    test_trimmed_pages_resume_with_same_box()
+    test_trimmed_pages_padded_to_final_box()
+    test_spread_pages_split_and_resume()
+    test_scroll_and_stitch()
+    test_watchdog_recovers_stalled_reader()
+    test_watchdog_ignores_reader_ui_changes()
+    test_masked_fingerprints_find_end_of_book()
+    test_blank_pages_skip_ocr()
+    test_multi_target_interleaves()
+    test_cli_merges_profile_and_arguments()
+    test_capture_overhead()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test script for comparison masks (content ROI and ignore boxes for page fingerprints)
+Works on generated frames, so no display is needed
+"""
+import os
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
+
+from capture_engine import calculate_image_hash
+from compare_mask import CompareMask, learn_compare_mask, volatile_boxes
+
+
+def reader_frame(page=1, counter=1, cursor=False):
+    """A reader window: toolbar with a page counter, a white page and a blinking cursor"""
+    frame = Image.new('RGB', (800, 1000), (60, 60, 60))
+    draw = ImageDraw.Draw(frame)
+    draw.text((650, 20), f"{counter} / 300", fill='white')
+    draw.rectangle((100, 80, 700, 960), fill='white')
+    for line in range(25):
+        words = "the quick brown fox jumps" if page % 2 else "lorem ipsum dolor sit amet"
+        draw.text((140 + 9 * page, 120 + line * 30), f"Page {page} line {line}: {words}", fill='black')
+    if cursor:
+        draw.rectangle((400, 500, 402, 520), fill='black')
+    return frame
+
+
+def test_mask_apply():
+    """Ignore boxes hide what changes by itself; the ROI crops the compared part"""
+    mask = CompareMask(ignore=[(600, 0, 800, 60)])
+    assert calculate_image_hash(mask.apply(reader_frame(counter=1))) == \
+        calculate_image_hash(mask.apply(reader_frame(counter=2)))
+    assert calculate_image_hash(mask.apply(reader_frame(page=1))) != \
+        calculate_image_hash(mask.apply(reader_frame(page=2)))
+
+    # No mask leaves the frame alone, so old sessions keep their fingerprints
+    frame = reader_frame()
+    assert CompareMask().apply(frame) is frame
+
+    roi = CompareMask(roi=(100, 80, 700, 960), ignore=[(0, 0, 800, 60), (390, 490, 410, 530)])
+    assert roi.apply(frame).size == (600, 880)
+    assert calculate_image_hash(roi.apply(reader_frame(cursor=True))) == calculate_image_hash(roi.apply(frame))
+    # One page of a spread is the box intersected with the ROI
+    assert roi.apply(frame, (0, 0, 400, 1000)).size == (300, 880)
+    assert roi.settings()['compare_roi'] == [100, 80, 700, 960]
+
+    start = time.perf_counter()
+    for _ in range(20):
+        calculate_image_hash(frame)
+    whole = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(20):
+        calculate_image_hash(roi.apply(frame))
+    masked = time.perf_counter() - start
+    print(f"✓ Masked fingerprints match ({masked / whole:.0%} of the full-frame hashing time)")
+
+
+def test_learn_mask():
+    """The page is learned as the ROI and the ticking counter and cursor as ignore boxes"""
+    frames = iter([reader_frame(counter=1), reader_frame(counter=2, cursor=True), reader_frame(counter=3)])
+    mask, learned = learn_compare_mask(lambda: next(frames), frames=3, interval=0)
+    assert all(abs(found - expected) <= 3 for found, expected in zip(mask.roi, (100, 80, 700, 960))), mask.roi
+    assert len(mask.ignore) == 2, learned
+    assert any(left <= 650 < right and top <= 20 < bottom for left, top, right, bottom in mask.ignore)
+    assert any(left <= 400 < right and top <= 500 < bottom for left, top, right, bottom in mask.ignore)
+
+    # Frames of different pages are not a mask
+    assert volatile_boxes([reader_frame(page=1), reader_frame(page=2)]) is None
+    assert volatile_boxes([reader_frame(), reader_frame()]) == []
+    print(f"✓ Learned {learned}")
+
+
+if __name__ == "__main__":
+    test_mask_apply()
+    test_learn_mask()
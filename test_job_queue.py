@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test script for the page-level lease queue
+Page OCR is replaced by a stand-in, so no API calls, PDFs or poppler are needed
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from job_queue import JobQueue, run_worker
+
+
+def fake_ocr_page(pdf_path, page):
+    time.sleep(0.002)
+    return page, f"{os.path.basename(pdf_path)} page {page}\n"
+
+
+def expected_text(name, pages):
+    return "".join(f"{name} page {page}\n" for page in range(1, pages + 1))
+
+
+def worker_process(db_path, worker_id):
+    run_worker(JobQueue(db_path), worker_id=worker_id, threads=3, ocr_page=fake_ocr_page,
+               exit_when_idle=True, idle_sleep=0.05)
+
+
+def test_pages_reassembled_in_order():
+    """Pages completed out of order are written in page order once the book is done"""
+    with tempfile.TemporaryDirectory() as folder:
+        queue = JobQueue(os.path.join(folder, "queue.sqlite"))
+        book_id = queue.add_book(os.path.join(folder, "book.pdf"), pages=4)
+        jobs = queue.claim("w1", limit=4)
+        assert [page for _, page, _ in jobs] == [1, 2, 3, 4]
+        assert queue.claim("w2", limit=4) == []
+
+        ready = [queue.complete(book_id, page, "w1", f"page {page}\n") for page in (3, 1, 4, 2)]
+        assert ready == [False, False, False, True]
+        output = queue.assemble(book_id)
+        with open(output, encoding='utf-8') as f:
+            assert f.read() == "page 1\npage 2\npage 3\npage 4\n"
+        assert queue.stats()['books'] == {'done': 1}
+    print("✓ Pages reassembled in order")
+
+
+def test_expired_lease_is_retried():
+    """A page held by a stalled worker is claimed again after its lease expires"""
+    with tempfile.TemporaryDirectory() as folder:
+        queue = JobQueue(os.path.join(folder, "queue.sqlite"), lease_seconds=0.1)
+        book_id = queue.add_book(os.path.join(folder, "book.pdf"), pages=1)
+        assert len(queue.claim("stalled")) == 1
+        assert queue.claim("healthy") == []
+        time.sleep(0.15)
+        assert [(b, p) for b, p, _ in queue.claim("healthy")] == [(book_id, 1)]
+
+        # The stalled worker's late result is ignored; the new owner's counts
+        assert not queue.complete(book_id, 1, "stalled", "stale")
+        assert queue.complete(book_id, 1, "healthy", "fresh")
+    print("✓ Expired lease retried by another worker")
+
+
+def test_failing_page_fails_book_after_max_attempts():
+    """A page that keeps failing fails its book, and the book's other pages are skipped"""
+    with tempfile.TemporaryDirectory() as folder:
+        queue = JobQueue(os.path.join(folder, "queue.sqlite"), max_attempts=2)
+        book_id = queue.add_book(os.path.join(folder, "book.pdf"), pages=3)
+        for _ in range(2):
+            (job,) = queue.claim("w1")
+            assert job[1] == 1
+            queue.fail(book_id, 1, "w1", "quota exceeded")
+        stats = queue.stats()
+        assert stats['books'] == {'failed': 1}
+        assert stats['pages'] == {'failed': 1, 'skipped': 2}
+        assert not queue.has_work()
+    print("✓ Book failed after max attempts")
+
+
+def test_slow_page_keeps_its_lease_and_the_pool_busy():
+    """A page slower than the lease is not OCRed twice, and the other threads keep claiming pages"""
+    import threading
+
+    calls = []
+
+    def slow_first_page(pdf_path, page):
+        calls.append(page)
+        time.sleep(1.0 if page == 1 else 0.1)
+        return page, f"page {page}\n"
+
+    with tempfile.TemporaryDirectory() as folder:
+        db_path = os.path.join(folder, "queue.sqlite")
+        JobQueue(db_path).add_book(os.path.join(folder, "book.pdf"), pages=9)
+        start = time.perf_counter()
+        workers = [threading.Thread(target=run_worker, args=(JobQueue(db_path, lease_seconds=0.3),),
+                                    kwargs=dict(worker_id=f"w{i}", threads=2, ocr_page=slow_first_page,
+                                                exit_when_idle=True, idle_sleep=0.05)) for i in range(2)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=30)
+        elapsed = time.perf_counter() - start
+        with open(os.path.join(folder, "book.pdf.txt"), encoding='utf-8') as f:
+            assert f.read() == "".join(f"page {page}\n" for page in range(1, 10))
+    assert sorted(calls) == list(range(1, 10))
+    # The slow page runs alongside the other eight instead of holding up a whole batch
+    assert elapsed < 1.3, elapsed
+    print(f"✓ Slow page kept its lease, book done in {elapsed:.2f}s")
+
+
+def test_worker_processes_share_the_queue():
+    """Several worker processes drain the queue; every page is OCRed exactly once"""
+    with tempfile.TemporaryDirectory() as folder:
+        db_path = os.path.join(folder, "queue.sqlite")
+        queue = JobQueue(db_path)
+        books = {f"book{i}.pdf": 10 + i * 7 for i in range(4)}
+        for name, pages in books.items():
+            queue.add_book(os.path.join(folder, name), pages=pages)
+
+        processes = [multiprocessing.Process(target=worker_process, args=(db_path, f"w{i}")) for i in range(3)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=60)
+            assert process.exitcode == 0
+
+        stats = queue.stats()
+        assert stats['pages'] == {'done': sum(books.values())}
+        assert stats['books'] == {'done': len(books)}
+        for name, pages in books.items():
+            with open(os.path.join(folder, name + ".txt"), encoding='utf-8') as f:
+                assert f.read() == expected_text(name, pages)
+    print(f"✓ 3 worker processes completed {sum(books.values())} pages")
+
+
+if __name__ == "__main__":
+    test_pages_reassembled_in_order()
+    test_expired_lease_is_retried()
+    test_failing_page_fails_book_after_max_attempts()
+    test_slow_page_keeps_its_lease_and_the_pool_busy()
+    test_worker_processes_share_the_queue()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Test script for the async GCS OCR path against the local Cloud Storage stand-in.
+Runs offline - no bucket or credentials needed.
+"""
+import io
+import os
+import re
+import sys
+import tempfile
+
+import img2pdf
+from PIL import Image
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+import google_vision_ocr
+import local_gcs
+
+
+def create_pdf(path, page_count):
+    """Create a PDF with one small image per page"""
+    pages = []
+    for i in range(page_count):
+        buffer = io.BytesIO()
+        Image.new('RGB', (60, 80), (i % 256, 255 - i % 256, 128)).save(buffer, format='PNG')
+        pages.append(buffer.getvalue())
+    with open(path, 'wb') as f:
+        f.write(img2pdf.convert(pages))
+    return path
+
+
+def test_storage_round_trip():
+    """Uploads, lists, downloads and deletes objects"""
+    with tempfile.TemporaryDirectory() as root:
+        client = local_gcs.LocalStorageClient(root)
+        bucket = client.get_bucket("test-bucket")
+        bucket.blob("a/2.txt").upload_from_string("two")
+        bucket.blob("a/10.txt").upload_from_string("ten")
+        bucket.blob("b/1.txt").upload_from_string("one")
+
+        assert [blob.name for blob in bucket.list_blobs(prefix="a/")] == ["a/10.txt", "a/2.txt"]
+        assert bucket.blob("a/2.txt").download_as_bytes() == b"two"
+
+        blob = bucket.get_blob("b/1.txt")
+        assert blob.size == 3 and blob.md5_hash
+
+        blob.delete()
+        assert bucket.get_blob("b/1.txt") is None
+    print("✓ Storage round trip")
+
+
+def test_async_detect_document_reads_pages_in_order():
+    """The fake operation writes output shards that merge back in page order"""
+    with tempfile.TemporaryDirectory() as root:
+        local_gcs.use_local_backend(root)
+        try:
+            pdf_path = create_pdf(os.path.join(root, "book.pdf"), 12)
+            text = google_vision_ocr.upload_to_gcs_and_process(pdf_path, "test-bucket", pages_per_shard=None)
+        finally:
+            google_vision_ocr.set_clients()
+
+    page_numbers = [int(number) for number in re.findall(r" page (\d+)\n", text)]
+    assert page_numbers == list(range(1, 13))
+    print("✓ Async output merged in page order")
+
+
+def test_sharded_upload_is_skipped_when_present():
+    """Re-processing the same PDF reuses the content-hash named shards"""
+    with tempfile.TemporaryDirectory() as root:
+        storage_client, _ = local_gcs.use_local_backend(root)
+        try:
+            pdf_path = create_pdf(os.path.join(root, "book.pdf"), 25)
+            first = google_vision_ocr.upload_to_gcs_and_process(pdf_path, "test-bucket", pages_per_shard=10)
+            sources = storage_client.bucket("test-bucket").list_blobs(prefix="ocr_source/")
+            generations = {blob.name: blob.generation for blob in sources}
+
+            second = google_vision_ocr.upload_to_gcs_and_process(pdf_path, "test-bucket", pages_per_shard=10)
+            sources = storage_client.bucket("test-bucket").list_blobs(prefix="ocr_source/")
+        finally:
+            google_vision_ocr.set_clients()
+
+    assert len(generations) == 3
+    assert {blob.name: blob.generation for blob in sources} == generations
+    assert first.count("\n") == second.count("\n")
+    print("✓ Sharded sources reused on the second run")
+
+
+def test_reused_source_survives_prune():
+    """A source uploaded before the retention window but reused by this run is not pruned by it"""
+    import datetime
+    import json
+
+    with tempfile.TemporaryDirectory() as root:
+        storage_client, _ = local_gcs.use_local_backend(root)
+        bucket = storage_client.bucket("test-bucket")
+        try:
+            pdf_path = create_pdf(os.path.join(root, "book.pdf"), 3)
+            google_vision_ocr.upload_to_gcs_and_process(pdf_path, "test-bucket", pages_per_shard=None)
+            (source,) = bucket.list_blobs(prefix="ocr_source/")
+            with open(source._meta_path) as f:
+                meta = json.load(f)
+            old = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=30)
+            meta["updated"] = old.isoformat()
+            with open(source._meta_path, 'w') as f:
+                json.dump(meta, f)
+
+            google_vision_ocr.upload_to_gcs_and_process(pdf_path, "test-bucket", pages_per_shard=None)
+            (reused,) = bucket.list_blobs(prefix="ocr_source/")
+            assert reused.generation == source.generation and reused.custom_time > old
+
+            # Unused for longer than the retention window, it is pruned
+            assert google_vision_ocr.prune_source_blobs("test-bucket", retention_days=-1) == 1
+        finally:
+            google_vision_ocr.set_clients()
+    print("✓ Reused source kept by the prune at the end of its run")
+
+
+def test_failed_sharded_run_keeps_sources():
+    """A sharded run deletes its output whether it fails or not; its shard sources stay for the retry"""
+    def flaky_text(source_name, page_number):
+        if page_number == 4:
+            raise RuntimeError("quota exceeded")
+        return local_gcs.default_page_text(source_name, page_number)
+
+    with tempfile.TemporaryDirectory() as root:
+        storage_client, vision_client = local_gcs.use_local_backend(root)
+        bucket = storage_client.bucket("test-bucket")
+        try:
+            pdf_path = create_pdf(os.path.join(root, "book.pdf"), 25)
+            google_vision_ocr.async_detect_document_sharded(pdf_path, "test-bucket", pages_per_shard=10)
+            sources = {blob.name: blob.generation for blob in bucket.list_blobs(prefix="ocr_source/")}
+            assert len(sources) == 3
+            assert bucket.list_blobs(prefix="ocr_output/") == []
+
+            vision_client.text_for_page = flaky_text
+            try:
+                google_vision_ocr.async_detect_document_sharded(pdf_path, "test-bucket", pages_per_shard=10)
+                assert False, "the failed operation should raise"
+            except RuntimeError:
+                pass
+            assert bucket.list_blobs(prefix="ocr_output/") == []
+            assert {blob.name: blob.generation for blob in bucket.list_blobs(prefix="ocr_source/")} == sources
+
+            # The retry reuses every shard instead of uploading it again
+            vision_client.text_for_page = local_gcs.default_page_text
+            google_vision_ocr.async_detect_document_sharded(pdf_path, "test-bucket", pages_per_shard=10)
+            assert {blob.name: blob.generation for blob in bucket.list_blobs(prefix="ocr_source/")} == sources
+        finally:
+            google_vision_ocr.set_clients()
+    print("✓ Failed sharded run cleaned up its output and kept its shards for the retry")
+
+
+def test_async_batch_writes_every_book():
+    """Multi-book batches produce one text file per PDF"""
+    with tempfile.TemporaryDirectory() as root:
+        local_gcs.use_local_backend(root)
+        try:
+            pdfs = [create_pdf(os.path.join(root, f"book{i}.pdf"), pages) for i, pages in enumerate((3, 30, 7))]
+            output_folder = os.path.join(root, "text")
+            results = google_vision_ocr.async_batch_process_pdfs(
+                pdfs, "test-bucket", output_folder, pages_per_shard=10, max_pages_per_call=15, poll_interval=0.01)
+            contents = {path: open(output, encoding='utf-8').read() for path, output in results.items()}
+        finally:
+            google_vision_ocr.set_clients()
+
+    assert set(contents) == set(pdfs)
+    assert len(re.findall(r" page (\d+)\n", contents[pdfs[1]])) == 30
+    print("✓ Async batch wrote every book")
+
+
+def test_async_batch_survives_bad_books():
+    """A corrupt PDF or a failed upload fails only its own book; the batch leaves no output behind"""
+    upload = google_vision_ocr._upload_source_blob
+
+    def flaky_upload(bucket, path, **kwargs):
+        if os.path.basename(path).startswith("unlucky"):
+            raise RuntimeError("upload reset")
+        return upload(bucket, path, **kwargs)
+
+    with tempfile.TemporaryDirectory() as root:
+        storage_client, _ = local_gcs.use_local_backend(root)
+        google_vision_ocr._upload_source_blob = flaky_upload
+        try:
+            good = create_pdf(os.path.join(root, "good.pdf"), 12)
+            unlucky = create_pdf(os.path.join(root, "unlucky.pdf"), 4)
+            corrupt = os.path.join(root, "corrupt.pdf")
+            with open(corrupt, 'wb') as f:
+                f.write(b"%PDF-1.4 not really")
+            output_folder = os.path.join(root, "text")
+            for pages_per_shard in (5, None):
+                results = google_vision_ocr.async_batch_process_pdfs(
+                    [corrupt, unlucky, good], "test-bucket", output_folder, pages_per_shard=pages_per_shard,
+                    max_pages_per_call=20, poll_interval=0.01)
+                assert results[corrupt] is None and results[unlucky] is None
+                with open(results[good], encoding='utf-8') as f:
+                    assert len(re.findall(r" page (\d+)\n", f.read())) == 12
+                assert storage_client.bucket("test-bucket").list_blobs(prefix="ocr_output/") == []
+        finally:
+            google_vision_ocr._upload_source_blob = upload
+            google_vision_ocr.set_clients()
+    print("✓ Async batch skipped a corrupt PDF and a failed upload and cleaned up its output")
+
+
+def test_inline_ocr_short_and_long_pdfs():
+    """Inline chunks only ask for their own pages, so 3-page and 7-page PDFs are read in full"""
+    with tempfile.TemporaryDirectory() as root:
+        local_gcs.use_local_backend(root)
+        try:
+            for page_count in (3, 7):
+                pdf_path = create_pdf(os.path.join(root, f"book{page_count}.pdf"), page_count)
+                text = google_vision_ocr.detect_document_inline(pdf_path)
+                # Page numbers in the fake text restart in every 5-page chunk
+                expected = [(page - 1) % google_vision_ocr.INLINE_MAX_PAGES + 1 for page in range(1, page_count + 1)]
+                assert [int(number) for number in re.findall(r"inline page (\d+)\n", text)] == expected
+        finally:
+            google_vision_ocr.set_clients()
+    print("✓ Inline OCR of 3-page and 7-page PDFs")
+
+
+def test_inline_chunk_errors_are_raised():
+    """A rejected chunk or one with missing pages fails the OCR instead of dropping its pages"""
+    from google.cloud import vision
+
+    class ShortResponseClient:
+        def batch_annotate_files(self, requests):
+            page = vision.AnnotateImageResponse(full_text_annotation=vision.TextAnnotation(text="only one"))
+            return vision.BatchAnnotateFilesResponse(responses=[vision.AnnotateFileResponse(responses=[page])])
+
+    with tempfile.TemporaryDirectory() as root:
+        _, vision_client = local_gcs.use_local_backend(root)
+        try:
+            with open(create_pdf(os.path.join(root, "book.pdf"), 3), 'rb') as f:
+                pdf_bytes = f.read()
+            for client, data in ((vision_client, b"%PDF-1.4 not really"), (ShortResponseClient(), pdf_bytes)):
+                try:
+                    google_vision_ocr._detect_document_chunk(client, data, 6, 3)
+                    assert False, "the chunk should fail"
+                except RuntimeError as e:
+                    assert str(e).startswith("Pages 6-8:")
+        finally:
+            google_vision_ocr.set_clients()
+    print("✓ Rejected and short inline chunks raise")
+
+
+def test_choose_and_run_ocr_method():
+    """Short PDFs go inline, pages too big for inline requests go per image; ocr_pdf learns from the run"""
+    import random
+
+    costs = {method: list(values) for method, values in google_vision_ocr.OCR_METHOD_COSTS.items()}
+    with tempfile.TemporaryDirectory() as root:
+        local_gcs.use_local_backend(root)
+        try:
+            short = create_pdf(os.path.join(root, "short.pdf"), 7)
+            assert google_vision_ocr.choose_ocr_method(short) == "inline"
+            assert google_vision_ocr.choose_ocr_method(short, "test-bucket") == "inline"
+
+            # Noise does not compress: 5 of these pages are over the inline request limit
+            rng = random.Random(1)
+            noise = Image.frombytes('RGB', (1200, 1200), bytes(rng.getrandbits(8) for _ in range(1200 * 1200 * 3)))
+            buffer = io.BytesIO()
+            noise.save(buffer, format='PNG')
+            heavy = os.path.join(root, "heavy.pdf")
+            with open(heavy, 'wb') as f:
+                f.write(img2pdf.convert([buffer.getvalue()] * 2))
+            assert google_vision_ocr.choose_ocr_method(heavy) == "image"
+
+            text, method = google_vision_ocr.ocr_pdf(short)
+            assert method == "inline" and len(re.findall(r"inline page \d+\n", text)) == 7
+            assert google_vision_ocr.OCR_METHOD_COSTS["inline"] != costs["inline"]
+
+            text, method = google_vision_ocr.ocr_pdf(short, "test-bucket", method="gcs")
+            assert method == "gcs" and len(re.findall(r" page \d+\n", text)) == 7
+        finally:
+            google_vision_ocr.set_clients()
+            google_vision_ocr.OCR_METHOD_COSTS.update(costs)
+    print("✓ OCR method chosen by page count and size, and measured")
+
+
+if __name__ == "__main__":
+    test_storage_round_trip()
+    test_async_detect_document_reads_pages_in_order()
+    test_sharded_upload_is_skipped_when_present()
+    test_reused_source_survives_prune()
+    test_failed_sharded_run_keeps_sources()
+    test_async_batch_writes_every_book()
+    test_async_batch_survives_bad_books()
+    test_inline_ocr_short_and_long_pdfs()
+    test_inline_chunk_errors_are_raised()
+    test_choose_and_run_ocr_method()
+    print("\nAll local GCS tests passed!")
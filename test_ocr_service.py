@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Test script for the local HTTP OCR service
+Page OCR is replaced by a stand-in, so no API calls or poppler are needed
+"""
+import http.client
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import img2pdf
+from PIL import Image
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from ocr_service import OCRService, make_server
+
+
+def pdf_bytes(page_count, shade=255):
+    pages = []
+    for _ in range(page_count):
+        buffer = io.BytesIO()
+        Image.new('L', (60, 80), shade).save(buffer, format='PNG')
+        pages.append(buffer.getvalue())
+    return img2pdf.convert(pages)
+
+
+class SlowPageOCR:
+    """Stands in for _ocr_pdf_page; later pages finish first to exercise out-of-order streaming"""
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, pdf_path, page):
+        with self.lock:
+            self.calls += 1
+        time.sleep(0.05 / page)
+        return page, f"page {page}\n"
+
+
+class RunningService:
+    def __init__(self, ocr_page, **options):
+        self.folder = tempfile.TemporaryDirectory()
+        self.service = OCRService(max_workers=4, spool_dir=self.folder.name, ocr_page=ocr_page, **options)
+        self.server = make_server(self.service, port=0)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def request(self, method, path, body=None, headers=None):
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        data = response.read()
+        connection.close()
+        return response.status, data
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.service.shutdown()
+        self.folder.cleanup()
+
+
+def read_events(stream):
+    events = []
+    for block in stream.decode('utf-8').split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_upload_stream_and_text():
+    """An uploaded PDF streams one event per page, then the full text is served in page order"""
+    ocr = SlowPageOCR()
+    running = RunningService(ocr)
+    try:
+        status, body = running.request("POST", "/jobs", pdf_bytes(5), {"Content-Type": "application/pdf"})
+        assert status == 202
+        job = json.loads(body)
+        assert job["pages"] == 5 and not job["cached"]
+
+        status, stream = running.request("GET", job["stream_url"])
+        assert status == 200
+        events = read_events(stream)
+        assert sorted(data["page"] for event, data in events if event == "page") == [1, 2, 3, 4, 5]
+        assert events[-1][0] == "done" and events[-1][1]["pages_done"] == 5
+
+        status, text = running.request("GET", job["text_url"])
+        assert status == 200 and text.decode('utf-8') == "".join(f"page {p}\n" for p in range(1, 6))
+
+        # A late stream subscriber still gets every page
+        _, stream = running.request("GET", job["stream_url"])
+        assert len([event for event, _ in read_events(stream) if event == "page"]) == 5
+    finally:
+        running.close()
+    print("✓ Upload streamed 5 pages and served the text in order")
+
+
+def test_same_content_is_cached():
+    """Uploading the same bytes, or submitting the same file by path, reuses the first job"""
+    ocr = SlowPageOCR()
+    shared = tempfile.TemporaryDirectory()
+    running = RunningService(ocr, path_root=shared.name)
+    try:
+        data = pdf_bytes(3, shade=200)
+        _, body = running.request("POST", "/jobs", data, {"Content-Type": "application/pdf"})
+        first = json.loads(body)
+        running.request("GET", first["stream_url"])
+
+        status, body = running.request("POST", "/jobs", data, {"Content-Type": "application/pdf"})
+        assert status == 200 and json.loads(body)["id"] == first["id"] and json.loads(body)["cached"]
+
+        path = os.path.join(shared.name, "copy.pdf")
+        with open(path, 'wb') as f:
+            f.write(data)
+        _, body = running.request("POST", "/jobs", json.dumps({"path": path}),
+                                  {"Content-Type": "application/json"})
+        assert json.loads(body)["id"] == first["id"]
+        assert ocr.calls == 3
+
+        _, body = running.request("GET", "/stats")
+        stats = json.loads(body)
+        assert stats["cache_hits"] == 2 and stats["pages_done"] == 3 and stats["jobs"] == {"done": 1}
+    finally:
+        running.close()
+        shared.cleanup()
+    print("✓ Repeated content served from the cache without new OCR calls")
+
+
+def test_bad_requests():
+    """Unknown jobs, missing files, paths outside the root and non-PDF bodies are rejected"""
+    shared = tempfile.TemporaryDirectory()
+    running = RunningService(SlowPageOCR(), path_root=shared.name)
+    try:
+        assert running.request("GET", "/jobs/0123456789ab")[0] == 404
+        json_headers = {"Content-Type": "application/json"}
+        missing = json.dumps({"path": os.path.join(shared.name, "no-such.pdf")})
+        assert running.request("POST", "/jobs", missing, json_headers)[0] == 404
+        for path in ("/etc/passwd", os.path.join(shared.name, "..", "escape.pdf")):
+            assert running.request("POST", "/jobs", json.dumps({"path": path}), json_headers)[0] == 403
+        assert running.request("POST", "/jobs", b"hello", {"Content-Type": "text/plain"})[0] == 400
+    finally:
+        running.close()
+        shared.cleanup()
+    print("✓ Bad requests rejected")
+
+
+def test_path_submission_is_off_by_default():
+    """Without a path root, JSON path submissions are refused even for readable PDFs"""
+    running = RunningService(SlowPageOCR())
+    try:
+        path = os.path.join(running.folder.name, "book.pdf")
+        with open(path, 'wb') as f:
+            f.write(pdf_bytes(1))
+        status, _ = running.request("POST", "/jobs", json.dumps({"path": path}),
+                                    {"Content-Type": "application/json"})
+        assert status == 403
+    finally:
+        running.close()
+    print("✓ Path submission refused without a path root")
+
+
+def test_identical_uploads_together_share_one_job():
+    """Simultaneous uploads of the same PDF get one job and one OCR per page"""
+    ocr = SlowPageOCR()
+    running = RunningService(ocr)
+    try:
+        data = pdf_bytes(4, shade=120)
+        start = threading.Barrier(6)
+
+        def upload():
+            start.wait()
+            return running.service.submit_bytes(data)[0].id
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            ids = set(pool.map(lambda _: upload(), range(6)))
+        assert len(ids) == 1
+        job = running.service.get(ids.pop())
+        with job.changed:
+            job.changed.wait_for(lambda: job.status == "done", timeout=5)
+        assert ocr.calls == 4 and running.service.cache_hits == 5
+    finally:
+        running.close()
+    print("✓ Simultaneous identical uploads shared one job")
+
+
+def test_finished_jobs_release_spool_files_and_memory():
+    """A finished upload's spool file is deleted, and finished jobs past the cap are dropped"""
+    running = RunningService(SlowPageOCR(), max_finished_jobs=1)
+    try:
+        ids = []
+        for shade in (10, 20, 30):
+            _, body = running.request("POST", "/jobs", pdf_bytes(2, shade=shade), {"Content-Type": "application/pdf"})
+            job = json.loads(body)
+            running.request("GET", job["stream_url"])
+            ids.append(job["id"])
+        assert [name for name in os.listdir(running.folder.name) if name.endswith(".pdf")] == []
+
+        _, body = running.request("GET", "/stats")
+        assert json.loads(body)["jobs"] == {"done": 1}
+        assert running.request("GET", f"/jobs/{ids[0]}")[0] == 404
+        assert running.request("GET", f"/jobs/{ids[-1]}")[0] == 200
+
+        # Dropped content is OCRed again rather than served from a stale entry
+        status, body = running.request("POST", "/jobs", pdf_bytes(2, shade=10), {"Content-Type": "application/pdf"})
+        assert status == 202 and not json.loads(body)["cached"]
+    finally:
+        running.close()
+
+    running = RunningService(SlowPageOCR(), job_ttl=0)
+    try:
+        _, body = running.request("POST", "/jobs", pdf_bytes(1), {"Content-Type": "application/pdf"})
+        job = json.loads(body)
+        running.request("GET", job["stream_url"])
+        _, body = running.request("GET", "/stats")
+        assert json.loads(body)["jobs"] == {}
+        assert running.request("GET", f"/jobs/{job['id']}")[0] == 404
+    finally:
+        running.close()
+    print("✓ Spool files deleted and old jobs dropped")
+
+
+if __name__ == "__main__":
+    test_upload_stream_and_text()
+    test_same_content_is_cached()
+    test_bad_requests()
+    test_path_submission_is_off_by_default()
+    test_identical_uploads_together_share_one_job()
+    test_finished_jobs_release_spool_files_and_memory()
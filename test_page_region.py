@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Test script for page-region detection and margin trimming
+Works on generated screenshots, so no display is needed
+"""
+import os
+import random
+import sys
+
+from PIL import Image, ImageDraw
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
+
+from page_region import (StableCrop, content_box, detect_page_region, detect_screen_page, find_gutter, is_blank_page,
+                         pad_to_box, padded_words, split_spread)
+
+PAGE_BOX = (600, 120, 1320, 1040)
+
+
+def desktop_frame(scale=1):
+    """A reader window: dark chrome, a toolbar with buttons, and a white page with text"""
+    frame = Image.new('RGB', (1920 * scale, 1080 * scale), (45, 45, 48))
+    draw = ImageDraw.Draw(frame)
+    draw.rectangle((0, 0, 1920 * scale, 60 * scale), fill=(70, 70, 75))
+    for x in range(20, 400, 60):
+        draw.rectangle((x * scale, 15 * scale, (x + 40) * scale, 45 * scale), fill=(200, 200, 200))
+    left, top, right, bottom = (value * scale for value in PAGE_BOX)
+    draw.rectangle((left, top, right - 1, bottom - 1), fill='white')
+    for line in range(30):
+        y = top + (80 + line * 26) * scale
+        draw.text((left + 90 * scale, y), "Lorem ipsum dolor sit amet, consectetur adipiscing", fill='black')
+    return frame
+
+
+def text_page(offset=0, lines=20):
+    page = Image.new('RGB', (800, 1000), 'white')
+    draw = ImageDraw.Draw(page)
+    for line in range(lines):
+        draw.text((150 + offset, 120 + line * 30), "The quick brown fox jumps over the lazy dog", fill='black')
+    return page
+
+
+def spread_frame(gutter_shadow=False):
+    """Two text pages side by side with ragged line ends, optionally with a shaded gutter"""
+    words = "the quick brown fox jumps over a lazy dog while lorem ipsum dolor sit amet".split()
+    rng = random.Random(7)
+    frame = Image.new('RGB', (1600, 1000), 'white')
+    draw = ImageDraw.Draw(frame)
+    if gutter_shadow:
+        draw.rectangle((780, 0, 820, 1000), fill=(210, 210, 210))
+    for line in range(30):
+        for x in (80, 880):
+            draw.text((x, 60 + line * 28), " ".join(rng.choice(words) for _ in range(rng.randint(6, 10))), fill='black')
+    return frame
+
+
+def test_detect_page_region():
+    """The white page is found on a dark reader window, also on a 2x (Retina) screenshot"""
+    box = detect_page_region(desktop_frame())
+    assert all(abs(found - expected) <= 3 for found, expected in zip(box, PAGE_BOX)), box
+
+    top_left, bottom_right = detect_screen_page(desktop_frame(scale=2), (1920, 1080))
+    assert all(abs(found - expected) <= 3 for found, expected in zip(top_left + bottom_right, PAGE_BOX))
+
+    assert detect_page_region(Image.new('RGB', (800, 600), 'gray')) is None
+    print(f"✓ Page region detected at {box}")
+
+
+def test_stable_trim():
+    """The trim box covers every page's content, only grows and cuts most of the margins"""
+    assert content_box(Image.new('RGB', (100, 100), 'white')) is None
+
+    crop = StableCrop()
+    pages = [text_page(), text_page(offset=-4), text_page(lines=10), text_page(offset=6)]
+    sizes = []
+    for page in pages:
+        crop.update(page)
+        sizes.append(crop.apply(page).size)
+    first_box, first_cut = crop.box, crop.apply(pages[0])
+    # The padding is added once around the content, not again on top of content_box()'s
+    assert first_box == content_box(pages[0])
+    # Small shifts fit in the padding, so every page gets the same box
+    assert len(set(sizes)) == 1
+    kept = sizes[0][0] * sizes[0][1] / float(800 * 1000)
+    assert kept < 0.6
+
+    # Content well outside the box grows it, and the box covers that page
+    shifted = text_page(offset=-100)
+    assert crop.update(shifted)
+    found = content_box(shifted)
+    assert crop.box[0] == found[0] and crop.box[2] >= found[2] and crop.apply(shifted).size[0] > sizes[0][0]
+
+    # A page cut before the box grew, padded to the final box, is that page cut with the final box
+    padded = pad_to_box(first_cut, first_box, crop.box)
+    assert padded.size == crop.apply(shifted).size
+    assert padded.tobytes() == crop.apply(pages[0]).tobytes()
+    ((_, x0, y0, x1, y1),) = padded_words([("word ", 0.0, 0.0, 1.0, 1.0)], first_box, crop.box)
+    width, height = padded.size
+    assert (round(x0 * width), round(y0 * height), round(x1 * width), round(y1 * height)) == \
+        (first_box[0] - crop.box[0], first_box[1] - crop.box[1], first_box[2] - crop.box[0], first_box[3] - crop.box[1])
+    print(f"✓ Stable trim box keeps {kept:.0%} of the page")
+
+
+def test_split_spread():
+    """Spreads are split in the gap between the pages; single pages are left whole"""
+    for shadow in (False, True):
+        frame = spread_frame(shadow)
+        gutter = find_gutter(frame)
+        # Between the pages: no text in the gutter column, text on both sides
+        assert 500 < gutter < 880, gutter
+        assert min(frame.convert('L').crop((gutter, 0, gutter + 1, 1000)).tobytes()) > 128
+        left, right = split_spread(spread_frame(shadow))
+        assert left.width + right.width == 1600
+
+    single = text_page()
+    assert find_gutter(single) is None and split_spread(single) == [single]
+    print(f"✓ Spread split at column {gutter}, single page left whole")
+
+
+def test_blank_pages():
+    """Empty and nearly empty pages (a page number, scanner noise) are blank; a few lines of text are not"""
+    rng = random.Random(7)
+    paper = Image.new('RGB', (800, 1000), (246, 242, 232))
+    assert is_blank_page(paper)
+    numbered = paper.copy()
+    draw = ImageDraw.Draw(numbered)
+    draw.text((390, 960), "42", fill='black')
+    for _ in range(300):
+        x, y = rng.randrange(800), rng.randrange(1000)
+        draw.point((x, y), fill=(232, 228, 220))
+    assert is_blank_page(numbered)
+    assert not is_blank_page(text_page(lines=2))
+    assert not is_blank_page(text_page())
+    assert not is_blank_page(desktop_frame())
+    print("✓ Blank pages told apart from pages with text")
+
+
+if __name__ == "__main__":
+    test_detect_page_region()
+    test_stable_trim()
+    test_split_spread()
+    test_blank_pages()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test script for PDF compression profiles (bilevel G4 and mixed raster pages)
+"""
+import io
+import os
+import sys
+import tempfile
+
+import pikepdf
+from PIL import Image, ImageDraw, ImageFont
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from pdf_compression import PROFILES, classify_page, write_pdf
+
+
+def text_page():
+    image = Image.new('RGB', (600, 800), 'white')
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=16)
+    for line in range(35):
+        draw.text((30, 20 + line * 22), f"Line {line}: the quick brown fox jumps over the lazy dog", fill='black',
+                  font=font)
+    return image
+
+
+def picture_page(color):
+    image = text_page()
+    picture = Image.linear_gradient('L').resize((250, 250))
+    if color:
+        picture = Image.merge('RGB', (picture, picture.rotate(90), Image.new('L', picture.size, 80)))
+    image.paste(picture.convert('RGB'), (150, 300))
+    return image
+
+
+def png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_classify_page():
+    """Text, grayscale pictures and color pictures are told apart"""
+    assert classify_page(text_page()) == 'text'
+    assert classify_page(picture_page(color=False)) == 'gray'
+    assert classify_page(picture_page(color=True)) == 'color'
+    print("✓ Pages classified as text, gray and color")
+
+
+def test_profiles_shrink_pdf():
+    """Compressed profiles are smaller than lossless and keep the page size and the text pixels"""
+    pages = [png(text_page()), png(picture_page(color=False)), png(picture_page(color=True))]
+    with tempfile.TemporaryDirectory() as folder:
+        stats = {profile: write_pdf(pages, os.path.join(folder, f"{profile}.pdf"), profile, max_workers=2)
+                 for profile in PROFILES}
+        assert stats['balanced']['kinds'] == {'text': 1, 'gray': 1, 'color': 1}
+        assert stats['smallest']['bytes'] < stats['balanced']['bytes'] < stats['lossless']['bytes']
+
+        with pikepdf.open(os.path.join(folder, "lossless.pdf")) as lossless, \
+                pikepdf.open(os.path.join(folder, "balanced.pdf")) as balanced:
+            assert [list(page.mediabox) for page in lossless.pages] == [list(page.mediabox) for page in balanced.pages]
+            xobjects = balanced.pages[0].obj.Resources.XObject
+            assert list(xobjects.keys()) == ["/Page"] and xobjects.Page.Filter == "/CCITTFaxDecode"
+            decoded = pikepdf.PdfImage(xobjects.Page).as_pil_image().convert('L')
+            expected = text_page().convert('L').point(lambda value: 255 if value >= 128 else 0)
+            assert decoded.tobytes() == expected.tobytes()
+
+            mixed = balanced.pages[2].obj.Resources.XObject
+            assert mixed.Text.ImageMask and mixed.Background.Filter == "/DCTDecode"
+            assert mixed.Background.ColorSpace == "/DeviceRGB" and mixed.Background.Width == 300
+        assert not [name for name in os.listdir(folder) if name.endswith(".tmp")]
+    sizes = ", ".join(f"{profile} {result['bytes'] / 1024:.0f} KB" for profile, result in stats.items())
+    print(f"✓ Profiles compress the PDF ({sizes})")
+
+
+if __name__ == "__main__":
+    test_classify_page()
+    test_profiles_shrink_pdf()
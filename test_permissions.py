@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 """
 Test and fix Google Cloud Storage permissions for async OCR
+
+Set BOOK_SCANNER_LOCAL_GCS=/some/dir to exercise the script offline against
+the local Cloud Storage stand-in (src/local_gcs.py).
 """
 
 import os
-from google.cloud import storage
-from google.cloud import iam
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from google_vision_ocr import get_storage_client
 
 def test_bucket_permissions():
     """Test if we can access and write to the GCS bucket"""
@@ -16,7 +21,7 @@ def test_bucket_permissions():
     
     try:
         # Initialize the storage client
-        storage_client = storage.Client()
+        storage_client = get_storage_client()
         print("✓ Storage client initialized successfully")
         
         # Try to get the bucket
@@ -56,12 +61,12 @@ def test_bucket_permissions():
 def get_service_account_info():
     """Get information about the current service account"""
     try:
-        storage_client = storage.Client()
+        storage_client = get_storage_client()
         print(f"\n📋 Service Account Information:")
         print(f"Project ID: {storage_client.project}")
         
         # Try to get service account email from credentials
-        if hasattr(storage_client._credentials, 'service_account_email'):
+        if hasattr(getattr(storage_client, '_credentials', None), 'service_account_email'):
             email = storage_client._credentials.service_account_email
             print(f"Service Account: {email}")
         
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Test script for scroll stitching (frame overlap and cutting the strip into pages)
+Works on generated frames, so no display is needed
+"""
+import os
+import random
+import sys
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
+
+from scroll_stitch import StripStitcher, _gray, find_scroll_shift
+
+
+def document(height=3000, width=700):
+    """A long text column with ragged lines and paragraph gaps"""
+    words = "the quick brown fox jumps over a lazy dog while lorem ipsum dolor sit amet".split()
+    rng = random.Random(3)
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    y = 20
+    while y < height - 30:
+        draw.text((40, y), " ".join(rng.choice(words) for _ in range(rng.randint(5, 12))), fill='black')
+        y += 24 if rng.random() > 0.15 else 60
+    return image
+
+
+def test_find_scroll_shift():
+    """Shifts are measured exactly, also large ones; unrelated frames do not overlap"""
+    doc = document()
+    frame = doc.crop((0, 500, 700, 1100))
+    assert find_scroll_shift(_gray(frame), _gray(frame)) == 0
+    for shift in (1, 37, 150, 333, 480):
+        moved = doc.crop((0, 500 + shift, 700, 1100 + shift))
+        assert find_scroll_shift(_gray(frame), _gray(moved)) == shift, shift
+    elsewhere = doc.crop((0, 2300, 700, 2900))
+    assert find_scroll_shift(_gray(frame), _gray(elsewhere)) is None
+    print("✓ Scroll shifts measured")
+
+
+def test_stitch_pages():
+    """Frames scrolled by uneven steps are joined without gaps and cut at blank rows"""
+    doc = document()
+    stitcher = StripStitcher(page_height=800)
+    rng = random.Random(5)
+    offset, pages = 0, []
+    while True:
+        stitcher.add(doc.crop((0, offset, 700, offset + 600)))
+        pages += stitcher.pop_pages()
+        if offset == doc.height - 600:
+            break
+        offset = min(doc.height - 600, offset + rng.randint(80, 400))
+    pages += stitcher.pop_pages(flush=True)
+
+    assert stitcher.breaks == 0
+    assert all(page.height <= 800 for page in pages)
+    joined = np.concatenate([np.asarray(page) for page in pages])
+    assert np.array_equal(joined, np.asarray(doc))
+    # Cuts fall between lines, so no line of text is split over two pages
+    for page in pages[:-1]:
+        last = np.asarray(page.convert('L'))[-1]
+        assert last.max() - last.min() < 16
+    print(f"✓ {stitcher.frames} frames stitched into {len(pages)} pages")
+
+
+if __name__ == "__main__":
+    test_find_scroll_shift()
+    test_stitch_pages()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test script for searchable PDF output (invisible text layer over the page images)
+OCR uses the local Vision stand-in, so no API calls or poppler are needed
+"""
+import io
+import os
+import sys
+import tempfile
+
+import img2pdf
+import pikepdf
+from PIL import Image, ImageFont
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from google_vision_ocr import set_clients
+from local_gcs import LocalStorageClient, LocalVisionClient, fake_full_text_annotation
+from searchable_pdf import add_text_layer, make_searchable, page_words
+
+
+def write_image_pdf(path, page_count):
+    pages = []
+    for page in range(page_count):
+        buffer = io.BytesIO()
+        Image.new('L', (300, 400), 255 - page * 10).save(buffer, format='PNG')
+        pages.append(buffer.getvalue())
+    with open(path, 'wb') as f:
+        img2pdf.convert(pages, outputstream=f)
+
+
+def image_streams(path):
+    with pikepdf.open(path) as pdf:
+        return [next(iter(page.obj.Resources.XObject.values())).read_raw_bytes() for page in pdf.pages]
+
+
+def page_content(page):
+    contents = page.obj.Contents
+    if isinstance(contents, pikepdf.Array):
+        return b"\n".join(stream.read_bytes() for stream in contents)
+    return contents.read_bytes()
+
+
+def test_page_words():
+    """Word boxes come out normalized, with the line break after the last word of a line"""
+    annotation = fake_full_text_annotation("Hello world\n한국어 텍스트", 300, 400)
+    annotation["pages"][0]["blocks"][0]["paragraphs"][0]["words"][1]["symbols"][-1]["property"] = {
+        "detectedBreak": {"type": "EOL_SURE_SPACE"}}
+    words = page_words(annotation)
+    assert [word[0] for word in words] == ["Hello", "world ", "한국어", "텍스트"]
+    text, x0, y0, x1, y1 = words[0]
+    assert 0 <= x0 < x1 <= 1 and 0 <= y0 < y1 <= 1
+    print("✓ Word boxes extracted from the annotation")
+
+
+def test_make_searchable():
+    """Each page gains an invisible text layer; the image streams are copied unchanged"""
+    with tempfile.TemporaryDirectory() as folder:
+        pdf_path = os.path.join(folder, "book.pdf")
+        write_image_pdf(pdf_path, 3)
+        before = image_streams(pdf_path)
+
+        storage = LocalStorageClient(os.path.join(folder, "gcs"))
+        set_clients(storage, LocalVisionClient(storage, text_for_page=lambda name, page: "Hello 한국어"))
+        try:
+            output, text_path = make_searchable(pdf_path, max_workers=2)
+        finally:
+            set_clients()
+
+        assert output == pdf_path
+        with open(text_path, encoding='utf-8') as f:
+            assert f.read() == "Hello 한국어\n" * 3
+        assert image_streams(pdf_path) == before
+        with pikepdf.open(pdf_path) as pdf:
+            assert len(pdf.pages) == 3
+            for page in pdf.pages:
+                content = page_content(page)
+                assert b"3 Tr" in content
+                assert _hex("한국어").encode() in content
+                assert page.obj.Resources.Font.BSText.ToUnicode is not None
+
+            # The glyphless font is embedded, a valid TrueType font, and every CID draws its blank glyph
+            (cid_font,) = pdf.pages[0].obj.Resources.Font.BSText.DescendantFonts
+            font_file = cid_font.FontDescriptor.FontFile2.read_bytes()
+            font = ImageFont.truetype(io.BytesIO(font_file), 100)
+            assert font.getname()[0] == "GlyphLessFont" and font.getlength("한") == 50
+            assert cid_font.CIDToGIDMap.read_bytes() == b"\0\1" * 65536
+        assert not [name for name in os.listdir(folder) if name.endswith((".part", ".tmp"))]
+    print("✓ Searchable PDF written with the original image streams")
+
+
+def test_add_text_layer_from_known_words():
+    """Word boxes collected while capturing are added without another OCR pass"""
+    with tempfile.TemporaryDirectory() as folder:
+        pdf_path = os.path.join(folder, "book.pdf")
+        output_path = os.path.join(folder, "book-searchable.pdf")
+        write_image_pdf(pdf_path, 2)
+        words = {2: page_words(fake_full_text_annotation("second page", 300, 400))}
+        assert add_text_layer(pdf_path, words, output_path) == output_path
+        with pikepdf.open(output_path) as pdf:
+            assert "/Font" not in pdf.pages[0].obj.Resources
+            assert _hex("second").encode() in page_content(pdf.pages[1])
+    print("✓ Text layer added from known word boxes")
+
+
+def _hex(text):
+    return "".join(f"{ord(char):04X}" for char in text)
+
+
+if __name__ == "__main__":
+    test_page_words()
+    test_make_searchable()
+    test_add_text_layer_from_known_words()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test script for startup import cost
+Checks that the OCR and cloud libraries are only imported on first use
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# Add the app directory to the path
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app')
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src')
+sys.path.insert(0, APP_DIR)
+
+from import_report import HEAVY_MODULES, parse_importtime, summarize
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import run_book_scanner
+
+
+def imported_heavy_modules(module):
+    """Import module in a fresh interpreter and list the heavy modules it loaded"""
+    code = (f"import sys; sys.path[:0] = [{APP_DIR!r}, {SRC_DIR!r}]; import {module}; "
+            f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return [name for name in result.stdout.strip().split(",") if name]
+
+
+def test_startup_modules_stay_light():
+    """Importing the OCR module or the capture code loads no OCR/cloud libraries"""
+    for module in ("google_vision_ocr", "capture_processor", "cli"):
+        assert imported_heavy_modules(module) == [], module
+    print("✓ OCR and cloud libraries are not imported at startup")
+
+
+def test_warm_up_loads_ocr_libraries():
+    """warm_up() imports the libraries the first OCR call needs"""
+    code = (f"import sys; sys.path[:0] = [{SRC_DIR!r}]; import google_vision_ocr; "
+            f"google_vision_ocr.start_warm_up().join(); print('google.cloud.vision' in sys.modules)")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "True"
+    print("✓ Background warm-up imports the Vision client")
+
+
+def test_parse_importtime():
+    """The report sums self time per top-level package"""
+    stderr = ("import time: self [us] | cumulative | imported package\n"
+              "import time:       200 |        200 |     google.protobuf\n"
+              "import time:      1000 |       1200 |   google.cloud.vision\n"
+              "import time:       300 |       1500 | app_module\n")
+    entries = parse_importtime(stderr)
+    assert entries[0] == ("google.protobuf", 200, 200, 2)
+    assert entries[-1] == ("app_module", 300, 1500, 0)
+    summary = summarize(entries, "app_module")
+    assert summary['total_ms'] == 1.5
+    assert summary['packages'][0] == ("google", 1.2)
+    assert summary['heavy'] == ["google.cloud.vision"]
+    print("✓ importtime output parsed")
+
+
+def test_conda_env_found_after_a_miss():
+    """An environment created outside conda's own envs folder after a miss is still found"""
+    with tempfile.TemporaryDirectory() as root:
+        listing = os.path.join(root, "envs.json")
+        conda = os.path.join(root, "conda", "bin", "conda")
+        os.makedirs(os.path.dirname(conda))
+        with open(conda, 'w') as f:
+            f.write(f"#!{sys.executable}\nimport sys\nsys.stdout.write(open({listing!r}).read())\n")
+        os.chmod(conda, 0o755)
+        with open(listing, 'w') as f:
+            json.dump({"envs": []}, f)
+
+        cache_file, conda_exe = run_book_scanner.ENV_CACHE_FILE, os.environ.get("CONDA_EXE")
+        run_book_scanner.ENV_CACHE_FILE = os.path.join(root, "cache", "launcher_env.json")
+        os.environ["CONDA_EXE"] = conda
+        try:
+            assert run_book_scanner.find_conda_env() is None
+
+            # Created in ~/.conda/envs style: conda's own envs folder does not change
+            prefix = os.path.join(root, "home", ".conda", "envs", run_book_scanner.CONDA_ENV_NAME)
+            python = run_book_scanner._env_python(prefix)
+            os.makedirs(os.path.dirname(python))
+            open(python, 'w').close()
+            with open(listing, 'w') as f:
+                json.dump({"envs": [prefix]}, f)
+            assert run_book_scanner.find_conda_env() == python
+
+            # The hit is cached: conda is not asked again
+            os.remove(listing)
+            assert run_book_scanner.find_conda_env() == python
+        finally:
+            run_book_scanner.ENV_CACHE_FILE = cache_file
+            if conda_exe is None:
+                os.environ.pop("CONDA_EXE")
+            else:
+                os.environ["CONDA_EXE"] = conda_exe
+    print("✓ Conda environment found after a cached miss")
+
+
+if __name__ == "__main__":
+    test_startup_modules_stay_light()
+    test_warm_up_loads_ocr_libraries()
+    test_parse_importtime()
+    test_conda_env_found_after_a_miss()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Test script for streaming OCR (pages OCRed while the capture is running)
+Page OCR is replaced by a stand-in, so no API calls are made
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from streaming_ocr import StreamingOCR
+
+
+class JitteryOCR:
+    """Stands in for the Vision API: random latency, records concurrency and can fail pages"""
+    def __init__(self, failures=None):
+        self.failures = dict(failures or {})
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+
+    def __call__(self, image_data, page_number):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(random.uniform(0.001, 0.02))
+            with self.lock:
+                if self.failures.get(page_number, 0) > 0:
+                    self.failures[page_number] -= 1
+                    raise RuntimeError("503 service unavailable")
+            return page_number, image_data.decode() + "\n"
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def test_text_written_in_page_order():
+    """Pages finishing out of order are written in order, with at most `window` in flight"""
+    with tempfile.TemporaryDirectory() as folder:
+        output = os.path.join(folder, "book.pdf.txt")
+        ocr = JitteryOCR()
+        streamer = StreamingOCR(output, window=4, ocr_image=ocr)
+        for page in range(1, 41):
+            streamer.submit(page, lambda page=page: f"text {page}".encode())
+        assert streamer.close(timeout=10) == output
+        assert not os.path.exists(output + ".part")
+        with open(output, encoding='utf-8') as f:
+            assert f.read() == "".join(f"text {page}\n" for page in range(1, 41))
+        assert ocr.peak <= 4
+    print(f"✓ 40 pages written in order, peak {ocr.peak} in flight (window 4)")
+
+
+def test_failed_page_is_retried():
+    """A page whose OCR call fails is retried; one that keeps failing leaves a gap and is reported"""
+    with tempfile.TemporaryDirectory() as folder:
+        output = os.path.join(folder, "book.pdf.txt")
+        streamer = StreamingOCR(output, window=2, retries=2, ocr_image=JitteryOCR({2: 1, 3: 5}))
+        for page in range(1, 5):
+            streamer.submit(page, lambda page=page: f"text {page}".encode())
+        streamer.close(timeout=10)
+        with open(output, encoding='utf-8') as f:
+            assert f.read() == "text 1\ntext 2\ntext 4\n"
+        assert streamer.failed == [3]
+    print("✓ Failed page retried, persistent failure reported")
+
+
+def test_abort_removes_partial_text():
+    """abort() drops queued pages and leaves no text file behind"""
+    with tempfile.TemporaryDirectory() as folder:
+        output = os.path.join(folder, "book.pdf.txt")
+        streamer = StreamingOCR(output, window=1, ocr_image=JitteryOCR())
+        for page in range(1, 20):
+            streamer.submit(page, lambda page=page: f"text {page}".encode())
+        streamer.abort()
+        assert os.listdir(folder) == []
+    print("✓ Aborted stream removed its partial text")
+
+
+if __name__ == "__main__":
+    test_text_written_in_page_order()
+    test_failed_page_is_retried()
+    test_abort_removes_partial_text()
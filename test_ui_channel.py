@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Test script for the batched, thread-safe UI channel
+Uses stand-in widgets, so no display is needed
+"""
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add the app directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
+
+from ui_channel import UIChannel
+from log_sink import LogSink
+
+
+class MockWidget:
+    """Records the calls a Tk widget would receive"""
+    def __init__(self):
+        self.calls = []
+
+    def insert(self, index, text):
+        self.calls.append(("insert", text))
+
+    def see(self, index):
+        self.calls.append(("see", index))
+
+    def delete(self, start, end):
+        self.calls.append(("delete", start, end))
+
+    def config(self, **kwargs):
+        self.calls.append(("config", kwargs))
+
+    def set(self, value):
+        self.calls.append(("set", value))
+
+
+class MockApp:
+    def __init__(self):
+        self.output_text = MockWidget()
+        self.status_label = MockWidget()
+        self.progress_var = MockWidget()
+
+
+def test_updates_are_coalesced():
+    """Many events from worker threads become one insert and one update per kind"""
+    app = MockApp()
+    channel = UIChannel(app)
+
+    def worker(offset):
+        for i in range(500):
+            channel.log(f"line {offset + i}")
+            channel.set_progress(i)
+            channel.set_status(f"status {i}")
+
+    threads = [threading.Thread(target=worker, args=(n * 1000,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert channel.drain() == 6000
+    inserts = [call for call in app.output_text.calls if call[0] == "insert"]
+    assert len(inserts) == 1
+    assert inserts[0][1].count("\n") == 2000
+    assert len(app.status_label.calls) == 1
+    assert app.progress_var.calls == [("set", 499)]
+    assert channel.drain() == 0
+    print("✓ 6000 events applied in a single redraw")
+
+
+def test_calls_keep_their_order():
+    """Tk calls run after the lines queued before them"""
+    app = MockApp()
+    channel = UIChannel(app)
+    channel.log("before")
+    channel.call(app.output_text.calls.append, ("marker",))
+    channel.log("after")
+    channel.drain()
+    assert app.output_text.calls == [("insert", "before\n"), ("see", "end"), ("marker",),
+                                     ("insert", "after\n"), ("see", "end")]
+    print("✓ Calls interleave correctly with log lines")
+
+
+def test_logging_overhead():
+    """Posting a log line costs microseconds, far below one page at 10+ pages/s"""
+    channel = UIChannel(MockApp())
+    count = 20000
+    start = time.perf_counter()
+    for i in range(count):
+        channel.log(f"Capturing page {i}")
+    per_message = (time.perf_counter() - start) / count
+    channel.drain()
+    print(f"✓ {per_message * 1e6:.2f} µs per log call, drain {channel.stats()['pump_ms_total']:.1f} ms")
+    assert per_message < 0.0005
+
+
+def test_output_is_trimmed_in_bulk():
+    """The widget keeps max_lines lines and trims old ones in one delete"""
+    app = MockApp()
+    channel = UIChannel(app, max_lines=100, trim_slack=50)
+    for batch in range(10):
+        for i in range(20):
+            channel.log(f"line {batch * 20 + i}")
+        channel.drain()
+    deletes = [call for call in app.output_text.calls if call[0] == "delete"]
+    # 200 lines written: one trim when the count passed 150
+    assert deletes == [("delete", "1.0", "61.0")]
+    assert channel._line_count == 140
+    print("✓ Ring buffer trims old lines in bulk")
+
+
+def test_log_sink_filters_by_level():
+    """Only enabled levels reach the rotating log file"""
+    with tempfile.TemporaryDirectory() as log_dir:
+        sink = LogSink(log_dir, level=logging.INFO)
+        assert not sink.enabled_for(logging.DEBUG)
+        sink.write(logging.INFO, "kept")
+        sink.write(logging.DEBUG, "dropped")
+        sink.stop()
+        with open(sink.log_path, encoding='utf-8') as f:
+            content = f.read()
+        logging.getLogger("book_scanner").handlers = []
+    assert "kept" in content and "dropped" not in content
+    print("✓ Log file receives only enabled levels")
+
+
+if __name__ == "__main__":
+    test_updates_are_coalesced()
+    test_calls_keep_their_order()
+    test_logging_overhead()
+    test_output_is_trimmed_in_bulk()
+    test_log_sink_filters_by_level()
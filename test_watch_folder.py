@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Test script for the watch-folder daemon and its processed-file manifest
+OCR is replaced by a stand-in that writes the text file, so no API calls are made
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+# Add the src directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from watch_folder import FolderWatcher
+
+
+class RecordingOCR:
+    """Stands in for batch_process_pdfs and records which files were OCRed"""
+    def __init__(self):
+        self.processed = []
+
+    def __call__(self, paths, output_folder, max_workers=8, on_file_done=None):
+        results = {}
+        for path in paths:
+            self.processed.append(os.path.basename(path))
+            output = os.path.join(output_folder, os.path.basename(path) + ".txt")
+            with open(output, 'w') as f:
+                f.write("text")
+            results[path] = output
+            on_file_done(path, output)
+        return results
+
+
+def write_pdf(folder, name, content):
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(b"%PDF-1.4\n" + content)
+    return path
+
+
+def test_manifest_skips_processed_files():
+    """Each content is processed once, across rescans, renames and restarts"""
+    with tempfile.TemporaryDirectory() as root:
+        inbox, out = os.path.join(root, "inbox"), os.path.join(root, "out")
+        os.makedirs(inbox)
+        ocr = RecordingOCR()
+        watcher = FolderWatcher(inbox, out, settle_seconds=0, use_inotify=False, process_files=ocr)
+
+        write_pdf(inbox, "a.pdf", b"book a")
+        write_pdf(inbox, "b.pdf", b"book b")
+        watcher.process(watcher.scan())
+        assert sorted(ocr.processed) == ["a.pdf", "b.pdf"]
+        assert watcher.scan() == []
+
+        # A copy of a finished book under another name is not OCRed again
+        shutil.copy(os.path.join(inbox, "a.pdf"), os.path.join(inbox, "a-copy.pdf"))
+        assert watcher.scan() == []
+
+        # Changed content is processed again
+        time.sleep(0.01)
+        write_pdf(inbox, "b.pdf", b"book b, second edition")
+        watcher.process(watcher.scan())
+        assert ocr.processed[-1] == "b.pdf" and len(ocr.processed) == 3
+
+        # A restarted watcher reads the manifest and finds nothing to do
+        restarted = FolderWatcher(inbox, out, settle_seconds=0, use_inotify=False, process_files=ocr)
+        assert restarted.scan() == []
+    print("✓ Manifest skips processed content across rescans and restarts")
+
+
+def test_failed_files_are_retried_with_backoff():
+    """A file whose OCR failed is retried once its backoff has passed, and is done after it succeeds"""
+    import watch_folder
+
+    failures = {"d.pdf": 2}
+
+    def flaky_ocr(paths, output_folder, max_workers=8, on_file_done=None):
+        results = {}
+        for path in paths:
+            name = os.path.basename(path)
+            if failures.get(name):
+                failures[name] -= 1
+                results[path] = None
+            else:
+                results[path] = os.path.join(output_folder, name + ".txt")
+            on_file_done(path, results[path])
+        return results
+
+    with tempfile.TemporaryDirectory() as root:
+        inbox = os.path.join(root, "inbox")
+        os.makedirs(inbox)
+        watcher = FolderWatcher(inbox, os.path.join(root, "out"), settle_seconds=0, use_inotify=False,
+                                process_files=flaky_ocr)
+        write_pdf(inbox, "d.pdf", b"book d")
+        ((_, sha256),) = watcher.scan()
+        watcher.process([(os.path.join(inbox, "d.pdf"), sha256)])
+        entry = watcher.manifest.files[sha256]
+        assert entry["status"] == "failed" and entry["attempts"] == 1
+        assert watcher.scan() == []
+
+        # Due again after the backoff; the second failure waits twice as long
+        entry["retry_at"] = time.time() - 1
+        watcher.process(watcher.scan())
+        entry = watcher.manifest.files[sha256]
+        assert entry["attempts"] == 2
+        assert entry["retry_at"] - time.time() > 1.5 * watch_folder.RETRY_BASE_SECONDS
+
+        # A restarted watcher keeps the schedule and retries when it is due
+        restarted = FolderWatcher(inbox, os.path.join(root, "out"), settle_seconds=0, use_inotify=False,
+                                  process_files=flaky_ocr)
+        assert restarted.scan() == []
+        restarted.manifest.files[sha256]["retry_at"] = 0
+        restarted.process(restarted.scan())
+        assert restarted.manifest.is_done(sha256) and restarted.scan() == []
+    print("✓ Failed files retried with backoff until they succeed")
+
+
+def test_files_wait_until_stable():
+    """A file still being written is only processed after it stops changing"""
+    with tempfile.TemporaryDirectory() as root:
+        ocr = RecordingOCR()
+        watcher = FolderWatcher(root, os.path.join(root, "out"), settle_seconds=5,
+                                use_inotify=False, process_files=ocr)
+        write_pdf(root, "c.pdf", b"partial")
+        assert watcher.scan(now=100.0) == []
+        assert watcher.scan(now=103.0) == []
+        write_pdf(root, "c.pdf", b"partial plus more pages")
+        assert watcher.scan(now=104.0) == []
+        ready = watcher.scan(now=109.5)
+        assert [os.path.basename(path) for path, _ in ready] == ["c.pdf"]
+    print("✓ Files are processed only once they are stable")
+
+
+def test_run_picks_up_new_files_and_stops():
+    """run() notices files dropped while it is running and exits cleanly on stop()"""
+    with tempfile.TemporaryDirectory() as root:
+        ocr = RecordingOCR()
+        watcher = FolderWatcher(root, os.path.join(root, "out"), poll_interval=5, settle_seconds=0.2,
+                                process_files=ocr)
+        mode = watcher.mode
+        thread = threading.Thread(target=watcher.run)
+        thread.start()
+        try:
+            time.sleep(0.2)
+            write_pdf(root, "d.pdf", b"dropped later")
+            deadline = time.time() + 4
+            while not ocr.processed and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            watcher.stop()
+            thread.join(timeout=5)
+        assert ocr.processed == ["d.pdf"]
+        assert not thread.is_alive()
+    print(f"✓ Watcher ({mode}) picked up a new file and stopped")
+
+
+if __name__ == "__main__":
+    test_manifest_skips_processed_files()
+    test_failed_files_are_retried_with_backoff()
+    test_files_wait_until_stable()
+    test_run_picks_up_new_files_and_stops()